@@ -0,0 +1,214 @@
+"""conftest
+
+Run with ``script/benchmark``, which saves every run and compares it against the previous baseline. Benchmarks run
+against moto by default. Point ``AWS_ENDPOINT_URL_DYNAMODB`` at DynamoDB Local (see
+``docker-compose.yml``) to run them against it instead, or set ``EVE_DYNAMODB_BENCHMARK_DRIVER=memory`` to run them
+against the in-process engine, and list dataset sizes in ``EVE_DYNAMODB_BENCHMARK_SIZES``
+(defaults to ``1000``, e.g. ``1000,100000,1000000``).
+
+.. codeauthor:: John Lane <john.lane93@gmail.com>
+
+"""
+
+import math
+import os
+import uuid
+import eve
+import pytest
+from eve_dynamodb.dynamodb import DynamoDB
+from eve_dynamodb.instrumentation import MemorySink
+
+pytest.importorskip('pytest_benchmark')
+
+SIZES = [int(size) for size in os.environ.get('EVE_DYNAMODB_BENCHMARK_SIZES', '1000').split(',')]
+DRIVER = os.environ.get('EVE_DYNAMODB_BENCHMARK_DRIVER', 'boto3')
+
+
+def pytest_generate_tests(metafunc):
+    """Parametrize benchmarks taking a dataset with every configured size
+
+    :param metafunc: Test function metadata
+    """
+
+    if 'dataset' in metafunc.fixturenames:
+        metafunc.parametrize('dataset', SIZES, indirect=True, ids=[f"{size}-items" for size in SIZES])
+
+
+@pytest.fixture(scope="session")
+def aws():
+    """Provide AWS credentials and, unless an endpoint is configured, a moto mock
+
+    :return: Whether moto is mocking AWS
+    :rtype: bool
+    """
+
+    os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+    os.environ.setdefault('AWS_ACCESS_KEY_ID', 'benchmark')
+    os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'benchmark')
+
+    if os.environ.get('AWS_ENDPOINT_URL_DYNAMODB') or DRIVER == 'memory':
+        yield False
+        return
+
+    moto = pytest.importorskip('moto')
+
+    with moto.mock_aws():
+        yield True
+
+
+@pytest.fixture(scope="session")
+def sink() -> MemorySink:
+    """Returns the sink recording every DynamoDB call made while benchmarking
+
+    :return: Memory sink
+    :rtype: MemorySink
+    """
+
+    return MemorySink()
+
+
+@pytest.fixture(scope="session")
+def server(aws, sink: MemorySink) -> eve.Eve:
+    """Returns an Eve server instance backed by the benchmark endpoint
+
+    :param aws: AWS fixture
+    :param MemorySink sink: Memory sink
+    :return: Eve server
+    :rtype: eve.Eve
+    """
+
+    settings = {
+        'DYNAMODB_INSTRUMENTATION_SINKS': [sink],
+        'DYNAMODB_DRIVER': DRIVER,
+        'DOMAIN': {
+            'actor': {
+                'schema': {
+                    '_id': {'type': 'string', 'unique': True},
+                    'name': {'type': 'string'},
+                    'category': {'type': 'string'},
+                    'rating': {'type': 'integer'}
+                }
+            }
+        }
+    }
+
+    return eve.Eve(settings=settings, data=DynamoDB)
+
+
+def create_table(server: eve.Eve, name: str):
+    """Create a table keyed by ``_id``
+
+    :param eve.Eve server: Eve server
+    :param str name: Table name
+    :return: Table resource
+    """
+
+    table = server.data.driver.create_table(
+        TableName=name,
+        KeySchema=[{'AttributeName': '_id', 'KeyType': 'HASH'}],
+        AttributeDefinitions=[{'AttributeName': '_id', 'AttributeType': 'S'}],
+        BillingMode='PAY_PER_REQUEST'
+    )
+    table.wait_until_exists()
+    return table
+
+
+def generate(size: int) -> list:
+    """Generate a deterministic dataset
+
+    :param int size: Number of items
+    :return: Items
+    :rtype: list
+    """
+
+    return [
+        {'_id': f"{index:08d}", 'name': f"actor-{index}", 'category': f"category-{index % 10}", 'rating': index % 5}
+        for index in range(size)
+    ]
+
+
+@pytest.fixture(scope="session")
+def dataset(request, server: eve.Eve) -> list:
+    """Returns a dataset loaded into its own table
+
+    :param request: Fixture request, its param is the dataset size
+    :param eve.Eve server: Eve server
+    :return: Loaded items
+    :rtype: list
+    """
+
+    items = generate(request.param)
+    table = create_table(server, f"actor_{request.param}")
+
+    with table.batch_writer() as batch:
+        for item in items:
+            batch.put_item(Item=item)
+
+    server.config['SOURCES']['actor']['source'] = table.name
+    return items
+
+
+@pytest.fixture
+def empty_table(server: eve.Eve):
+    """Point the resource at a fresh, empty table
+
+    :param eve.Eve server: Eve server
+    :return: Table resource
+    """
+
+    table = create_table(server, f"actor_{uuid.uuid4().hex}")
+    server.config['SOURCES']['actor']['source'] = table.name
+    yield table
+    table.delete()
+
+
+@pytest.fixture
+def measure(benchmark, sink: MemorySink):
+    """Returns a helper benchmarking a call and recording its percentiles, throughput and simulated capacity
+
+    Capacity is simulated from the recorded calls: 0.5 RCU per 4 KB read, eventually consistent, and 1 WCU per item
+    written.
+
+    :param benchmark: pytest-benchmark fixture
+    :param MemorySink sink: Memory sink
+    :return: Helper taking the call, its arguments and the number of items it processes
+    """
+
+    def run(function, *args, items: int = 1, **kwargs):
+        invocations = []
+
+        def invoke():
+            invocations.append(1)
+            return function(*args, **kwargs)
+
+        sink.reset()
+        result = benchmark(invoke)
+
+        if benchmark.stats is None:
+            return result
+
+        data = benchmark.stats.stats.sorted_data
+        totals = sink.snapshot()
+        total = sink.total()
+        rounds = len(invocations)
+
+        for percentile in (50, 95, 99):
+            index = min(len(data) - 1, math.ceil(percentile * len(data) / 100) - 1)
+            benchmark.extra_info[f"p{percentile}"] = data[index]
+
+        benchmark.extra_info['items_per_second'] = items / benchmark.stats.stats.mean
+        benchmark.extra_info['calls_per_round'] = total['calls'] / rounds
+        benchmark.extra_info['scanned_per_round'] = total['scanned'] / rounds
+        benchmark.extra_info['returned_per_round'] = total['returned'] / rounds
+        benchmark.extra_info['simulated_rcu_per_round'] = sum(
+            math.ceil(stats['bytes'] / 4096) * 0.5 for (_, operation), stats in totals.items()
+            if operation in ('Scan', 'Query', 'GetItem', 'BatchGetItem')
+        ) / rounds
+        benchmark.extra_info['simulated_wcu_per_round'] = sum(
+            stats['returned'] for (_, operation), stats in totals.items()
+            if operation in ('BatchWriteItem', 'PutItem', 'UpdateItem', 'DeleteItem')
+        ) / rounds
+
+        return result
+
+    return run
@@ -0,0 +1,125 @@
+"""test_data_layer
+
+Benchmarks of the data layer hot paths.
+
+.. codeauthor:: John Lane <john.lane93@gmail.com>
+
+"""
+
+import itertools
+from eve import Eve
+from eve_dynamodb.expression import build_attr_expression
+
+
+def test_find(server: Eve, dataset: list, measure):
+    """Benchmark listing a resource
+
+    :param Eve server: Eve server
+    :param list dataset: Loaded items
+    :param measure: Benchmark helper
+    """
+
+    with server.app_context():
+        result, count = measure(server.data.find, 'actor', items=len(dataset))
+
+    assert count == len(dataset)
+
+
+def test_find_filtered(server: Eve, dataset: list, measure):
+    """Benchmark listing a resource filtered on a non-key attribute
+
+    :param Eve server: Eve server
+    :param list dataset: Loaded items
+    :param measure: Benchmark helper
+    """
+
+    with server.app_context():
+        _, count = measure(server.data.find, 'actor', None, {'category': 'category-1'}, items=len(dataset))
+
+    assert count == len(dataset) // 10
+
+
+def test_find_one(server: Eve, dataset: list, measure):
+    """Benchmark reading a single item by id
+
+    :param Eve server: Eve server
+    :param list dataset: Loaded items
+    :param measure: Benchmark helper
+    """
+
+    ids = itertools.cycle(item['_id'] for item in dataset)
+
+    def find_one():
+        with server.app_context():
+            return server.data.find_one('actor', None, **{'_id': next(ids)})
+
+    assert measure(find_one)
+
+
+def test_find_list_of_ids(server: Eve, dataset: list, measure):
+    """Benchmark reading 100 items by id
+
+    :param Eve server: Eve server
+    :param list dataset: Loaded items
+    :param measure: Benchmark helper
+    """
+
+    ids = [item['_id'] for item in dataset[:100]]
+
+    def find_list_of_ids():
+        with server.app_context():
+            return server.data.find_list_of_ids('actor', ids)
+
+    assert measure(find_list_of_ids, items=len(ids)).count() == len(ids)
+
+
+def test_insert(server: Eve, empty_table, measure):
+    """Benchmark inserting 100 items
+
+    :param Eve server: Eve server
+    :param empty_table: Empty table
+    :param measure: Benchmark helper
+    """
+
+    batches = (
+        [{'_id': f"{batch:04d}-{index:03d}", 'name': 'actor', 'category': 'category'} for index in range(100)]
+        for batch in itertools.count()
+    )
+
+    with server.app_context():
+        assert measure(lambda: server.data.insert('actor', next(batches)), items=100)
+
+
+def test_remove(server: Eve, empty_table, measure):
+    """Benchmark inserting then removing a single item
+
+    :param Eve server: Eve server
+    :param empty_table: Empty table
+    :param measure: Benchmark helper
+    """
+
+    ids = (f"{index:08d}" for index in itertools.count())
+
+    def insert_and_remove():
+        id_ = next(ids)
+        server.data.insert('actor', [{'_id': id_, 'name': 'actor'}])
+        server.data.remove('actor', {'_id': id_})
+
+    with server.app_context():
+        measure(insert_and_remove)
+
+
+def test_build_attr_expression(benchmark):
+    """Benchmark compiling a compound query into a filter expression
+
+    :param benchmark: pytest-benchmark fixture
+    """
+
+    query = {
+        'category': 'category-1',
+        'rating': {'$gte': 2, '$lt': 5},
+        '$or': [{'name': {'$startsWith': 'actor-1'}}, {'name': {'$in': ['actor-2', 'actor-3']}}],
+        '_deleted': {'$ne': True}
+    }
+
+    assert benchmark(build_attr_expression, query)
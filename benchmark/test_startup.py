@@ -0,0 +1,81 @@
+"""test_startup
+
+Benchmarks of cold start: importing the package, and the first response of a worker forked from a preloaded
+application, with and without warming the driver up before the fork.
+
+.. codeauthor:: John Lane <john.lane93@gmail.com>
+
+"""
+
+import os
+import subprocess
+import sys
+import boto3
+import eve
+import pytest
+from eve_dynamodb.dynamodb import DynamoDB
+
+DRIVER = os.environ.get('EVE_DYNAMODB_BENCHMARK_DRIVER', 'boto3')
+
+
+def test_import(benchmark):
+    """Benchmark importing the package in a fresh interpreter
+
+    :param benchmark: pytest-benchmark fixture
+    """
+
+    benchmark.pedantic(
+        subprocess.run, args=([sys.executable, '-c', 'import eve_dynamodb'],), kwargs={'check': True}, rounds=5
+    )
+
+
+@pytest.fixture(scope="module")
+def startup_table(aws) -> str:
+    """Returns the name of an empty table read by the startup benchmarks
+
+    :param aws: AWS fixture
+    :return: Table name
+    :rtype: str
+    """
+
+    if DRIVER != 'memory':
+        table = boto3.resource('dynamodb').create_table(
+            TableName='startup',
+            KeySchema=[{'AttributeName': '_id', 'KeyType': 'HASH'}],
+            AttributeDefinitions=[{'AttributeName': '_id', 'AttributeType': 'S'}],
+            BillingMode='PAY_PER_REQUEST'
+        )
+        table.wait_until_exists()
+
+    return 'startup'
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason="requires fork")
+@pytest.mark.parametrize('warm_up', (False, True), ids=('cold', 'warm'))
+def test_first_response(benchmark, startup_table: str, warm_up: bool):
+    """Benchmark forking a worker from a preloaded application and serving its first response
+
+    :param benchmark: pytest-benchmark fixture
+    :param str startup_table: Table name
+    :param bool warm_up: Whether the driver is warmed up before forking
+    """
+
+    def preload():
+        boto3.DEFAULT_SESSION = None
+        settings = {
+            'DYNAMODB_DRIVER': DRIVER,
+            'DYNAMODB_WARM_UP': warm_up,
+            'DOMAIN': {startup_table: {'schema': {'_id': {'type': 'string'}}}}
+        }
+        return (eve.Eve(settings=settings, data=DynamoDB),), {}
+
+    def first_response(server: eve.Eve):
+        pid = os.fork()
+
+        if pid == 0:
+            status = server.test_client().get(f"/{startup_table}").status_code
+            os._exit(0 if status == 200 else 1)  # pylint: disable=protected-access
+
+        assert os.waitpid(pid, 0)[1] == 0
+
+    benchmark.pedantic(first_response, setup=preload, rounds=10)
@@ -0,0 +1,335 @@
+"""Index advisor
+
+Keeps a bounded, sampled histogram of the filter shapes each resource is read with: the attributes pinned by equality,
+constrained by range or sorted on, together with the access path they were served by and what reading them cost.
+Shapes served by scans are turned into global secondary index recommendations ranked by the read capacity they would
+save, optionally as ``UpdateTable`` arguments.
+
+Dump the report with ``app.data.advisor.dump(path)`` and read it with::
+
+    python -m eve_dynamodb.advisor report.json --top 10 --update-table
+
+.. codeauthor:: John Lane <john.lane93@gmail.com>
+
+"""
+
+import argparse
+import math
+import random
+import sys
+import threading
+import simplejson as json
+
+from eve_dynamodb.aggregation import attribute_type
+from eve_dynamodb.planner import RANGE_OPERATORS, Schema, conjuncts
+
+KEY_TYPES = ('S', 'N', 'B')
+
+
+def shape(query: dict, sort: list = None) -> dict:
+    """Extract the shape of a query
+
+    :param dict query: Query
+    :param list sort: Requested sort, as ``(field, direction)`` pairs
+    :return: Equality fields, range fields, other fields and sort field, with the key types of their values
+    :rtype: dict
+    """
+
+    equality, ranges, other, types = set(), set(), set(), {}
+
+    for term in conjuncts(query):
+        field, value = next(iter(term.items()))
+
+        if field.startswith('$'):
+            continue
+
+        if isinstance(value, dict) and list(value.keys()) == ['$eq']:
+            value = value['$eq']
+
+        if not isinstance(value, (dict, list, tuple)):
+            equality.add(field)
+        elif isinstance(value, dict) and value and set(value.keys()) <= set(RANGE_OPERATORS):
+            ranges.add(field)
+            value = next(iter(value.values()))
+            value = value[0] if isinstance(value, (list, tuple)) and value else value
+        else:
+            other.add(field)
+            continue
+
+        if attribute_type(value) in KEY_TYPES:
+            types[field] = attribute_type(value)
+
+    return {
+        'equality': sorted(equality),
+        'range': sorted(ranges - equality),
+        'other': sorted(other - equality - ranges),
+        'sort': sort[0][0] if sort else None,
+        'types': types
+    }
+
+
+def estimated_capacity(stats: dict) -> float:
+    """Estimate the read capacity spent by recorded reads
+
+    Uses the consumed capacity reported by DynamoDB when available, and otherwise half a read unit per 4 KB scanned,
+    sizing scanned items like returned ones.
+
+    :param dict stats: Recorded shape stats
+    :return: Read capacity units
+    :rtype: float
+    """
+
+    if stats['capacity']:
+        return stats['capacity']
+
+    size = stats['bytes'] / stats['returned'] if stats['returned'] else 1024
+    return math.ceil(stats['scanned'] * size / 4096) * 0.5
+
+
+class IndexAdvisor:
+    """Sampled histogram of filter shapes per resource, recommending global secondary indexes
+    """
+
+    def __init__(self, sample_rate: float = 0.0, max_shapes: int = 256, seed: int = None):
+        """Initialize index advisor
+
+        :param float sample_rate: Fraction of reads recorded, 0 disables the advisor
+        :param int max_shapes: Shapes kept per resource, the least seen are evicted first
+        :param int seed: Seed of the sampler
+        """
+
+        self.sample_rate = sample_rate
+        self.max_shapes = max_shapes
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._shapes = {}
+        self._tables = {}
+
+    @property
+    def enabled(self) -> bool:
+        """Whether reads are being recorded
+
+        :return: True, if enabled. False otherwise
+        :rtype: bool
+        """
+
+        return self.sample_rate > 0
+
+    def sampled(self) -> bool:
+        """Decide whether the current read is recorded
+
+        :return: True, if the read should be recorded. False otherwise
+        :rtype: bool
+        """
+
+        return self.enabled and (self.sample_rate >= 1 or self._random.random() < self.sample_rate)
+
+    def record(self, resource: str, table: str, schema: Schema, query: dict, sort: list, projection, explain):
+        """Record a sampled read
+
+        :param str resource: Resource name
+        :param str table: Table name
+        :param Schema schema: Table schema
+        :param dict query: Query
+        :param list sort: Requested sort
+        :param projection: Projected fields, None for every field
+        :param explain: Explanation of the read, carrying its plan and measured cost
+        """
+
+        extracted = shape(query, sort)
+        key = json.dumps({field: extracted[field] for field in ('equality', 'range', 'other', 'sort')},
+                         sort_keys=True)
+        total = explain.sink.total()
+
+        with self._lock:
+            self._tables[resource] = {
+                'table': table,
+                'indexes': [[index.hash_key, index.range_key] for index in [schema.table] + schema.indexes]
+            }
+            shapes = self._shapes.setdefault(resource, {})
+
+            if key not in shapes and len(shapes) >= self.max_shapes:
+                del shapes[min(shapes, key=lambda existing: shapes[existing]['samples'])]
+
+            stats = shapes.setdefault(key, dict(
+                extracted, samples=0, scanned=0, returned=0, bytes=0, capacity=0.0, access_paths={}, projection=[]
+            ))
+            stats['samples'] += 1
+            stats['types'].update(extracted['types'])
+
+            for field in ('scanned', 'returned', 'bytes', 'capacity'):
+                stats[field] += total[field]
+
+            path = explain.plan.access_path
+            stats['access_paths'][path] = stats['access_paths'].get(path, 0) + 1
+
+            if projection is None or stats['projection'] is None:
+                stats['projection'] = None
+            else:
+                stats['projection'] = sorted(set(stats['projection']) | set(projection))
+
+    def report(self) -> dict:
+        """Return the recorded histogram
+
+        :return: Histogram per resource
+        :rtype: dict
+        """
+
+        with self._lock:
+            return json.loads(json.dumps({
+                'sample_rate': self.sample_rate,
+                'resources': {
+                    resource: dict(self._tables.get(resource, {}), shapes=list(shapes.values()))
+                    for resource, shapes in self._shapes.items()
+                }
+            }))
+
+    def dump(self, path: str):
+        """Write the report to a file
+
+        :param str path: File path
+        """
+
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(self.report(), file, indent=2)
+
+
+def recommend(report: dict) -> list:
+    """Recommend global secondary indexes for the shapes a report saw served by scans
+
+    Each shape scanning more than it returns is served by an index partitioned on its most commonly pinned field and
+    sorted on its range or sort field. Shapes sharing a key schema are merged, and recommendations are ranked by the
+    read capacity they would have saved, scaled up by the sampling rate.
+
+    :param dict report: Advisor report
+    :return: Recommendations, most valuable first
+    :rtype: list
+    """
+
+    recommendations = {}
+    scale = 1 / report.get('sample_rate') if report.get('sample_rate') else 1
+
+    for resource, recorded in report.get('resources', {}).items():
+        shapes = recorded.get('shapes', [])
+        existing = {tuple(index) for index in recorded.get('indexes', [])}
+        popularity = {}
+
+        for stats in shapes:
+            for field in stats['equality']:
+                popularity[field] = popularity.get(field, 0) + stats['samples']
+
+        for stats in shapes:
+            scans = sum(count for path, count in stats['access_paths'].items() if path.startswith('Scan'))
+
+            if not scans or not stats['equality'] or stats['scanned'] <= stats['returned']:
+                continue
+
+            hash_key = max(stats['equality'], key=lambda field: (popularity[field], field))
+            range_key = (stats['range'] or [stats['sort']])[0]
+            range_key = range_key if range_key != hash_key else None
+
+            if (hash_key, range_key) in existing:
+                continue
+
+            capacity = estimated_capacity(stats) * scans / stats['samples']
+            saved = capacity * (1 - stats['returned'] / stats['scanned']) * scale
+            key = (resource, hash_key, range_key)
+            recommendation = recommendations.setdefault(key, {
+                'resource': resource,
+                'table': recorded.get('table', resource),
+                'index_name': '-'.join(field for field in (hash_key, range_key) if field),
+                'hash_key': hash_key,
+                'range_key': range_key,
+                'types': {},
+                'projection': [],
+                'shapes': 0,
+                'samples': 0,
+                'estimated_rcu_saved': 0.0
+            })
+            recommendation['types'].update(stats['types'])
+            recommendation['shapes'] += 1
+            recommendation['samples'] += stats['samples']
+            recommendation['estimated_rcu_saved'] += saved
+
+            if stats['projection'] is None or recommendation['projection'] is None:
+                recommendation['projection'] = None
+            else:
+                fields = set(stats['projection']) | set(stats['equality']) | set(stats['range']) | set(stats['other'])
+                recommendation['projection'] = sorted(set(recommendation['projection']) | fields)
+
+    return sorted(recommendations.values(), key=lambda recommendation: -recommendation['estimated_rcu_saved'])
+
+
+def update_table(recommendation: dict) -> dict:
+    """Build the ``UpdateTable`` arguments creating a recommended index
+
+    :param dict recommendation: Recommendation
+    :return: UpdateTable arguments
+    :rtype: dict
+    """
+
+    keys = [(recommendation['hash_key'], 'HASH')]
+
+    if recommendation['range_key']:
+        keys.append((recommendation['range_key'], 'RANGE'))
+
+    key_names = {name for name, _ in keys}
+    projected = [field for field in recommendation['projection'] or [] if field not in key_names]
+
+    if recommendation['projection'] is None or len(projected) > 20:
+        projection = {'ProjectionType': 'ALL'}
+    elif projected:
+        projection = {'ProjectionType': 'INCLUDE', 'NonKeyAttributes': projected}
+    else:
+        projection = {'ProjectionType': 'KEYS_ONLY'}
+
+    return {
+        'TableName': recommendation['table'],
+        'AttributeDefinitions': [
+            {'AttributeName': name, 'AttributeType': recommendation['types'].get(name, 'S')} for name, _ in keys
+        ],
+        'GlobalSecondaryIndexUpdates': [{
+            'Create': {
+                'IndexName': recommendation['index_name'],
+                'KeySchema': [{'AttributeName': name, 'KeyType': kind} for name, kind in keys],
+                'Projection': projection
+            }
+        }]
+    }
+
+
+def main(argv: list = None) -> int:
+    """Print the recommendations of a dumped report
+
+    :param list argv: Command line arguments
+    :return: Exit code
+    :rtype: int
+    """
+
+    parser = argparse.ArgumentParser(prog='python -m eve_dynamodb.advisor', description=__doc__.split('\n')[0])
+    parser.add_argument('report', help="report written by IndexAdvisor.dump")
+    parser.add_argument('--top', type=int, default=10, help="number of recommendations to print")
+    parser.add_argument('--update-table', action='store_true', help="print UpdateTable arguments as JSON")
+    args = parser.parse_args(argv)
+
+    with open(args.report, encoding='utf-8') as file:
+        recommendations = recommend(json.load(file))[:args.top]
+
+    if args.update_table:
+        json.dump([update_table(recommendation) for recommendation in recommendations], sys.stdout, indent=2)
+        sys.stdout.write('\n')
+        return 0
+
+    for recommendation in recommendations:
+        sys.stdout.write(
+            f"{recommendation['resource']}: {recommendation['index_name']} "
+            f"(HASH {recommendation['hash_key']}"
+            f"{', RANGE ' + recommendation['range_key'] if recommendation['range_key'] else ''}) "
+            f"saves ~{recommendation['estimated_rcu_saved']:.1f} RCU over {recommendation['samples']} sampled reads\n"
+        )
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
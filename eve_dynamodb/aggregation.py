@@ -0,0 +1,928 @@
+"""Evaluate Mongo-style aggregation pipelines over DynamoDB results
+
+Leading ``$match`` stages and the fields required by the first shaping stage (``$project`` or ``$group``) are pushed
+down into the Scan, every other stage is evaluated in a streaming executor over the paginated results.
+
+.. codeauthor:: John Lane <john.lane93@gmail.com>
+
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from functools import reduce
+from numbers import Number
+from typing import Callable, Iterable
+
+
+class AggregationResult:
+    """Aggregation result, behaves like the cursor Eve expects from ``aggregate``
+    """
+
+    def __init__(self, documents: list):
+        """Initialize aggregation result
+
+        :param list documents: Aggregated documents
+        """
+
+        self._documents = documents
+        self._iterator = iter(documents)
+
+    def __iter__(self):
+        """Return next document from result
+
+        :return:
+        """
+
+        return iter(self._documents)
+
+    def next(self) -> dict:
+        """Return the next aggregated document
+
+        :return: Aggregated document
+        :rtype: dict
+        """
+
+        return next(self._iterator)
+
+    __next__ = next
+
+    def count(self, **_kwargs) -> int:
+        """Return a count of all documents
+
+        :param dict _kwargs: Extra arguments
+        :return: Count of all documents
+        :rtype: int
+        """
+
+        return len(self._documents)
+
+
+def get_field(document: dict, path: str):
+    """Resolve a dotted field path against a document
+
+    :param dict document: Document
+    :param str path: Field path, nested fields use dot notation
+    :return: Field value or None, if the field is missing
+    """
+
+    value = document
+
+    for segment in path.split('.'):
+        if not isinstance(value, dict) or segment not in value:
+            return None
+        value = value[segment]
+
+    return value
+
+
+def has_field(document: dict, path: str) -> bool:
+    """Check whether a dotted field path exists within a document
+
+    :param dict document: Document
+    :param str path: Field path, nested fields use dot notation
+    :return: True, if the field exists. False otherwise
+    :rtype: bool
+    """
+
+    value = document
+
+    for segment in path.split('.'):
+        if not isinstance(value, dict) or segment not in value:
+            return False
+        value = value[segment]
+
+    return True
+
+
+
+def project_document(document: dict, fields: list) -> dict:
+    """Keep the projected fields of a document, as a projection expression would
+
+    :param dict document: Document
+    :param list fields: Projected fields, nested fields use dot notation
+    :return: Projected document
+    :rtype: dict
+    """
+
+    projected = {}
+
+    for field in fields:
+        if not has_field(document, field):
+            continue
+
+        *parents, leaf = field.split('.')
+        target = projected
+
+        for segment in parents:
+            target = target.setdefault(segment, {})
+
+        target[leaf] = get_field(document, field)
+
+    return projected
+
+def _compare(comparison: Callable, left, right) -> bool:
+    """Compare two values, values which cannot be ordered never match
+
+    :param Callable comparison: Comparison to perform
+    :param left: Left value
+    :param right: Right value
+    :return: Comparison result
+    :rtype: bool
+    """
+
+    try:
+        return bool(comparison(left, right))
+    except TypeError:
+        return False
+
+
+def _contains(value, needle) -> bool:
+    """Check whether a string, list or set contains a value
+
+    :param value: Container
+    :param needle: Value to look for
+    :return: True, if the value is contained. False otherwise
+    :rtype: bool
+    """
+
+    try:
+        return needle in value
+    except TypeError:
+        return False
+
+
+def attribute_type(value) -> str:
+    """Return the DynamoDB attribute type of a value
+
+    :param value: Value
+    :return: DynamoDB attribute type
+    :rtype: str
+    """
+
+    if value is None:
+        return 'NULL'
+
+    if isinstance(value, bool):
+        return 'BOOL'
+
+    if isinstance(value, Number):
+        return 'N'
+
+    if isinstance(value, str):
+        return 'S'
+
+    if isinstance(value, (bytes, bytearray)):
+        return 'B'
+
+    if isinstance(value, dict):
+        return 'M'
+
+    if isinstance(value, (set, frozenset)):
+        sample = next(iter(value), '')
+        return 'NS' if isinstance(sample, Number) else 'BS' if isinstance(sample, (bytes, bytearray)) else 'SS'
+
+    return 'L'
+
+
+def match_document(document: dict, lookup: dict, parent: str = None) -> bool:
+    """Evaluate a query against a document, mirroring :func:`eve_dynamodb.expression.build_attr_expression`
+
+    :param dict document: Document
+    :param dict lookup: Query expression
+    :param str parent: Parent key
+    :return: True, if the document matches. False otherwise
+    :rtype: bool
+    """
+
+    operators = {
+        '$eq': lambda key, value: get_field(document, key) == value,
+        '$ne': lambda key, value: get_field(document, key) != value,
+        '$lt': lambda key, value: _compare(lambda a, b: a < b, get_field(document, key), value),
+        '$lte': lambda key, value: _compare(lambda a, b: a <= b, get_field(document, key), value),
+        '$gt': lambda key, value: _compare(lambda a, b: a > b, get_field(document, key), value),
+        '$gte': lambda key, value: _compare(lambda a, b: a >= b, get_field(document, key), value),
+        '$in': lambda key, value: get_field(document, key) in value,
+        '$nin': lambda key, value: get_field(document, key) not in value,
+        '$between': lambda key, value: _compare(lambda a, b: b[0] <= a <= b[1], get_field(document, key), value),
+        '$contains': lambda key, value: _contains(get_field(document, key), value),
+        '$exists': lambda key, value: has_field(document, key) == bool(value),
+        '$size': lambda key, value: _compare(lambda a, b: len(a) == b, get_field(document, key), value),
+        '$startsWith': lambda key, value: isinstance(get_field(document, key), str) and get_field(
+            document, key).startswith(value),
+        '$type': lambda key, value: has_field(document, key) and attribute_type(get_field(document, key)) == value
+    }
+
+    for k, v in lookup.items():
+        operator = operators.get(k, operators['$eq'])
+
+        if isinstance(v, dict):
+            matched = match_document(document, v, k)
+
+        elif k == '$not' and isinstance(v, (list, tuple)):
+            matched = not all(match_document(document, condition) for condition in v)
+
+        elif k == '$and' and isinstance(v, (list, tuple)):
+            matched = all(match_document(document, condition) for condition in v)
+
+        elif k == '$or' and isinstance(v, (list, tuple)):
+            matched = any(match_document(document, condition) for condition in v)
+
+        elif k == '$nor' and isinstance(v, (list, tuple)):
+            matched = not any(match_document(document, condition) for condition in v)
+
+        elif k == '$xor' and isinstance(v, (list, tuple)):
+
+            if len(v) != 2:
+                raise ValueError("Error: $xor can only be computed against two values at a time")
+
+            matched = match_document(document, v[0]) != match_document(document, v[1])
+
+        else:
+            matched = operator(parent if parent else k, v)
+
+        if not matched:
+            return False
+
+    return True
+
+
+def evaluate(document: dict, expression):
+    """Evaluate an aggregation expression, ``"$field"`` references a document field
+
+    :param dict document: Document
+    :param expression: Aggregation expression
+    :return: Evaluated value
+    """
+
+    if isinstance(expression, str) and expression.startswith('$'):
+        return get_field(document, expression[1:])
+
+    if isinstance(expression, dict):
+        return {key: evaluate(document, value) for key, value in expression.items()}
+
+    return expression
+
+
+def referenced_fields(expression) -> set:
+    """Collect the root fields referenced by an aggregation expression
+
+    :param expression: Aggregation expression
+    :return: Referenced root fields
+    :rtype: set
+    """
+
+    if isinstance(expression, str) and expression.startswith('$'):
+        return {expression[1:].split('.')[0]}
+
+    if isinstance(expression, dict):
+        return reduce(set.union, (referenced_fields(value) for value in expression.values()), set())
+
+    if isinstance(expression, (list, tuple)):
+        return reduce(set.union, (referenced_fields(value) for value in expression), set())
+
+    return set()
+
+
+def _freeze(value):
+    """Convert a value into a hashable equivalent
+
+    :param value: Value
+    :return: Hashable value
+    """
+
+    if isinstance(value, dict):
+        return tuple((key, _freeze(val)) for key, val in value.items())
+
+    if isinstance(value, (list, set)):
+        return tuple(_freeze(val) for val in value)
+
+    return value
+
+
+class _Accumulator:
+    """Group accumulator, holds constant state per group
+    """
+
+    def __init__(self, operator: str, expression):
+        """Initialize accumulator
+
+        :param str operator: Accumulator operator
+        :param expression: Expression to accumulate
+        """
+
+        self.operator = operator
+        self.expression = expression
+        self.value = 0 if operator in ('$sum', '$count') else None
+        self.count = 0
+
+    def add(self, document: dict):
+        """Accumulate a document
+
+        :param dict document: Document
+        """
+
+        if self.operator == '$count':
+            self.value += 1
+            return
+
+        value = evaluate(document, self.expression)
+
+        if self.operator == '$sum':
+            if _is_numeric(value):
+                self.value += value
+
+        elif self.operator == '$avg':
+            if _is_numeric(value):
+                self.value = value if self.value is None else self.value + value
+                self.count += 1
+
+        elif value is not None:
+            if self.value is None or _compare(lambda a, b: a < b if self.operator == '$min' else a > b,
+                                              value, self.value):
+                self.value = value
+
+    def merge(self, other: '_Accumulator'):
+        """Merge partial state from another accumulator of the same kind
+
+        :param _Accumulator other: Partial accumulator
+        """
+
+        if self.operator in ('$sum', '$count'):
+            self.value += other.value
+
+        elif self.operator == '$avg':
+            if other.value is not None:
+                self.value = other.value if self.value is None else self.value + other.value
+                self.count += other.count
+
+        elif other.value is not None:
+            if self.value is None or _compare(lambda a, b: a < b if self.operator == '$min' else a > b,
+                                              other.value, self.value):
+                self.value = other.value
+
+    def result(self):
+        """Return the accumulated value
+
+        :return: Accumulated value
+        """
+
+        if self.operator == '$avg':
+            return self.value / self.count if self.count else None
+
+        return self.value
+
+
+def _is_numeric(value) -> bool:
+    """Check whether a value can be summed, booleans are ignored as they are in Mongo
+
+    :param value: Value
+    :return: True, if the value is numeric. False otherwise
+    :rtype: bool
+    """
+
+    return isinstance(value, Number) and not isinstance(value, bool)
+
+
+class _Stage:
+    """Pipeline stage, receives documents one at a time
+    """
+
+    blocking = False
+
+    def feed(self, document: dict) -> Iterable:
+        """Process a document
+
+        :param dict document: Document
+        :return: Documents to pass downstream
+        :rtype: Iterable
+        """
+
+        yield document
+
+    def drain(self) -> Iterable:
+        """Flush any held documents once the input is exhausted
+
+        :return: Documents to pass downstream
+        :rtype: Iterable
+        """
+
+        return ()
+
+    @property
+    def exhausted(self) -> bool:
+        """Whether the stage will not accept any more documents
+
+        :return: True, if exhausted. False otherwise
+        :rtype: bool
+        """
+
+        return False
+
+
+class _MatchStage(_Stage):
+    """$match stage
+    """
+
+    def __init__(self, lookup: dict):
+        self.lookup = lookup
+
+    def feed(self, document: dict) -> Iterable:
+        if match_document(document, self.lookup):
+            yield document
+
+
+class _ProjectStage(_Stage):
+    """$project stage
+    """
+
+    def __init__(self, projection: dict):
+        self.projection = projection
+        fields = [value for key, value in projection.items() if key != '_id']
+        self.exclusive = bool(fields) and all(value in (0, False) for value in fields)
+
+    @property
+    def fields(self) -> set:
+        """Root fields required to evaluate the projection, or None for an exclusion projection
+
+        :return: Required root fields
+        :rtype: set
+        """
+
+        if self.exclusive:
+            return None
+
+        fields = {'_id'} if self.projection.get('_id', 1) not in (0, False) else set()
+
+        for key, value in self.projection.items():
+            if value in (1, True):
+                fields.add(key)
+            elif value not in (0, False):
+                fields |= referenced_fields(value)
+
+        return fields
+
+    def feed(self, document: dict) -> Iterable:
+
+        if self.exclusive:
+            yield {key: value for key, value in document.items() if self.projection.get(key, 1) not in (0, False)}
+            return
+
+        projected = {'_id': document['_id']} if '_id' in document and self.projection.get('_id', 1) else {}
+
+        for key, value in self.projection.items():
+            if value in (0, False):
+                projected.pop(key, None)
+            elif value in (1, True):
+                if has_field(document, key):
+                    projected[key] = get_field(document, key)
+            else:
+                projected[key] = evaluate(document, value)
+
+        yield projected
+
+
+class _GroupStage(_Stage):
+    """$group stage, memory is constant per group
+    """
+
+    blocking = True
+    operators = ('$sum', '$count', '$min', '$max', '$avg')
+
+    def __init__(self, spec: dict):
+
+        if '_id' not in spec:
+            raise ValueError("Error: $group requires an _id expression")
+
+        self.key = spec['_id']
+        self.accumulators = {}
+        self.groups = {}
+
+        for field, accumulator in spec.items():
+            if field == '_id':
+                continue
+
+            if not isinstance(accumulator, dict) or len(accumulator) != 1:
+                raise ValueError(f"Error: $group field '{field}' must specify a single accumulator")
+
+            operator, expression = next(iter(accumulator.items()))
+
+            if operator not in self.operators:
+                raise ValueError(f"Error: unsupported accumulator {operator}")
+
+            self.accumulators[field] = (operator, expression)
+
+    @property
+    def fields(self) -> set:
+        """Root fields required to evaluate the group
+
+        :return: Required root fields
+        :rtype: set
+        """
+
+        return referenced_fields([self.key] + [expression for _, expression in self.accumulators.values()])
+
+    def feed(self, document: dict) -> Iterable:
+
+        key = evaluate(document, self.key)
+        frozen = _freeze(key)
+
+        if frozen not in self.groups:
+            self.groups[frozen] = (key, {
+                field: _Accumulator(operator, expression)
+                for field, (operator, expression) in self.accumulators.items()
+            })
+
+        for accumulator in self.groups[frozen][1].values():
+            accumulator.add(document)
+
+        return ()
+
+    def merge(self, other: '_GroupStage'):
+        """Merge partial groups computed over another portion of the input
+
+        :param _GroupStage other: Partial group stage
+        """
+
+        for frozen, (key, accumulators) in other.groups.items():
+
+            if frozen not in self.groups:
+                self.groups[frozen] = (key, accumulators)
+                continue
+
+            for field, accumulator in accumulators.items():
+                self.groups[frozen][1][field].merge(accumulator)
+
+    def drain(self) -> Iterable:
+
+        for key, accumulators in self.groups.values():
+            document = {'_id': key}
+            document.update({field: accumulator.result() for field, accumulator in accumulators.items()})
+            yield document
+
+
+class _SortKey:
+    """Sort key honouring per-field direction, missing values sort first as they do in Mongo
+    """
+
+    __slots__ = ('values', 'directions')
+
+    def __init__(self, values: tuple, directions: tuple):
+        self.values = values
+        self.directions = directions
+
+    def __lt__(self, other: '_SortKey') -> bool:
+
+        for left, right, direction in zip(self.values, other.values, self.directions):
+
+            if left == right:
+                continue
+
+            if left is None or right is None:
+                less = left is None
+            else:
+                try:
+                    less = left < right
+                except TypeError:
+                    less = str(left) < str(right)
+
+            return less if direction > 0 else not less
+
+        return False
+
+
+class _SortStage(_Stage):
+    """$sort stage, keeps only the top ``limit`` documents when followed by a $limit
+    """
+
+    blocking = True
+
+    def __init__(self, spec: dict, limit: int = None):
+        self.fields = tuple(spec.keys())
+        self.directions = tuple(spec.values())
+        self.limit = limit
+        self.documents = []
+
+    def _truncate(self):
+        self.documents.sort(key=lambda entry: entry[0])
+        del self.documents[self.limit:]
+
+    def feed(self, document: dict) -> Iterable:
+
+        key = _SortKey(tuple(get_field(document, field) for field in self.fields), self.directions)
+        self.documents.append((key, len(self.documents), document))
+
+        if self.limit is not None and len(self.documents) >= 2 * max(self.limit, 1):
+            self._truncate()
+
+        return ()
+
+    def drain(self) -> Iterable:
+
+        self.documents.sort(key=lambda entry: entry[0])
+
+        if self.limit is not None:
+            del self.documents[self.limit:]
+
+        for _, _, document in self.documents:
+            yield document
+
+
+class _SkipStage(_Stage):
+    """$skip stage
+    """
+
+    def __init__(self, skip: int):
+        self.skip = int(skip)
+
+    def feed(self, document: dict) -> Iterable:
+
+        if self.skip > 0:
+            self.skip -= 1
+            return
+
+        yield document
+
+
+class _LimitStage(_Stage):
+    """$limit stage
+    """
+
+    def __init__(self, limit: int):
+        self.remaining = int(limit)
+
+    def feed(self, document: dict) -> Iterable:
+
+        if self.remaining > 0:
+            self.remaining -= 1
+            yield document
+
+    @property
+    def exhausted(self) -> bool:
+        return self.remaining <= 0
+
+
+class _CountStage(_Stage):
+    """$count stage
+    """
+
+    blocking = True
+
+    def __init__(self, field: str):
+        self.field = field
+        self.count = 0
+
+    def feed(self, document: dict) -> Iterable:
+        self.count += 1
+        return ()
+
+    def drain(self) -> Iterable:
+
+        if self.count:
+            yield {self.field: self.count}
+
+
+class _FacetStage(_Stage):
+    """$facet stage, broadcasts every document to each sub-pipeline
+    """
+
+    blocking = True
+
+    def __init__(self, facets: dict):
+        self.facets = {name: _Executor(compile_stages(stages)) for name, stages in facets.items()}
+
+    def feed(self, document: dict) -> Iterable:
+
+        for executor in self.facets.values():
+            if not executor.saturated:
+                executor.push(document)
+
+        return ()
+
+    def drain(self) -> Iterable:
+        yield {name: executor.finish() for name, executor in self.facets.items()}
+
+    @property
+    def exhausted(self) -> bool:
+        return all(executor.saturated for executor in self.facets.values())
+
+
+def compile_stages(stages: list) -> list:
+    """Compile pipeline stages into executable stages
+
+    :param list stages: Pipeline stages
+    :return: Executable stages
+    :rtype: list
+    :raises: ValueError
+    """
+
+    compiled = []
+
+    for index, stage in enumerate(stages):
+
+        if not isinstance(stage, dict) or len(stage) != 1:
+            raise ValueError("Error: each pipeline stage must contain exactly one operator")
+
+        operator, spec = next(iter(stage.items()))
+        following = stages[index + 1] if index + 1 < len(stages) else {}
+
+        if operator == '$match':
+            compiled.append(_MatchStage(spec))
+        elif operator == '$project':
+            compiled.append(_ProjectStage(spec))
+        elif operator == '$group':
+            compiled.append(_GroupStage(spec))
+        elif operator == '$sort':
+            compiled.append(_SortStage(spec, following.get('$limit')))
+        elif operator == '$skip':
+            compiled.append(_SkipStage(spec))
+        elif operator == '$limit':
+            compiled.append(_LimitStage(spec))
+        elif operator == '$count':
+            compiled.append(_CountStage(spec))
+        elif operator == '$facet':
+            compiled.append(_FacetStage(spec))
+        else:
+            raise ValueError(f"Error: unsupported pipeline stage {operator}")
+
+    return compiled
+
+
+class _Executor:
+    """Push based executor over compiled stages
+    """
+
+    def __init__(self, stages: list):
+        self.stages = stages
+        self.results = []
+
+    def push(self, document: dict, index: int = 0):
+        """Push a document through the stages starting at ``index``
+
+        :param dict document: Document
+        :param int index: Stage index
+        """
+
+        if index == len(self.stages):
+            self.results.append(document)
+            return
+
+        for output in self.stages[index].feed(document):
+            self.push(output, index + 1)
+
+    def consume(self, documents: Iterable) -> '_Executor':
+        """Push documents until the input is exhausted or no stage needs more input
+
+        :param Iterable documents: Input documents
+        :return: Executor
+        :rtype: _Executor
+        """
+
+        for document in documents:
+            self.push(document)
+
+            if self.saturated:
+                break
+
+        return self
+
+    def finish(self) -> list:
+        """Drain blocking stages and return the results
+
+        :return: Resulting documents
+        :rtype: list
+        """
+
+        for index, stage in enumerate(self.stages):
+            for output in stage.drain():
+                self.push(output, index + 1)
+
+        return self.results
+
+    @property
+    def saturated(self) -> bool:
+        """Whether further input can no longer change the result
+
+        :return: True, if saturated. False otherwise
+        :rtype: bool
+        """
+
+        for stage in self.stages:
+            if stage.exhausted:
+                return True
+            if stage.blocking:
+                return False
+
+        return False
+
+
+def run_stages(stages: list, documents: Iterable) -> list:
+    """Run pipeline stages over a stream of documents
+
+    :param list stages: Pipeline stages
+    :param Iterable documents: Input documents
+    :return: Resulting documents
+    :rtype: list
+    """
+
+    return _Executor(compile_stages(stages)).consume(documents).finish()
+
+
+class Pipeline:
+    """Aggregation pipeline split into a pushed-down scan and an executor over the remaining stages
+    """
+
+    def __init__(self, stages: list):
+        """Initialize pipeline
+
+        :param list stages: Mongo-style pipeline stages
+        :raises: ValueError
+        """
+
+        stages = list(stages or [])
+        matches = []
+
+        while stages and isinstance(stages[0], dict) and list(stages[0].keys()) == ['$match']:
+            matches.append(stages.pop(0)['$match'])
+
+        self.stages = stages
+        self.match = reduce(lambda acc, val: {'$and': [acc, val]}, matches) if matches else {}
+        compile_stages(stages)
+
+    @property
+    def projection(self) -> list:
+        """Fields which need to be read to evaluate the pipeline, or None if every field is required
+
+        :return: Projected fields
+        :rtype: list
+        """
+
+        if not self.stages:
+            return None
+
+        stage = compile_stages(self.stages[:1])[0]
+
+        if isinstance(stage, (_ProjectStage, _GroupStage)) and stage.fields:
+            return sorted(stage.fields)
+
+        return None
+
+    @property
+    def decomposable(self) -> bool:
+        """Whether the pipeline can be computed as partial aggregates over disjoint inputs
+
+        :return: True, if partial aggregates can be merged. False otherwise
+        :rtype: bool
+        """
+
+        return self._partition() is not None
+
+    def _partition(self):
+        """Index of the first $group stage, if it is only preceded by streaming stages
+
+        :return: Index of the group stage or None
+        """
+
+        for index, stage in enumerate(compile_stages(self.stages)):
+            if isinstance(stage, _GroupStage):
+                return index
+            if stage.blocking or isinstance(stage, (_SkipStage, _LimitStage)):
+                return None
+
+        return None
+
+    def execute(self, documents: Iterable) -> list:
+        """Run the pipeline over a stream of documents
+
+        :param Iterable documents: Documents read from the table
+        :return: Resulting documents
+        :rtype: list
+        """
+
+        return run_stages(self.stages, documents)
+
+    def execute_parallel(self, sources: list) -> list:
+        """Run the pipeline over several streams, merging partial aggregates computed for each of them
+
+        :param list sources: Callables returning an iterable of documents, one per segment
+        :return: Resulting documents
+        :rtype: list
+        :raises: ValueError
+        """
+
+        partition = self._partition()
+
+        if partition is None:
+            raise ValueError("Error: pipeline cannot be computed in parallel")
+
+        def run(source: Callable) -> _Executor:
+            return _Executor(compile_stages(self.stages[:partition + 1])).consume(source())
+
+        with ThreadPoolExecutor(max_workers=len(sources)) as pool:
+            partials = list(pool.map(run, sources))
+
+        group = partials[0].stages[-1]
+
+        for partial in partials[1:]:
+            group.merge(partial.stages[-1])
+
+        executor = _Executor([group] + compile_stages(self.stages[partition + 1:]))
+        return executor.finish()
@@ -0,0 +1,144 @@
+"""Size bounded cache of collection result pages
+
+Entries are keyed by a canonical hash of the normalised query and invalidated by a per-table generation counter the
+data layer bumps on every write, so stale pages are never served after a local write and simply age out of the LRU.
+
+.. codeauthor:: John Lane <john.lane93@gmail.com>
+
+"""
+
+from collections import OrderedDict
+import copy
+import hashlib
+import threading
+import time
+import simplejson as json
+
+
+def normalise(query):
+    """Normalise a query so equivalent queries share the same representation
+
+    Nested ``$and`` clauses are flattened and the terms of commutative operators are put in a canonical order.
+
+    :param query: Query expression
+    :return: Normalised query
+    """
+
+    if isinstance(query, dict):
+        normalised = {}
+
+        for key, value in query.items():
+            if key in ('$and', '$or', '$nor') and isinstance(value, (list, tuple)):
+                terms = [normalise(term) for term in value]
+
+                if key == '$and':
+                    terms = [nested for term in terms for nested in (
+                        term['$and'] if list(term.keys()) == ['$and'] else [term]
+                    )]
+
+                normalised[key] = sorted(terms, key=canonical)
+            else:
+                normalised[key] = normalise(value)
+
+        if list(normalised.keys()) == ['$and'] and len(normalised['$and']) == 1:
+            return normalised['$and'][0]
+
+        return normalised
+
+    if isinstance(query, (list, tuple)):
+        return [normalise(value) for value in query]
+
+    return query
+
+
+def canonical(value) -> str:
+    """Serialise a value deterministically
+
+    :param value: Value
+    :return: Canonical representation
+    :rtype: str
+    """
+
+    return json.dumps(value, sort_keys=True, default=str)
+
+
+class ResultCache:
+    """LRU cache of compact result pages with per-entry expiry
+    """
+
+    def __init__(self, max_entries: int = 0):
+        """Initialize result cache
+
+        :param int max_entries: Maximum number of cached pages, 0 disables the cache
+        """
+
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def key(self, table: str, **spec) -> str:
+        """Compute the cache key of a request against the current generation of a table
+
+        :param str table: Table name
+        :param dict spec: Everything that determines the result page
+        :return: Cache key
+        :rtype: str
+        """
+
+        spec = normalise(spec)
+        generation = self._generations.get(table, 0)
+        return hashlib.sha1(canonical([table, generation, spec]).encode('utf-8')).hexdigest()
+
+    def get(self, key: str):
+        """Return a copy of a cached page
+
+        :param str key: Cache key
+        :return: Cached page or None, if missing or expired
+        """
+
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is None:
+                return None
+
+            expires, page = entry
+
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+
+        return copy.deepcopy(page)
+
+    def put(self, key: str, page, ttl: float):
+        """Cache a page
+
+        :param str key: Cache key
+        :param page: Compact result page
+        :param float ttl: Seconds the page remains valid
+        """
+
+        if not self.max_entries or ttl <= 0:
+            return
+
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, copy.deepcopy(page))
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, table: str):
+        """Invalidate every page cached for a table
+
+        :param str table: Table name
+        """
+
+        with self._lock:
+            self._generations[table] = self._generations.get(table, 0) + 1
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -1,19 +1,42 @@
 """
 """
 
+import ast
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 import decimal
+import functools
+import heapq
 import itertools
-from typing import Union
+import threading
+from typing import Callable, Iterable, Iterator, Union
 import boto3
 from botocore.exceptions import ClientError as BotoCoreClientError
 from bson import decimal128, ObjectId
 from bson.dbref import DBRef
+from eve.auth import requires_auth
 from eve.io.base import DataLayer
 from eve.utils import ParsedRequest, config, debug_error_message, str_to_date, validate_filters
-from flask import Flask, abort
+from flask import Flask, Response, abort, request
 import simplejson as json
 
-from eve_dynamodb.expression import build_attr_expression, build_key_expression
+from eve_dynamodb.advisor import IndexAdvisor
+from eve_dynamodb.aggregation import AggregationResult, Pipeline, match_document, project_document, run_stages
+from eve_dynamodb.cache import ResultCache
+from eve_dynamodb.explain import Explain, SlowOperationLog, explain_requested, explanations
+from eve_dynamodb.expression import (
+    build_attr_expression, build_key_expression, build_projection_expression, build_update_expression
+)
+from eve_dynamodb.export import ENCODERS, Exporter
+from eve_dynamodb.hedging import Hedger, check_deadline, request_deadline, retry_unprocessed, start_deadline
+from eve_dynamodb.hotkeys import HotKeys, WriteSharding
+from eve_dynamodb.identity import MISSING, freeze_key, identity_map, single_flight
+from eve_dynamodb.instrumentation import Instrumentation, InstrumentedTable, request_sink
+from eve_dynamodb.planner import Plan, Schema, choose_plan
+from eve_dynamodb.timeline import Timeline
+from eve_dynamodb.rollup import (
+    RollupTable, apply_updates, equality_terms, rollup_for_group, rollups_for, table_definition
+)
 
 """
 String/Set
@@ -59,13 +82,21 @@ class DynamoDBResult:
         :rtype: int
         """
 
-        return self._result['Count'] if 'Count' not in self._result else 0
+        return self._result['Count'] if 'Count' in self._result else 0
 
 
 class DynamoDB(DataLayer):
     """DynamoDB data layer access for Eve REST API
     """
 
+    OPERATIONS = (
+        'BatchGetItem', 'BatchWriteItem', 'DeleteItem', 'DescribeTable', 'GetItem', 'PutItem', 'Query', 'Scan',
+        'UpdateItem'
+    )
+
+    _connection = None
+    _settings = None
+
     serializers = {
         'boolean': lambda v: {"1": True, "true": True, "0": False, "false": False}[str(v).lower()],
         'datetime': str_to_date,
@@ -87,7 +118,178 @@ class DynamoDB(DataLayer):
         :param Flask app: Flask application
         """
 
-        self.driver = boto3.resource('dynamodb')
+        app.config.setdefault('DYNAMODB_ROLLUP_TABLE', 'eve_rollups')
+        app.config.setdefault('DYNAMODB_IDENTITY_MAP', True)
+        app.config.setdefault('DYNAMODB_SINGLE_FLIGHT', True)
+        app.config.setdefault('DYNAMODB_RESULT_CACHE_SIZE', 0)
+        app.config.setdefault('DYNAMODB_RESULT_CACHE_TTL', 0)
+        app.config.setdefault('DYNAMODB_EXISTS_CACHE_SIZE', 1024)
+        app.config.setdefault('DYNAMODB_EXISTS_CACHE_TTL', 0)
+        app.config.setdefault('DYNAMODB_PROBE_LIMIT', 1)
+        app.config.setdefault('DYNAMODB_INSTRUMENTATION_SINKS', [])
+        app.config.setdefault('DYNAMODB_DEBUG_HEADERS', False)
+        app.config.setdefault('DYNAMODB_DRIVER', 'boto3')
+        app.config.setdefault('DYNAMODB_MEMORY_TABLES', [])
+        app.config.setdefault('DYNAMODB_MEMORY_LATENCY', 0.0)
+        app.config.setdefault('DYNAMODB_MEMORY_READ_CAPACITY', 0)
+        app.config.setdefault('DYNAMODB_MEMORY_WRITE_CAPACITY', 0)
+        app.config.setdefault('DYNAMODB_SCAN_SEGMENTS', 1)
+        app.config.setdefault('DYNAMODB_MAX_FANOUT', 100)
+        app.config.setdefault('DYNAMODB_FANOUT_WORKERS', 16)
+        app.config.setdefault('DYNAMODB_BATCH_MAX_ATTEMPTS', 8)
+        app.config.setdefault('DYNAMODB_BATCH_BACKOFF', 0.05)
+        app.config.setdefault('DYNAMODB_EXPLAIN', False)
+        app.config.setdefault('DYNAMODB_EXPLAIN_PARAM', 'explain')
+        app.config.setdefault('DYNAMODB_SLOW_LATENCY', 0)
+        app.config.setdefault('DYNAMODB_SLOW_SCANNED_RATIO', 0)
+        app.config.setdefault('DYNAMODB_ADVISOR_SAMPLE_RATE', 0)
+        app.config.setdefault('DYNAMODB_ADVISOR_MAX_SHAPES', 256)
+        app.config.setdefault('DYNAMODB_WARM_UP', False)
+        app.config.setdefault('DYNAMODB_HEDGE_PERCENTILE', 0)
+        app.config.setdefault('DYNAMODB_HEDGE_MIN_DELAY', 0.001)
+        app.config.setdefault('DYNAMODB_HEDGE_WORKERS', 16)
+        app.config.setdefault('DYNAMODB_REQUEST_TIMEOUT', 0)
+        app.config.setdefault('DYNAMODB_DEADLINE_HEADER', None)
+        app.config.setdefault('DYNAMODB_EXPORT_SEGMENTS', 4)
+        app.config.setdefault('DYNAMODB_EXPORT_URL', None)
+        app.config.setdefault('DYNAMODB_HOT_KEY_CAPACITY', 64)
+        app.config.setdefault('DYNAMODB_HOT_KEY_SHARE', 0.1)
+        app.config.setdefault('DYNAMODB_HOT_KEY_MIN_COUNT', 50)
+        app.config.setdefault('DYNAMODB_HOT_KEY_WINDOW', 10000)
+        app.config.setdefault('DYNAMODB_HOT_KEY_CACHE_SIZE', 1024)
+        app.config.setdefault('DYNAMODB_HOT_KEY_CACHE_TTL', 0)
+
+        self._settings = app.config
+        self._driver_lock = threading.Lock()
+        self.schemas = {}
+        self.slow_log = SlowOperationLog(app.config['DYNAMODB_SLOW_LATENCY'], app.config['DYNAMODB_SLOW_SCANNED_RATIO'])
+        self.advisor = IndexAdvisor(
+            app.config['DYNAMODB_ADVISOR_SAMPLE_RATE'], app.config['DYNAMODB_ADVISOR_MAX_SHAPES']
+        )
+        self.result_cache = ResultCache(app.config['DYNAMODB_RESULT_CACHE_SIZE'])
+        self.exists_cache = ResultCache(app.config['DYNAMODB_EXISTS_CACHE_SIZE'])
+        self.hedger = Hedger(
+            app.config['DYNAMODB_HEDGE_PERCENTILE'], app.config['DYNAMODB_HEDGE_MIN_DELAY'],
+            workers=app.config['DYNAMODB_HEDGE_WORKERS']
+        )
+        self.instrumentation = Instrumentation(
+            app.config['DYNAMODB_INSTRUMENTATION_SINKS'],
+            per_request=app.debug and app.config['DYNAMODB_DEBUG_HEADERS']
+        )
+        self.hot_keys = HotKeys(
+            app.config['DYNAMODB_HOT_KEY_CAPACITY'], app.config['DYNAMODB_HOT_KEY_SHARE'],
+            app.config['DYNAMODB_HOT_KEY_MIN_COUNT'], app.config['DYNAMODB_HOT_KEY_WINDOW'],
+            notify=self.instrumentation.hot_key
+        )
+        self.hot_key_cache = ResultCache(app.config['DYNAMODB_HOT_KEY_CACHE_SIZE'])
+
+        if self.instrumentation.per_request:
+            app.after_request(self._debug_headers)
+
+        if hasattr(app, 'on_fetched_resource'):
+            app.on_fetched_resource += self._attach_explain
+            app.on_fetched_item += self._attach_explain
+
+        if app.config['DYNAMODB_REQUEST_TIMEOUT'] or app.config['DYNAMODB_DEADLINE_HEADER']:
+            app.before_request(lambda: start_deadline(
+                app.config['DYNAMODB_REQUEST_TIMEOUT'], app.config['DYNAMODB_DEADLINE_HEADER']
+            ))
+
+        if app.config['DYNAMODB_EXPORT_URL'] and hasattr(app, 'api_prefix'):
+            app.add_url_rule(
+                f"{app.api_prefix}/{app.config['DYNAMODB_EXPORT_URL']}/<resource>", 'dynamodb_export',
+                requires_auth('resource')(self._export_response)
+            )
+
+        if app.config['DYNAMODB_WARM_UP']:
+            self.warm_up()
+
+    @property
+    def driver(self):
+        """DynamoDB service resource or memory driver, created on first use
+
+        :return: Driver
+        """
+
+        if self._connection is None and self._settings is not None:
+            with self._driver_lock:
+                if self._connection is None:
+                    self._connection = self._driver(self._settings)
+
+        return self._connection
+
+    @driver.setter
+    def driver(self, driver):
+        """Replace the driver
+
+        :param driver: Driver, None to create it again on next use
+        """
+
+        self._connection = driver
+
+    def warm_up(self, connect: bool = False):
+        """Create the driver and load the service models it uses ahead of the first request
+
+        Call it before workers fork, e.g. from gunicorn's ``on_starting`` hook with ``preload_app``, so workers share
+        the loaded models instead of each loading them on its first request. Set ``DYNAMODB_WARM_UP`` to warm up from
+        ``init_app``. Pass ``connect`` once per process, from ``post_fork`` or the init phase of a Lambda, to also
+        describe every table, caching their schemas and opening pooled connections: connections opened before a fork
+        would be shared by every worker.
+
+        :param bool connect: Whether to describe tables, opening connections
+        """
+
+        client = getattr(getattr(self.driver, 'meta', None), 'client', None)
+
+        if client is None:
+            return
+
+        for operation in self.OPERATIONS:
+            client.meta.service_model.operation_model(operation)
+
+        self.driver.Table(self._settings['DYNAMODB_ROLLUP_TABLE'])
+
+        sources = {settings['source'] for settings in self._settings.get('SOURCES', {}).values()}
+
+        for source in sources if connect else ():
+            try:
+                self._schema(source)
+            except BotoCoreClientError:
+                continue
+
+    @staticmethod
+    def _driver(settings: dict):
+        """Create the driver selected by ``DYNAMODB_DRIVER``
+
+        ``boto3`` talks to DynamoDB, ``memory`` runs an in-process engine whose tables are declared in
+        ``DYNAMODB_MEMORY_TABLES`` as ``create_table`` arguments. Tables not declared are created on first use with
+        ``ID_FIELD`` as their partition key.
+
+        :param dict settings: Application settings
+        :return: DynamoDB service resource or memory driver
+        :raises: ValueError
+        """
+
+        if settings['DYNAMODB_DRIVER'] == 'boto3':
+            resource = boto3.resource('dynamodb')
+            resource.meta.client.meta.events.register('before-send.dynamodb', check_deadline)
+            return resource
+
+        if settings['DYNAMODB_DRIVER'] != 'memory':
+            raise ValueError(f"Unknown DynamoDB driver: {settings['DYNAMODB_DRIVER']}")
+
+        from eve_dynamodb.memory import MemoryDriver  # pylint: disable=import-outside-toplevel
+
+        tables = list(settings['DYNAMODB_MEMORY_TABLES'])
+
+        if settings['DYNAMODB_ROLLUP_TABLE'] not in {table['TableName'] for table in tables}:
+            tables.append(table_definition(settings['DYNAMODB_ROLLUP_TABLE']))
+
+        return MemoryDriver(
+            tables, auto_create_key=settings.get('ID_FIELD', '_id'), latency=settings['DYNAMODB_MEMORY_LATENCY'],
+            read_capacity=settings['DYNAMODB_MEMORY_READ_CAPACITY'],
+            write_capacity=settings['DYNAMODB_MEMORY_WRITE_CAPACITY']
+        )
 
     def find(self, resource: str, req: ParsedRequest = None, sub_resource_lookup: dict = None,
              perform_count: bool = True) -> tuple:
@@ -101,17 +303,17 @@ class DynamoDB(DataLayer):
         :rtype: tuple
         """
 
-        args = dict()
+        limit, skip = None, 0
 
         spec = self._convert_where_request_to_dict(req)
         bad_filter = validate_filters(spec, resource)
         is_soft_delete = config.DOMAIN[resource]["soft_delete"]
 
         if req and req.max_results:
-            args["limit"] = req.max_results
+            limit = req.max_results
 
         if req and req.page > 1:
-            args["skip"] = (req.page - 1) * req.max_results
+            skip = (req.page - 1) * req.max_results
 
         if bad_filter:
             abort(400, bad_filter)
@@ -123,36 +325,162 @@ class DynamoDB(DataLayer):
             spec = self.combine_queries(spec, {config.DELETED: {"$ne": True}})
 
         client_projection = self._client_projection(req)
-        data_source, spec, projection, sort = self._datasource_ex(resource, spec, client_projection, None)
+        client_sort = self._client_sort(req)
+        data_source, spec, projection, sort = self._datasource_ex(resource, spec, client_projection, client_sort)
 
         if req and req.if_modified_since:
             spec[config.LAST_UPDATED] = {"$gt": req.if_modified_since}
 
-        if len(spec) > 0:
-            args["filter"] = spec
+        cache_ttl = config.DOMAIN[resource].get("result_cache_ttl", config.DYNAMODB_RESULT_CACHE_TTL)
+        cache_key = self.result_cache.key(
+            data_source, spec=spec, projection=projection, sort=req.sort if req else None, limit=limit, skip=skip,
+            perform_count=perform_count
+        ) if cache_ttl else None
+        page = self.result_cache.get(cache_key) if cache_key else None
 
-        if projection:
-            args["projection"] = projection
+        if page is not None:
+            items, count = page
+            return DynamoDBResult({'Items': items, 'Count': len(items)}), count
 
         try:
-            table = self.driver.Table(data_source)
-
-            result = DynamoDBResult(table.scan(**args))  # TODO: Finish this
-            return result, result.count() if perform_count else None
+            fields = list(projection.keys()) if projection else None
+            plan = self._plan(resource, data_source, spec, fields, sort)
+            cache = self.result_cache
+
+            if not cache_key and self._hot_partitions(plan) and self._hot_key_cache_ttl(resource):
+                cache, cache_ttl = self.hot_key_cache, self._hot_key_cache_ttl(resource)
+                cache_key = cache.key(
+                    data_source, spec=spec, projection=projection, sort=req.sort if req else None, limit=limit,
+                    skip=skip, perform_count=perform_count
+                )
+                page = cache.get(cache_key)
+
+                if page is not None:
+                    items, count = page
+                    return DynamoDBResult({'Items': items, 'Count': len(items)}), count
+
+            with self._observe(resource, 'find', plan, fields, spec, sort):
+                table = self._table(data_source)
+
+                if plan.sorted or not sort:
+                    items = self._strip_maintained(resource, itertools.islice(
+                        self._read(table, plan, skip + limit if limit else None, fields), skip,
+                        skip + limit if limit else None
+                    ))
+                else:
+                    items = self._sorted(resource, table, plan, fields, sort, skip, limit)
+                result = DynamoDBResult({'Items': items, 'Count': len(items)})
+                count = None
+
+                if perform_count:
+                    count = self._rollup_count(resource, spec)
+
+                    if count is None and plan.operation == 'BatchGetItem':
+                        count = sum(1 for _ in self._read(table, plan))
+                    elif count is None and plan.operation == 'Query':
+                        count = sum(self._count(table.query, **args) for args in plan.queries())
+                    elif count is None:
+                        count = self._count(table.scan, **plan.arguments())
+
+            if cache_key:
+                cache.put(cache_key, (list(result), count), cache_ttl)
+
+            return result, count
 
         except BotoCoreClientError as e:
             abort(500, description=debug_error_message(e.response['Error']['Message']))
 
-    def aggregate(self, resource: str, pipeline: dict, options: dict):
+    def _sorted(self, resource: str, table, plan: Plan, fields: list, sort: list, skip: int, limit: int) -> list:
+        """Read every item a plan matches and sort them in memory, for sorts its access path does not follow
+
+        :param str resource: Resource being accessed
+        :param table: Table resource
+        :param Plan plan: Plan
+        :param list fields: Projected fields, None for every field
+        :param list sort: Requested sort, as ``(field, direction)`` pairs
+        :param int skip: Items skipped
+        :param int limit: Items returned, None for every item
+        :return: Items
+        :rtype: list
+        """
+
+        hidden = [field for field, _ in sort if fields and field not in fields]
+        items = self._strip_maintained(resource, self._read(table, plan, None, fields + hidden if hidden else fields))
+        window = ([{'$skip': skip}] if skip else []) + ([{'$limit': limit}] if limit else [])
+        items = run_stages([{'$sort': dict(sort)}] + window, items)
+
+        return [project_document(item, fields) for item in items] if hidden else items
+
+    def aggregate(self, resource: str, pipeline: list, options: dict) -> AggregationResult:
         """Perform an aggregation on the resource data source and returns the result
 
+        Supports the ``$match``, ``$project``, ``$group`` (``$sum``, ``$count``, ``$min``, ``$max``, ``$avg``),
+        ``$sort``, ``$skip``, ``$limit``, ``$count`` and ``$facet`` stages. Leading ``$match`` stages are pushed into
+        the scan filter and the fields read by the first ``$project`` or ``$group`` into its projection. Set the
+        ``segments`` aggregation option to scan in parallel when the pipeline groups its input. A leading ``$group``
+        over the whole resource is answered from its rollups, when one covers it.
+
         :param str resource: Resource being accessed
-        :param dict pipeline: Aggregation pipeline to be executed
+        :param list pipeline: Aggregation pipeline to be executed
         :param dict options: Aggregation options to be considered
+        :return: Aggregation result
+        :rtype: AggregationResult
         """
 
-        # TODO: Finish this, maybe this isn't supported?. Also doc strings
-        raise NotImplementedError
+        try:
+            pipeline = Pipeline(pipeline)
+        except ValueError as e:
+            abort(400, description=debug_error_message(str(e)))
+
+        args = dict()
+        segments = int((options or {}).get('segments', 1))
+        data_source, filter_, _, _ = self._datasource_ex(resource, pipeline.match or None)
+
+        if config.DOMAIN[resource]["soft_delete"]:
+            filter_ = self.combine_queries(filter_ or {}, {config.DELETED: {"$ne": True}})
+
+        if pipeline.stages and '$group' in pipeline.stages[0] and self._rollup_terms(resource, filter_ or {}) == {}:
+            rollup = rollup_for_group(self._rollups(resource), pipeline.stages[0]['$group'])
+
+            if rollup:
+                try:
+                    groups = self._rollup_table().aggregate(rollup, pipeline.stages[0]['$group'])
+                    return AggregationResult(run_stages(pipeline.stages[1:], groups))
+                except BotoCoreClientError as e:
+                    abort(500, description=debug_error_message(e.response['Error']['Message']))
+
+        sharding = self._sharding(resource)
+
+        try:
+            filter_ = sharding.rewrite(filter_) if filter_ and sharding else filter_
+        except ValueError as e:
+            abort(400, description=debug_error_message(str(e)))
+
+        if filter_:
+            args["FilterExpression"] = build_attr_expression(filter_)
+
+        if pipeline.projection:
+            args["ProjectionExpression"], args["ExpressionAttributeNames"] = build_projection_expression(
+                pipeline.projection
+            )
+
+        try:
+            table = self._table(data_source)
+
+            if segments > 1 and pipeline.decomposable:
+                scan = self.instrumentation.bind(table.scan)
+
+                return AggregationResult(pipeline.execute_parallel([
+                    lambda segment=segment: self._unshard(sharding, self._paginate(
+                        scan, Segment=segment, TotalSegments=segments, **args
+                    ))
+                    for segment in range(segments)
+                ]))
+
+            return AggregationResult(pipeline.execute(self._unshard(sharding, self._paginate(table.scan, **args))))
+
+        except BotoCoreClientError as e:
+            abort(500, description=debug_error_message(e.response['Error']['Message']))
 
     def find_one(self, resource: str, req: ParsedRequest, check_auth_value: bool = True,
                  force_auth_field_projection: bool = False, **lookup) -> dict:
@@ -186,9 +514,18 @@ class DynamoDB(DataLayer):
             filter_ = self.combine_queries(filter_, {config.DELETED: {"$ne": True}})
 
         try:
-            table = self.driver.Table(data_source)
-            result = table.get_item(Key=lookup)  # TODO: Add projection and pass filter, change to scan or query?
-            return result['Item'] if 'Item' in result else None
+            plan = self._plan(resource, data_source, filter_, single=True)
+
+            with self._observe(resource, 'find_one', plan, query=filter_):
+                if plan.operation != 'GetItem':
+                    document = next(iter(self._read(self._table(data_source), plan, 1)), None)
+                else:
+                    # TODO: Add projection
+                    document = self._get_item(data_source, plan.key, self._hot_key_cache_ttl(resource))
+                    document = document if document is not None and match_document(document, plan.filter) else None
+
+                return self._strip_maintained(resource, [document])[0] if document is not None else None
+
         except BotoCoreClientError as e:
             abort(500, description=debug_error_message(e.response['Error']['Message']))
 
@@ -211,11 +548,16 @@ class DynamoDB(DataLayer):
         id_field = config.DOMAIN[resource]["id_field"]
         _id = lookup.get(id_field)
         data_source, filter_, _, _ = self._datasource_ex(resource, {id_field: _id}, None)
+        key = self._primary_key(resource, data_source, dict(lookup, **{id_field: _id}))
 
         try:
-            table = self.driver.Table(data_source)
-            result = table.get_item(Key=filter_)
-            return result['Item'] if 'Item' in result else None
+            if key is not None:
+                document = self._get_item(data_source, key)
+            else:
+                plan = self._plan(resource, data_source, filter_, single=True)
+                document = next(iter(self._read(self._table(data_source), plan, 1)), None)
+
+            return self._strip_maintained(resource, [document])[0] if document is not None else None
         except BotoCoreClientError as e:
             abort(500, description=debug_error_message(e.response['Error']['Message']))
 
@@ -237,8 +579,14 @@ class DynamoDB(DataLayer):
         )
 
         try:
-            table = self.driver.Table(data_source)
-            return DynamoDBResult(table.scan())  # TODO finish this
+            keys = [{id_field: id_} for id_ in ids]
+            fields = list(projection.keys()) if projection else None
+            items = [
+                project_document(item, fields) if fields else item
+                for item in self._strip_maintained(resource, self._batch_get_items(data_source, keys))
+                if match_document(item, filter_)
+            ]
+            return DynamoDBResult({'Items': items, 'Count': len(items)})
         except BotoCoreClientError as e:
             abort(500, description=debug_error_message(e.response['Error']['Message']))
 
@@ -259,14 +607,18 @@ class DynamoDB(DataLayer):
 
         try:
 
-            table = self.driver.Table(data_source)
+            table = self._table(data_source)
+            items = [self._mark_maintained(resource, doc) for doc in doc_or_docs]
 
             with table.batch_writer() as batch:
-                for doc in doc_or_docs:
+                for item in items:
                     # Note: Existing documents are overwritten https://github.com/boto/boto/issues/3273
                     # TODO: Maybe we could a search first?
-                    batch.put_item(Item=doc)
+                    batch.put_item(Item=item)
 
+            self._track(data_source, items)
+            self._invalidate(data_source, [{id_field: doc[id_field]} for doc in doc_or_docs])
+            self._maintain_rollups(resource, added=doc_or_docs)
             return [doc[id_field] for doc in doc_or_docs]
 
         except BotoCoreClientError as e:
@@ -281,8 +633,44 @@ class DynamoDB(DataLayer):
         :raise OriginalChangedError: Raised if the database layer notices a change from the supplied original parameter
         """
 
-        # TODO: Finish this
-        raise NotImplementedError
+        id_field = config.DOMAIN[resource]["id_field"]
+        data_source, _, _, _ = self._datasource_ex(resource)
+        live, timeline, remove = self._live_index(resource), self._timeline(resource), ()
+        sharding, changes = self._sharding(resource), updates
+
+        if live and config.DELETED in updates and updates[config.DELETED]:
+            remove = [live['attribute']]
+        elif live and config.DELETED in updates:
+            updates = dict(updates, **{live['attribute']: str(id_)})
+
+        if timeline and updates.get(config.LAST_UPDATED):
+            updates = dict(updates, **timeline.values(updates[config.LAST_UPDATED]))
+
+        if sharding and sharding.attribute in updates:
+            updates = dict(updates, **{sharding.attribute: sharding.shard(updates[sharding.attribute], id_)})
+
+        key = self._primary_key(resource, data_source, dict(original, **{id_field: id_})) or {id_field: id_}
+        updates = {field: value for field, value in updates.items() if field not in key or value != key[field]}
+        expression, names, values = build_update_expression(updates, remove)
+
+        try:
+            table = self._table(data_source)
+            table.update_item(
+                Key=key,
+                UpdateExpression=expression,
+                ExpressionAttributeNames=names,
+                ExpressionAttributeValues=values,
+                ConditionExpression=self._unchanged(id_field, original)
+            )
+
+            self._track(data_source, [key])
+            self._invalidate(data_source, [key])
+            self._maintain_rollups(resource, removed=[original], added=[apply_updates(original, changes)])
+
+        except BotoCoreClientError as e:
+            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                raise self.OriginalChangedError()
+            abort(500, description=debug_error_message(e.response['Error']['Message']))
 
     def replace(self, resource: str, id_: str, document: dict, original: dict):
         """Replaces a collection/table document/row
@@ -293,8 +681,40 @@ class DynamoDB(DataLayer):
         :raise OriginalChangedError: Raised if the database layer notices a change from the supplied original parameter
         """
 
-        # TODO: Finish this
-        raise NotImplementedError
+        id_field = config.DOMAIN[resource]["id_field"]
+        data_source, _, _, _ = self._datasource_ex(resource)
+
+        try:
+            table, item = self._table(data_source), self._mark_maintained(resource, dict(document, **{id_field: id_}))
+            table.put_item(Item=item, ConditionExpression=self._unchanged(id_field, original))
+
+            self._track(data_source, [item])
+            self._invalidate(data_source, [
+                self._primary_key(resource, data_source, dict(written, **{id_field: id_})) or {id_field: id_}
+                for written in (original or {}, document)
+            ])
+            self._maintain_rollups(resource, removed=[original], added=[document])
+
+        except BotoCoreClientError as e:
+            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                raise self.OriginalChangedError()
+            abort(500, description=debug_error_message(e.response['Error']['Message']))
+
+    @staticmethod
+    def _unchanged(id_field: str, original: dict):
+        """Build the condition of a write based on an original document, which must still be stored as it was read
+
+        :param str id_field: Id field
+        :param dict original: Original document
+        :return: Condition expression
+        """
+
+        condition = {id_field: {"$exists": True}}
+
+        if original and original.get(config.ETAG):
+            condition[config.ETAG] = original[config.ETAG]
+
+        return build_attr_expression(condition)
 
     def remove(self, resource: str, lookup: dict):
         """Removes a document/row or an entire set of documents/rows from a database collection/table
@@ -305,14 +725,27 @@ class DynamoDB(DataLayer):
         """
 
         id_field = config.DOMAIN[resource]["id_field"]
-        data_source, filter_, _, _ = self._datasource_ex(resource, lookup)
+        spec = dict(lookup or {})
+
+        if config.DOMAIN[resource]["soft_delete"]:
+            spec = self.combine_queries(spec, {config.DELETED: {"$ne": True}})
+
+        data_source, spec, _, _ = self._datasource_ex(resource, spec)
 
         try:
-            table = self.driver.Table(data_source)
+            # Read straight from the table, cached pages may miss documents written elsewhere
+            table = self._table(data_source)
+            items = self._strip_maintained(resource, self._read(table, self._plan(resource, data_source, spec)))
+
+            keys = [self._primary_key(resource, data_source, item) or {id_field: item[id_field]} for item in items]
 
             with table.batch_writer() as batch:
-                for item in self.find(resource, sub_resource_lookup=lookup)[0]:
-                    batch.delete_item(Key={id_field: item[id_field]})
+                for key in keys:
+                    batch.delete_item(Key=key)
+
+            self._track(data_source, keys)
+            self._invalidate(data_source, keys)
+            self._maintain_rollups(resource, removed=items)
 
         except BotoCoreClientError as e:
             abort(500, description=debug_error_message(e.response['Error']['Message']))
@@ -380,27 +813,911 @@ class DynamoDB(DataLayer):
     def is_empty(self, resource: str) -> bool:
         """Returns whether the resource is empty
 
+        Without a datasource filter, soft deleted documents count as content. With one, only live documents do.
+
         :param str resource: Resource being accessed
         :return: True, if the collection is empty. False otherwise
         :rtype: bool
         """
 
-        data_source, filter_, _, _ = self.datasource(resource)
+        _, filter_, _, _ = self.datasource(resource)
+        filter_ = dict(filter_ or {})
+
+        if config.LAST_UPDATED in filter_:
+            del filter_[config.LAST_UPDATED]
 
         try:
-            table = self.driver.Table(data_source)
+            return not self._exists(resource, filter_, show_deleted=not filter_)
+        except BotoCoreClientError as e:
+            abort(400, description=debug_error_message(e.response['Error']['Message']))
+
+    def exists(self, resource: str, lookup: dict = None, cache: bool = True, show_deleted: bool = False) -> bool:
+        """Returns whether any document matches a lookup, reading no further than the first match
+
+        Lookups pinning a whole primary key are answered with GetItem. Others probe the Query or Scan of their access
+        path with a small ``Limit``, doubled on every page, following ``LastEvaluatedKey`` only until a page holds a
+        match. Answers are cached for ``DYNAMODB_EXISTS_CACHE_TTL`` seconds, until the data layer writes the table.
+
+        :param str resource: Resource being accessed
+        :param dict lookup: Query documents must match
+        :param bool cache: Whether a cached answer may be used
+        :param bool show_deleted: Whether soft deleted documents match
+        :return: True, if a document matches. False otherwise
+        :rtype: bool
+        """
+
+        try:
+            return self._exists(resource, lookup, cache, show_deleted)
+        except BotoCoreClientError as e:
+            abort(500, description=debug_error_message(e.response['Error']['Message']))
+
+    def _exists(self, resource: str, lookup: dict = None, cache: bool = True, show_deleted: bool = False) -> bool:
+        """Probe whether any document matches a lookup
+
+        :param str resource: Resource being accessed
+        :param dict lookup: Query documents must match
+        :param bool cache: Whether a cached answer may be used
+        :param bool show_deleted: Whether soft deleted documents match
+        :return: True, if a document matches. False otherwise
+        :rtype: bool
+        :raises: ClientError
+        """
+
+        lookup = dict(lookup or {})
+        is_soft_delete = config.DOMAIN[resource]["soft_delete"]
+
+        if is_soft_delete and not show_deleted and not self.query_contains_field(lookup, config.DELETED):
+            lookup = self.combine_queries(lookup, {config.DELETED: {"$ne": True}})
+
+        data_source, spec, _, _ = self._datasource_ex(resource, lookup)
+        ttl = config.DOMAIN[resource].get('exists_cache_ttl', config.DYNAMODB_EXISTS_CACHE_TTL)
+        cache_key = self.exists_cache.key(data_source, exists=spec) if cache and ttl else None
+        found = self.exists_cache.get(cache_key) if cache_key else None
+
+        if found is not None:
+            return found
+
+        plan = self._plan(resource, data_source, spec, single=True)
+
+        with self._observe(resource, 'exists', plan, query=spec):
+            table, limit = self._table(data_source), config.DYNAMODB_PROBE_LIMIT
+
+            if plan.operation == 'GetItem':
+                document = self._get_item(data_source, plan.key)
+                found = document is not None and match_document(document, plan.filter)
+            elif plan.operation == 'BatchGetItem':
+                found = next(iter(self._read(table, plan)), None) is not None
+            elif plan.operation == 'Query':
+                found = any(self._probe(table.query, limit, **args) for args in plan.queries())
+            else:
+                found = self._probe(table.scan, limit, **plan.arguments())
+
+        if cache_key:
+            self.exists_cache.put(cache_key, found, ttl)
+
+        return found
+
+    def export(self, resource: str, fmt: str = 'ndjson', segments: int = None, lookup: dict = None) -> Exporter:
+        """Prepare a streaming export of a resource
+
+        The export scans the table in ``segments`` parallel segments, ``DYNAMODB_EXPORT_SEGMENTS`` by default, reading
+        only the projected fields. Stream it with ``stream()`` or write it to a file, resumably, with ``write()``.
+
+        :param str resource: Resource being exported
+        :param str fmt: ``ndjson`` or ``csv``
+        :param int segments: Segments scanned in parallel
+        :param dict lookup: Query exported documents must match
+        :return: Exporter
+        :rtype: Exporter
+        :raises: ValueError
+        """
+
+        if fmt not in ENCODERS:
+            raise ValueError(f"Unknown export format: {fmt}")
+
+        lookup = dict(lookup or {})
+
+        if config.DOMAIN[resource]["soft_delete"] and not self.query_contains_field(lookup, config.DELETED):
+            lookup = self.combine_queries(lookup, {config.DELETED: {"$ne": True}})
+
+        data_source, spec, projection, _ = self._datasource_ex(resource, lookup)
+        id_field = config.DOMAIN[resource]['id_field']
+        fields = [id_field] + [field for field in projection or {} if field != id_field] if projection else None
+        segments = segments or config.DOMAIN[resource].get('export_segments', config.DYNAMODB_EXPORT_SEGMENTS)
+        table, sharding = self._table(data_source), self._sharding(resource)
+        scan = self.instrumentation.bind(table.scan)
+
+        if sharding:
+            spec = sharding.rewrite(spec)
+            scan = functools.partial(self._unshard_page, sharding, scan)
+
+        return Exporter(
+            scan, Plan('Scan', data_source, filter_=spec).arguments(fields),
+            segments, ENCODERS[fmt](schema=config.DOMAIN[resource]['schema'], fields=fields),
+            hidden=self._maintained_attributes(resource), fmt=fmt
+        )
+
+    def _export_response(self, resource: str) -> Response:
+        """Stream the export of a resource, in the ``format`` requested, scanning ``segments`` segments
+
+        :param str resource: Resource being exported
+        :return: Chunked response
+        :rtype: Response
+        """
+
+        if not config.DOMAIN[resource].get('export', True):
+            abort(404)
+
+        try:
+            fmt, segments = request.args.get('format', 'ndjson'), request.args.get('segments', type=int)
+            exporter = self.export(resource, fmt, segments)
+        except ValueError as e:
+            abort(400, description=str(e))
+
+        return Response(exporter.stream(), mimetype=exporter.mimetype)
+
+    def _table(self, data_source: str):
+        """Return a table resource, recording the cost of its calls when instrumentation is enabled
+
+        :param str data_source: Table name
+        :return: Table resource
+        """
+
+        table = self.driver.Table(data_source)
+
+        if not self.instrumentation.enabled:
+            return table
+
+        return InstrumentedTable(table, self.instrumentation, self._batched(
+            functools.partial(self.driver.batch_write_item, ReturnConsumedCapacity='TOTAL'), 'UnprocessedItems',
+            'BatchWriteItem'
+        ))
+
+    @staticmethod
+    def _debug_headers(response: Response) -> Response:
+        """Expose the DynamoDB cost of the current request as response headers
+
+        :param Response response: Flask response
+        :return: Flask response
+        :rtype: Response
+        """
+
+        sink = request_sink()
+
+        if sink is None:
+            return response
+
+        total = sink.total()
+        response.headers['X-DynamoDB-Calls'] = str(total['calls'])
+        response.headers['X-DynamoDB-Latency'] = f"{total['latency'] * 1000:.1f}ms"
+        response.headers['X-DynamoDB-Pages'] = str(total['pages'])
+        response.headers['X-DynamoDB-Scanned'] = str(total['scanned'])
+        response.headers['X-DynamoDB-Returned'] = str(total['returned'])
+        response.headers['X-DynamoDB-Capacity'] = f"{total['capacity']:g}"
+
+        for (table, operation), totals in sink.snapshot().items():
+            response.headers.add('X-DynamoDB-Operation', f"{operation} {table} calls={totals['calls']}")
+
+        return response
+
+    @staticmethod
+    def _attach_explain(_resource: str, response: dict):
+        """Add the explanations collected during the request to the response payload
+
+        :param str _resource: Resource name
+        :param dict response: Response payload
+        """
+
+        collected = explanations()
+
+        if collected:
+            response['_explain'] = list(collected)
+
+    @contextmanager
+    def _observe(self, resource: str, operation: str, plan: Plan, projection: list = None, query: dict = None,
+                 sort: list = None) -> Iterator:
+        """Measure a read, collecting its explanation when requested, logging it when slow and sampling its shape
+
+        :param str resource: Resource name
+        :param str operation: Data layer operation
+        :param Plan plan: Chosen plan
+        :param list projection: Projected fields
+        :param dict query: Query
+        :param list sort: Requested sort
+        :return: Context manager yielding the explanation, or None when reads are not observed
+        :rtype: Iterator
+        """
+
+        explain = explain_requested(config.DYNAMODB_EXPLAIN, config.DYNAMODB_EXPLAIN_PARAM, config.DEBUG)
+        sampled = self.advisor.sampled()
+
+        if not explain and not sampled and not self.slow_log.enabled:
+            yield None
+            return
+
+        with Explain(resource, operation, plan, projection) as explanation, \
+                self.instrumentation.capture(explanation.sink):
+            yield explanation
+
+        self.slow_log(explanation)
+
+        if sampled:
+            self.advisor.record(resource, plan.table, self._schema(plan.table), query, sort, projection, explanation)
+
+        if explain:
+            explanations().append(json.loads(json.dumps(explanation.as_dict(), default=str)))
+
+    def _schema(self, data_source: str) -> Schema:
+        """Return the key schema of a table, described once per table
+
+        :param str data_source: Table name
+        :return: Schema
+        :rtype: Schema
+        """
+
+        schema = self.schemas.get(data_source)
+
+        if schema is None:
+            schema = self.schemas[data_source] = Schema.from_table(self.driver.Table(data_source))
+
+        return schema
+
+    def _primary_key(self, resource: str, data_source: str, document: dict) -> dict:
+        """Return the primary key an item is stored under, with its partition key sharded
+
+        :param str resource: Resource name
+        :param str data_source: Table name
+        :param dict document: Document holding natural values, with its id
+        :return: Key, None when the document lacks one of the key attributes
+        :rtype: dict
+        """
+
+        sharding, attributes = self._sharding(resource), self._schema(data_source).table.keys
+
+        if not all(attribute in document for attribute in attributes):
+            return None
+
+        document = sharding.write(document) if sharding else document
+        return {attribute: document[attribute] for attribute in attributes}
+
+    def _plan(self, resource: str, data_source: str, query: dict, projection: list = None, sort: list = None,
+              single: bool = False) -> Plan:
+        """Choose the access path of a read, on the shards of a sharded partition key
+
+        :param str resource: Resource name
+        :param str data_source: Table name
+        :param dict query: Query
+        :param list projection: Projected fields
+        :param list sort: Requested sort
+        :param bool single: Whether a single item is being read
+        :return: Plan
+        :rtype: Plan
+        """
+
+        segments = int(config.DOMAIN[resource].get('scan_segments', config.DYNAMODB_SCAN_SEGMENTS))
+        live, timeline, schema = self._live_index(resource), self._timeline(resource), self._schema(data_source)
+        sharding = self._sharding(resource)
+
+        try:
+            query = sharding.rewrite(query) if sharding else query
+        except ValueError as e:
+            abort(400, description=debug_error_message(str(e)))
+
+        plan = choose_plan(
+            data_source, schema, query, projection, sort, segments, single,
+            live_index=live['name'] if live else None, deleted_field=config.DELETED,
+            max_fanout=int(config.DOMAIN[resource].get('max_fanout', config.DYNAMODB_MAX_FANOUT))
+        )
+
+        if plan.operation == 'Scan' and timeline:
+            return timeline.plan(data_source, schema, query, projection, sort) or plan
+
+        return plan
+
+    @staticmethod
+    def _timeline(resource: str) -> Timeline:
+        """Return the time bucketed index declared for a resource
+
+        :param str resource: Resource name
+        :return: Timeline or None
+        :rtype: Timeline
+        """
+
+        return Timeline.for_resource(resource, config.DOMAIN[resource], config.LAST_UPDATED)
+
+    @staticmethod
+    def _live_index(resource: str) -> dict:
+        """Return the sparse index holding the live items of a soft deleting resource
+
+        Declared in the resource settings as ``'live_index': {'name': 'live', 'attribute': '_live'}``. Items which are
+        not soft deleted carry the attribute, set to their id, and the index must be partitioned on it.
+
+        :param str resource: Resource name
+        :return: Index name and attribute, or None
+        :rtype: dict
+        """
+
+        settings = config.DOMAIN[resource]
+        live = settings.get('live_index')
+
+        if not live or not settings.get('soft_delete'):
+            return None
+
+        return {'name': live['name'], 'attribute': live.get('attribute', '_live')}
 
-            if not filter_:
-                return table.scan()['Count'] == 0
+    @staticmethod
+    def _sharding(resource: str) -> WriteSharding:
+        """Return the write sharding declared for a resource
+
+        :param str resource: Resource name
+        :return: Write sharding or None
+        :rtype: WriteSharding
+        """
+
+        return WriteSharding.for_resource(config.DOMAIN[resource], config.DOMAIN[resource]['id_field'])
+
+    def _mark_maintained(self, resource: str, document: dict) -> dict:
+        """Set or clear the attributes maintained for the live and time bucketed indexes of a document being written,
+        and shard its hot partition key
+
+        :param str resource: Resource name
+        :param dict document: Document
+        :return: Document to write
+        :rtype: dict
+        """
+
+        live, timeline, sharding = self._live_index(resource), self._timeline(resource), self._sharding(resource)
+        document = sharding.write(document) if sharding else document
+
+        if not live and not timeline:
+            return document
+
+        document = dict(document)
+
+        if live and document.get(config.DELETED):
+            document.pop(live['attribute'], None)
+        elif live:
+            document[live['attribute']] = str(document[config.DOMAIN[resource]['id_field']])
+
+        if timeline and document.get(config.LAST_UPDATED):
+            document.update(timeline.values(document[config.LAST_UPDATED]))
+
+        return document
+
+    def _maintained_attributes(self, resource: str) -> list:
+        """Return the attributes maintained for the indexes of a resource
+
+        :param str resource: Resource name
+        :return: Attribute names
+        :rtype: list
+        """
+
+        live, timeline = self._live_index(resource), self._timeline(resource)
+        return ([live['attribute']] if live else []) + (list(timeline.attributes) if timeline else [])
+
+    def _strip_maintained(self, resource: str, documents: Iterable) -> list:
+        """Hide the attributes maintained for indexes from documents read, and restore their sharded partition key
+
+        :param str resource: Resource name
+        :param Iterable documents: Documents
+        :return: Documents
+        :rtype: list
+        """
+
+        attributes = self._maintained_attributes(resource)
+        documents = list(self._unshard(self._sharding(resource), documents))
+
+        for document in documents if attributes else []:
+            for attribute in attributes:
+                document.pop(attribute, None)
+
+        return documents
+
+    @staticmethod
+    def _unshard(sharding: WriteSharding, documents: Iterable) -> Iterable:
+        """Restore the natural value of the sharded partition key of documents read
+
+        :param WriteSharding sharding: Write sharding or None
+        :param Iterable documents: Documents
+        :return: Documents
+        :rtype: Iterable
+        """
+
+        return map(sharding.read, documents) if sharding else documents
+
+    @staticmethod
+    def _unshard_page(sharding: WriteSharding, scan: Callable, **kwargs) -> dict:
+        """Read a page, restoring the natural value of the sharded partition key of its items
+
+        :param WriteSharding sharding: Write sharding
+        :param Callable scan: Read
+        :param dict kwargs: Read arguments
+        :return: Page
+        :rtype: dict
+        """
+
+        page = scan(**kwargs)
+        page['Items'] = [sharding.read(item) for item in page.get('Items', [])]
+        return page
+
+    def _partition_key(self, data_source: str, index: str = None) -> str:
+        """Return the partition key attribute of a table or index
+
+        :param str data_source: Table name
+        :param str index: Index name, None for the table itself
+        :return: Attribute name or None, if the index does not exist
+        :rtype: str
+        """
+
+        schema = self._schema(data_source)
+
+        if index is None:
+            return schema.table.hash_key
+
+        return next((known.hash_key for known in schema.indexes if known.name == index), None)
+
+    def _track(self, data_source: str, keys: list, index: str = None) -> bool:
+        """Count accesses to the partitions holding keys or items
+
+        :param str data_source: Table name
+        :param list keys: Keys, key conditions or items
+        :param str index: Index name, None for the table itself
+        :return: True, if every partition is hot. False otherwise
+        :rtype: bool
+        """
+
+        if not self.hot_keys.enabled or not keys:
+            return False
+
+        attribute = self._partition_key(data_source, index)
+        return all([self.hot_keys.observe(data_source, index, key.get(attribute)) for key in keys])
+
+    def _hot_partitions(self, plan: Plan) -> bool:
+        """Whether every partition a plan reads is hot
+
+        :param Plan plan: Plan
+        :return: True, if hot. False otherwise
+        :rtype: bool
+        """
+
+        if not self.hot_keys.enabled or plan.operation == 'Scan':
+            return False
+
+        attribute = self._partition_key(plan.table, plan.index)
+        return all(self.hot_keys.is_hot(plan.table, plan.index, key.get(attribute)) for key in plan.keys)
+
+    @staticmethod
+    def _hot_key_cache_ttl(resource: str) -> float:
+        """Return how long reads of hot partitions of a resource are cached
+
+        :param str resource: Resource name
+        :return: Seconds, 0 if they are not cached
+        :rtype: float
+        """
+
+        return config.DOMAIN[resource].get('hot_key_cache_ttl', config.DYNAMODB_HOT_KEY_CACHE_TTL)
+
+    def _read(self, table, plan: Plan, limit: int = None, projection: list = None) -> Iterable:
+        """Yield the items read by a BatchGetItem, Query or Scan plan, fanning Queries and scan segments out in parallel
+
+        Fanned out Queries are merged on the plan's merge field with a k-way heap merge, keeping the sort order each of
+        them reads in, and concatenated in key order otherwise.
+
+        :param table: Table resource
+        :param Plan plan: BatchGetItem, Query or Scan plan
+        :param int limit: Items needed, bounds what each parallel read returns
+        :param list projection: Projected fields
+        :return: Items
+        :rtype: Iterable
+        """
+
+        if plan.operation == 'BatchGetItem':
+            items = self._batch_get_items(plan.table, plan.keys)
+            return (
+                project_document(item, projection) if projection else item
+                for item in items if match_document(item, plan.filter)
+            )
+
+        query = self._hedged(plan.table, 'Query', table.query) if plan.operation == 'Query' else None
+
+        if query:
+            self._track(plan.table, plan.keys, plan.index)
+
+        if plan.operation == 'Query' and len(plan.keys) == 1:
+            return self._paginate(query, **plan.arguments(projection))
+
+        if plan.operation == 'Query':
+            field, direction = plan.merge or (None, 1)
+            hidden = field if field and projection and field not in projection else None
+            streams = self._parallel([
+                lambda args=args: list(itertools.islice(self._paginate(query, **args), limit))
+                for args in plan.queries(projection + [hidden] if hidden else projection)
+            ], config.DYNAMODB_FANOUT_WORKERS)
+
+            if field:
+                merged = heapq.merge(*streams, key=lambda item: item[field], reverse=direction == -1)
+                return (self._without(item, hidden) for item in merged) if hidden else merged
+
+            return itertools.chain.from_iterable(streams)
+
+        if plan.segments <= 1:
+            return self._paginate(table.scan, **plan.arguments(projection))
+
+        return itertools.chain.from_iterable(self._parallel([
+            lambda segment=segment: list(itertools.islice(self._paginate(
+                table.scan, Segment=segment, TotalSegments=plan.segments, **plan.arguments(projection)
+            ), limit))
+            for segment in range(plan.segments)
+        ]))
+
+    @staticmethod
+    def _without(item: dict, field: str) -> dict:
+        """Drop a field read only to merge fanned out Queries
+
+        :param dict item: Item
+        :param str field: Field name
+        :return: Item
+        :rtype: dict
+        """
+
+        item.pop(field, None)
+        return item
+
+    def _hedged(self, data_source: str, operation: str, function: Callable) -> Callable:
+        """Wrap a read so it is hedged when slow and abandoned past the deadline of the current request
+
+        :param str data_source: Table name
+        :param str operation: Operation type
+        :param Callable function: Read, safe to repeat
+        :return: Wrapped read
+        :rtype: Callable
+        """
+
+        deadline = request_deadline()
+
+        if deadline is None and not self.hedger.enabled:
+            return function
+
+        function = self.instrumentation.bind(function)
+
+        return lambda **kwargs: self.hedger.call(
+            (data_source, operation), functools.partial(function, **kwargs), deadline
+        )
+
+    def _parallel(self, functions: list, workers: int = None) -> list:
+        """Run reads in parallel, recording their cost in the sinks of the current thread and request
+
+        :param list functions: Reads
+        :param int workers: Most reads run at once, defaults to all of them
+        :return: Their results, in order
+        :rtype: list
+        """
+
+        functions = [self.instrumentation.bind(function) for function in functions]
+
+        with ThreadPoolExecutor(max_workers=max(min(len(functions), workers or len(functions)), 1)) as pool:
+            return list(pool.map(lambda function: function(), functions))
+
+    def _get_item(self, data_source: str, key: dict, cache_ttl: float = 0) -> dict:
+        """Read a single item, consulting the request identity map and sharing identical reads in flight
+
+        Items of hot partitions are cached for ``cache_ttl`` seconds, until the data layer writes the table.
+
+        :param str data_source: Table name
+        :param dict key: Item key
+        :param float cache_ttl: Seconds items of hot partitions are cached, 0 to always read them
+        :return: Item or None, if it does not exist
+        :rtype: dict
+        """
+
+        known = identity_map() if config.DYNAMODB_IDENTITY_MAP else None
+        item = known.get(data_source, key) if known else MISSING
+
+        if item is not MISSING:
+            return item
+
+        hot = self._track(data_source, [key])
+        cache_key = self.hot_key_cache.key(data_source, key=key) if hot and cache_ttl else None
+        cached = self.hot_key_cache.get(cache_key) if cache_key else None
+
+        if cached is not None:
+            return cached[0]
+
+        get = self._hedged(data_source, 'GetItem', self._table(data_source).get_item)
+
+        def get_item():
+            return get(Key=key).get('Item')
+
+        if config.DYNAMODB_SINGLE_FLIGHT:
+            item = single_flight.do(('GetItem', data_source, freeze_key(key)), get_item)
+        else:
+            item = get_item()
+
+        if known:
+            known.put(data_source, key, item)
+
+        if cache_key:
+            self.hot_key_cache.put(cache_key, (item,), cache_ttl)
+
+        return item
+
+    def _batch_get_items(self, data_source: str, keys: list) -> list:
+        """Read several items, consulting the request identity map and sharing identical reads in flight
+
+        Items missing from the identity map are read with BatchGetItem, 100 keys at a time, retrying unprocessed keys
+        after an exponential backoff, at most ``DYNAMODB_BATCH_MAX_ATTEMPTS`` times.
+
+        :param str data_source: Table name
+        :param list keys: Item keys
+        :return: Existing items, in key order
+        :rtype: list
+        """
+
+        known = identity_map() if config.DYNAMODB_IDENTITY_MAP else None
+        items = {freeze_key(key): known.get(data_source, key) if known else MISSING for key in keys}
+        missing = list({freeze_key(key): key for key in keys if items[freeze_key(key)] is MISSING}.values())
+        self._track(data_source, missing)
+
+        batch_get_item = self._hedged(data_source, 'BatchGetItem', functools.partial(
+            self.instrumentation.call, data_source, 'BatchGetItem', self.driver.batch_get_item
+        ))
+
+        batched = self._batched(batch_get_item, 'UnprocessedKeys', 'BatchGetItem')
+
+        def batch_get_items(chunk: list) -> list:
+            return [
+                item for response in batched({data_source: {'Keys': chunk}})
+                for item in response.get('Responses', {}).get(data_source, [])
+            ]
+
+        for start in range(0, len(missing), 100):
+            chunk = missing[start:start + 100]
+
+            if config.DYNAMODB_SINGLE_FLIGHT:
+                flight = ('BatchGetItem', data_source, tuple(sorted(freeze_key(key) for key in chunk)))
+                found = single_flight.do(flight, lambda chunk=chunk: batch_get_items(chunk))
             else:
+                found = batch_get_items(chunk)
+
+            fields = list(chunk[0].keys())
+            found = {freeze_key({field: item[field] for field in fields}): item for item in found}
+
+            for key in chunk:
+                items[freeze_key(key)] = found.get(freeze_key(key))
+
+                if known:
+                    known.put(data_source, key, items[freeze_key(key)])
+
+        return [item for item in items.values() if item is not None]
+
+    @staticmethod
+    def _batched(function: Callable, unprocessed: str, operation: str) -> Callable:
+        """Wrap a batch operation so unprocessed requests are retried with backoff, within the request deadline
+
+        :param Callable function: Batch operation, called with ``RequestItems``
+        :param str unprocessed: Response field holding the unprocessed request items
+        :param str operation: Operation name
+        :return: Function sending request items and yielding every response
+        :rtype: Callable
+        """
+
+        return functools.partial(
+            retry_unprocessed, function, unprocessed=unprocessed, operation=operation,
+            max_attempts=config.DYNAMODB_BATCH_MAX_ATTEMPTS, base=config.DYNAMODB_BATCH_BACKOFF,
+            deadline=request_deadline()
+        )
+
+    def _invalidate(self, data_source: str, keys: list):
+        """Drop written items from the request identity map and invalidate the cached result pages of their table
+
+        :param str data_source: Table name
+        :param list keys: Item keys
+        """
+
+        self.result_cache.invalidate(data_source)
+        self.exists_cache.invalidate(data_source)
+        self.hot_key_cache.invalidate(data_source)
+        known = identity_map()
+
+        if known:
+            for key in keys:
+                known.invalidate(data_source, key)
+
+    @staticmethod
+    def _rollups(resource: str) -> list:
+        """Return the rollups declared for a resource
+
+        :param str resource: Resource being accessed
+        :return: Declared rollups
+        :rtype: list
+        """
+
+        return rollups_for(resource, config.DOMAIN[resource])
 
-                if config.LAST_UPDATED in filter_:
-                    del filter_[config.LAST_UPDATED]
+    def _rollup_table(self) -> RollupTable:
+        """Return the side table holding rollup counters
 
-                return self.find(resource, None, filter_, perform_count=True)[1] == 0
+        :return: Rollup table
+        :rtype: RollupTable
+        """
+
+        return RollupTable(self._table(config.DYNAMODB_ROLLUP_TABLE))
+
+    def _maintain_rollups(self, resource: str, removed: list = (), added: list = ()):
+        """Adjust the rollups of a resource after a write
+
+        :param str resource: Resource being accessed
+        :param list removed: Documents no longer present, or their previous version
+        :param list added: Documents now present, or their new version
+        """
+
+        rollups = self._rollups(resource)
+
+        if rollups:
+            self._rollup_table().apply(rollups, removed, added, config.DELETED)
+
+    def rebuild_rollups(self, resource: str) -> int:
+        """Recount the rollups of a resource from every document it holds
+
+        Rollups declared on a resource which already holds documents start from zero, rebuild them once while writes
+        to the resource are paused.
+
+        :param str resource: Resource being accessed
+        :return: Documents read
+        :rtype: int
+        """
+
+        rollups = self._rollups(resource)
+        data_source, _, _, _ = self._datasource_ex(resource)
+
+        try:
+            documents = self._strip_maintained(resource, self._paginate(self._table(data_source).scan))
+            self._rollup_table().rebuild(rollups, documents, config.DELETED)
+            self._invalidate(data_source, [])
+            return len(documents)
 
         except BotoCoreClientError as e:
-            abort(400, description=debug_error_message(e.response['Error']['Message']))
+            abort(500, description=debug_error_message(e.response['Error']['Message']))
+
+    def _rollup_terms(self, resource: str, spec: dict) -> dict:
+        """Reduce a query to the equality terms rollups can answer, if any
+
+        Rollups only count live documents, so on soft delete resources the query must exclude deleted documents.
+
+        :param str resource: Resource being accessed
+        :param dict spec: Query
+        :return: Remaining field equalities or None, if rollups cannot answer the query
+        :rtype: dict
+        """
+
+        terms = equality_terms(spec) if self._rollups(resource) else None
+
+        if terms is None:
+            return None
+
+        if config.DOMAIN[resource]["soft_delete"]:
+            if terms.pop(config.DELETED, None) != {"$ne": True}:
+                return None
+
+        if any(isinstance(value, dict) for value in terms.values()):
+            return None
+
+        return terms
+
+    def _rollup_count(self, resource: str, spec: dict) -> int:
+        """Count documents matching a query from the resource rollups
+
+        :param str resource: Resource being accessed
+        :param dict spec: Query
+        :return: Document count or None, if rollups cannot answer the query
+        :rtype: int
+        """
+
+        terms = self._rollup_terms(resource, spec)
+
+        if terms is None or len(terms) > 1:
+            return None
+
+        rollups = self._rollups(resource)
+
+        try:
+            if not terms:
+                return self._rollup_table().count(rollups[0], every=True)
+
+            field, value = next(iter(terms.items()))
+
+            for rollup in rollups:
+                if rollup.group_by == field:
+                    return self._rollup_table().count(rollup, value)
+
+        except BotoCoreClientError as e:
+            abort(500, description=debug_error_message(e.response['Error']['Message']))
+
+        return None
+
+    @staticmethod
+    def _count(operation: Callable, **kwargs) -> int:
+        """Count the items matched by a Scan or Query across every page
+
+        :param Callable operation: Table operation, ``table.scan`` or ``table.query``
+        :param dict kwargs: Operation arguments
+        :return: Item count
+        :rtype: int
+        """
+
+        count = 0
+
+        while True:
+            page = operation(Select='COUNT', **kwargs)
+            count += page.get('Count', 0)
+
+            if 'LastEvaluatedKey' not in page:
+                return count
+
+            kwargs['ExclusiveStartKey'] = page['LastEvaluatedKey']
+
+    @staticmethod
+    def _probe(operation: Callable, limit: int = 1, **kwargs) -> bool:
+        """Whether a Scan or Query matches any item, stopping at the first page holding a match
+
+        :param Callable operation: Table operation, ``table.scan`` or ``table.query``
+        :param int limit: Items evaluated by the first page, doubled on every following page
+        :param dict kwargs: Operation arguments
+        :return: True, if an item matches. False otherwise
+        :rtype: bool
+        """
+
+        limit = max(int(limit), 1)
+
+        while True:
+            page = operation(Select='COUNT', Limit=limit, **kwargs)
+
+            if page.get('Count', 0):
+                return True
+
+            if 'LastEvaluatedKey' not in page:
+                return False
+
+            kwargs['ExclusiveStartKey'] = page['LastEvaluatedKey']
+            limit *= 2
+
+    @staticmethod
+    def _paginate(operation: Callable, **kwargs) -> Iterable:
+        """Yield items from every page of a Scan or Query
+
+        :param Callable operation: Table operation, ``table.scan`` or ``table.query``
+        :param dict kwargs: Operation arguments
+        :return: Items
+        :rtype: Iterable
+        """
+
+        while True:
+            page = operation(**kwargs)
+
+            for item in page.get('Items', []):
+                yield item
+
+            if 'LastEvaluatedKey' not in page:
+                return
+
+            kwargs['ExclusiveStartKey'] = page['LastEvaluatedKey']
+
+    @staticmethod
+    def _client_sort(req: ParsedRequest) -> list:
+        """Parse the sort requested by the client
+
+        :param ParsedRequest req: Contains all the constraints that must be fulfilled in order to satisfy the request
+        :return: Sort as ``(field, direction)`` pairs, or None
+        :rtype: list
+        """
+
+        if not req or not req.sort:
+            return None
+
+        try:
+            return ast.literal_eval(req.sort)
+        except (SyntaxError, ValueError):
+            abort(400, description=debug_error_message("Unable to parse `sort` clause"))
 
     @staticmethod
     def _convert_where_request_to_dict(req: ParsedRequest) -> dict:
@@ -0,0 +1,160 @@
+"""Explain mode and slow operation log
+
+An explanation pairs the plan chosen for a read with what reading actually cost: calls, pages, items scanned and
+returned, consumed capacity and latency. Explanations are collected per request for debugging, and logged when a read
+crosses the configured latency or scanned to returned thresholds.
+
+.. codeauthor:: John Lane <john.lane93@gmail.com>
+
+"""
+
+import logging
+import time
+from flask import g, has_app_context, has_request_context, request
+import simplejson as json
+
+from eve_dynamodb.instrumentation import MemorySink
+from eve_dynamodb.planner import Plan
+
+
+class Explain:
+    """Plan and measured cost of a single read
+    """
+
+    def __init__(self, resource: str, operation: str, plan: Plan, projection=None):
+        """Initialize explanation
+
+        :param str resource: Resource name
+        :param str operation: Data layer operation, e.g. find or find_one
+        :param Plan plan: Chosen plan
+        :param projection: Projected fields
+        """
+
+        self.resource = resource
+        self.operation = operation
+        self.plan = plan
+        self.projection = list(projection) if projection else None
+        self.sink = MemorySink()
+        self.latency = 0.0
+        self._started = None
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *_args):
+        self.latency = time.perf_counter() - self._started
+
+    @property
+    def scanned(self) -> int:
+        """Items evaluated by DynamoDB
+
+        :return: Scanned items
+        :rtype: int
+        """
+
+        return self.sink.total()['scanned']
+
+    @property
+    def returned(self) -> int:
+        """Items returned by DynamoDB
+
+        :return: Returned items
+        :rtype: int
+        """
+
+        return self.sink.total()['returned']
+
+    def as_dict(self) -> dict:
+        """Return the explanation as a dictionary
+
+        :return: Explanation
+        :rtype: dict
+        """
+
+        total = self.sink.total()
+        explanation = {'resource': self.resource, 'operation': self.operation}
+        explanation.update(self.plan.describe(self.projection))
+        explanation.update({
+            'latency': self.latency,
+            'calls': total['calls'],
+            'pages': total['pages'],
+            'scanned': total['scanned'],
+            'returned': total['returned'],
+            'capacity': total['capacity']
+        })
+
+        return explanation
+
+
+class SlowOperationLog:
+    """Logs reads above a latency or scanned to returned ratio threshold
+    """
+
+    def __init__(self, latency: float = 0.0, ratio: float = 0.0, logger: logging.Logger = None):
+        """Initialize slow operation log
+
+        :param float latency: Seconds above which a read is logged, 0 disables the threshold
+        :param float ratio: Items scanned per item returned above which a read is logged, 0 disables the threshold
+        :param logging.Logger logger: Logger, defaults to the ``eve_dynamodb`` logger
+        """
+
+        self.latency = latency
+        self.ratio = ratio
+        self.logger = logger or logging.getLogger('eve_dynamodb')
+
+    @property
+    def enabled(self) -> bool:
+        """Whether any threshold is set
+
+        :return: True, if enabled. False otherwise
+        :rtype: bool
+        """
+
+        return bool(self.latency or self.ratio)
+
+    def is_slow(self, explain: Explain) -> bool:
+        """Whether a read crossed a threshold
+
+        :param Explain explain: Explanation
+        :return: True, if slow. False otherwise
+        :rtype: bool
+        """
+
+        if self.latency and explain.latency >= self.latency:
+            return True
+
+        return bool(self.ratio) and explain.scanned >= self.ratio * max(explain.returned, 1)
+
+    def __call__(self, explain: Explain):
+        if self.is_slow(explain):
+            self.logger.warning("Slow DynamoDB operation: %s", json.dumps(explain.as_dict(), default=str))
+
+
+def explain_requested(always: bool, parameter: str, debug: bool) -> bool:
+    """Whether reads of the current request should be explained
+
+    :param bool always: Explain every read
+    :param str parameter: Query parameter requesting explanations, honoured in debug mode
+    :param bool debug: Whether the application runs in debug mode
+    :return: True, if reads should be explained. False otherwise
+    :rtype: bool
+    """
+
+    return always or bool(debug and parameter and has_request_context() and parameter in request.args)
+
+
+def explanations() -> list:
+    """Return the explanations collected during the current request
+
+    :return: Explanations or None, outside of an application context
+    :rtype: list
+    """
+
+    if not has_app_context():
+        return None
+
+    if '_dynamodb_explain' not in g:
+        g._dynamodb_explain = []  # pylint: disable=protected-access
+
+    return g._dynamodb_explain  # pylint: disable=protected-access
@@ -0,0 +1,412 @@
+"""Streaming export of whole collections
+
+Reads a table with a parallel segmented scan and encodes every page as it arrives, as newline delimited JSON or CSV,
+so memory stays bounded by a few pages whatever the size of the table. Values are converted following the resource
+schema: integral numbers become integers, sets become lists and binary values base64 strings.
+
+Exports written to a file can be resumed: after every page the checkpoint records the output offset and, for every
+segment, the key its scan stopped at. Resuming truncates the output to the offset and restarts each segment there.
+
+Export from the command line with::
+
+    python -m eve_dynamodb.export settings.py actor actor.ndjson --segments 8 --checkpoint actor.checkpoint
+
+.. codeauthor:: John Lane <john.lane93@gmail.com>
+
+"""
+
+import argparse
+import base64
+import csv
+from decimal import Decimal
+import io
+import os
+import queue
+import sys
+import threading
+from typing import Callable, Iterator
+from boto3.dynamodb.types import Binary
+import simplejson as json
+
+FORMATS = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+
+
+def plain(value, schema: dict = None):
+    """Convert a DynamoDB value into its JSON counterpart, following its field schema
+
+    :param value: Value read from DynamoDB
+    :param dict schema: Field schema
+    :return: Value
+    """
+
+    schema = schema or {}
+
+    if isinstance(value, Decimal):
+        if schema.get('type') == 'float':
+            return float(value)
+
+        return int(value) if schema.get('type') == 'integer' or value == value.to_integral_value() else value
+
+    if isinstance(value, Binary):
+        value = value.value
+
+    if isinstance(value, (bytes, bytearray)):
+        return base64.b64encode(bytes(value)).decode('ascii')
+
+    if isinstance(value, (set, frozenset)):
+        return sorted(plain(item, schema.get('schema')) for item in value)
+
+    if isinstance(value, dict):
+        fields = schema.get('schema', {}) if schema.get('type') == 'dict' else {}
+        return {key: plain(item, fields.get(key)) for key, item in value.items()}
+
+    if isinstance(value, list):
+        return [plain(item, schema.get('schema') if schema.get('type') == 'list' else None) for item in value]
+
+    return value
+
+
+class NDJSONEncoder:
+    """Encodes items as newline delimited JSON
+    """
+
+    def __init__(self, schema: dict = None, **_kwargs):
+        """Initialize NDJSON encoder
+
+        :param dict schema: Resource schema
+        :param dict _kwargs: Extra arguments
+        """
+
+        self.schema = {'type': 'dict', 'schema': schema or {}}
+
+    @staticmethod
+    def header() -> str:
+        """Return what precedes the first item
+
+        :return: Header
+        :rtype: str
+        """
+
+        return ''
+
+    def encode(self, items: list) -> str:
+        """Encode a page of items
+
+        :param list items: Items
+        :return: Encoded items
+        :rtype: str
+        """
+
+        return ''.join(json.dumps(plain(item, self.schema), separators=(',', ':')) + '\n' for item in items)
+
+
+class CSVEncoder(NDJSONEncoder):
+    """Encodes items as CSV rows, one column per field, nested values as JSON
+    """
+
+    def __init__(self, schema: dict = None, fields: list = None, **_kwargs):
+        """Initialize CSV encoder
+
+        :param dict schema: Resource schema
+        :param list fields: Columns, defaults to the schema fields
+        :param dict _kwargs: Extra arguments
+        """
+
+        super().__init__(schema)
+        self.fields = list(fields or (schema or {}).keys())
+
+    def _cell(self, value) -> str:
+        """Format a cell
+
+        :param value: Plain value
+        :return: Cell
+        :rtype: str
+        """
+
+        if value is None:
+            return ''
+
+        if isinstance(value, bool):
+            return 'true' if value else 'false'
+
+        return json.dumps(value, separators=(',', ':')) if isinstance(value, (dict, list)) else str(value)
+
+    def _rows(self, rows: list) -> str:
+        """Write rows
+
+        :param list rows: Rows of cells
+        :return: CSV
+        :rtype: str
+        """
+
+        buffer = io.StringIO()
+        csv.writer(buffer, lineterminator='\n').writerows(rows)
+        return buffer.getvalue()
+
+    def header(self) -> str:
+        return self._rows([self.fields])
+
+    def encode(self, items: list) -> str:
+        return self._rows([
+            [self._cell(document.get(field)) for field in self.fields]
+            for document in (plain(item, self.schema) for item in items)
+        ])
+
+
+ENCODERS = {'ndjson': NDJSONEncoder, 'csv': CSVEncoder}
+
+
+def encode_key(key: dict) -> dict:
+    """Encode a LastEvaluatedKey for a JSON checkpoint
+
+    :param dict key: Key
+    :return: Attribute name to type and value pairs
+    :rtype: dict
+    """
+
+    encoded = {}
+
+    for name, value in key.items():
+        if isinstance(value, Decimal):
+            encoded[name] = ['N', str(value)]
+        elif isinstance(value, (Binary, bytes, bytearray)):
+            encoded[name] = ['B', base64.b64encode(bytes(getattr(value, 'value', value))).decode('ascii')]
+        else:
+            encoded[name] = ['S', value]
+
+    return encoded
+
+
+def decode_key(encoded: dict) -> dict:
+    """Decode a key encoded by encode_key
+
+    :param dict encoded: Encoded key
+    :return: Key
+    :rtype: dict
+    """
+
+    decoders = {'N': Decimal, 'B': lambda value: Binary(base64.b64decode(value)), 'S': str}
+    return {name: decoders[kind](value) for name, (kind, value) in encoded.items()}
+
+
+class Exporter:
+    """Parallel segmented scan of a table, encoded page by page
+    """
+
+    def __init__(self, scan: Callable, arguments: dict = None, segments: int = 4, encoder: NDJSONEncoder = None,
+                 hidden: list = None, fmt: str = 'ndjson'):
+        """Initialize exporter
+
+        :param Callable scan: Table scan
+        :param dict arguments: Scan arguments, e.g. its filter and projection
+        :param int segments: Segments scanned in parallel
+        :param NDJSONEncoder encoder: Encoder
+        :param list hidden: Attributes removed from every item
+        :param str fmt: Format name, recorded in checkpoints
+        """
+
+        self.scan = scan
+        self.arguments = dict(arguments or {})
+        self.segments = max(int(segments), 1)
+        self.encoder = encoder or NDJSONEncoder()
+        self.hidden = list(hidden or [])
+        self.format = fmt
+        self.exported = 0
+
+    @property
+    def mimetype(self) -> str:
+        """Media type of the export
+
+        :return: Media type
+        :rtype: str
+        """
+
+        return FORMATS[self.format]
+
+    def pages(self, positions: dict = None) -> Iterator:
+        """Scan every segment in parallel, yielding pages as they arrive
+
+        At most two pages per segment wait to be consumed; abandoning the iterator stops the scans.
+
+        :param dict positions: Key each segment resumes after, True for segments already exported
+        :return: Segment, items and the key its scan stopped at, None once the segment is exhausted
+        :rtype: Iterator
+        """
+
+        positions = positions or {}
+        pages, stopped = queue.Queue(maxsize=2 * self.segments), threading.Event()
+
+        def put(page: tuple) -> bool:
+            while not stopped.is_set():
+                try:
+                    pages.put(page, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+
+            return False
+
+        def scan(segment: int):
+            kwargs = dict(self.arguments, Segment=segment, TotalSegments=self.segments)
+
+            if positions.get(segment):
+                kwargs['ExclusiveStartKey'] = positions[segment]
+
+            try:
+                while True:
+                    page = self.scan(**kwargs)
+                    last_key = page.get('LastEvaluatedKey')
+
+                    if not put((segment, page.get('Items', []), last_key)) or last_key is None:
+                        break
+
+                    kwargs['ExclusiveStartKey'] = last_key
+            except Exception as e:  # pylint: disable=broad-except
+                put((segment, e, None))
+            finally:
+                put((segment, None, None))
+
+        segments = [segment for segment in range(self.segments) if positions.get(segment) is not True]
+
+        for segment in segments:
+            threading.Thread(target=scan, args=(segment,), daemon=True, name=f"eve-dynamodb-export-{segment}").start()
+
+        try:
+            running = len(segments)
+
+            while running:
+                segment, items, last_key = pages.get()
+
+                if isinstance(items, Exception):
+                    raise items
+
+                if items is None:
+                    running -= 1
+                    continue
+
+                for item in items:
+                    for attribute in self.hidden:
+                        item.pop(attribute, None)
+
+                yield segment, items, last_key
+        finally:
+            stopped.set()
+
+    def stream(self) -> Iterator:
+        """Yield the encoded export, chunk by chunk
+
+        :return: Encoded chunks
+        :rtype: Iterator
+        """
+
+        yield self.encoder.header()
+
+        for _, items, _ in self.pages():
+            if items:
+                self.exported += len(items)
+                yield self.encoder.encode(items)
+
+    def write(self, path: str, checkpoint: str = None) -> int:
+        """Write the export to a file, resuming from a checkpoint when one exists
+
+        :param str path: Output file, ``-`` for standard output
+        :param str checkpoint: Checkpoint file, removed once the export completes
+        :return: Items exported by this run
+        :rtype: int
+        :raises: ValueError
+        """
+
+        state = None
+
+        if checkpoint and os.path.exists(checkpoint):
+            with open(checkpoint, encoding='utf-8') as file:
+                state = json.load(file)
+
+            if state['segments'] != self.segments or state['format'] != self.format:
+                raise ValueError(f"Checkpoint {checkpoint} was written by a different export")
+
+        if path == '-' and (checkpoint or state):
+            raise ValueError("Exports to standard output cannot be checkpointed")
+
+        positions = {
+            int(segment): True if position is True else decode_key(position)
+            for segment, position in (state['positions'] if state else {}).items() if position is not None
+        }
+        # pylint: disable=consider-using-with
+        output = sys.stdout.buffer if path == '-' else open(path, 'r+b' if state else 'wb')
+
+        try:
+            if state:
+                output.truncate(state['offset'])
+                output.seek(state['offset'])
+            else:
+                output.write(self.encoder.header().encode('utf-8'))
+
+            saved = {str(segment): True if position is True else encode_key(position)
+                     for segment, position in positions.items()}
+
+            for segment, items, last_key in self.pages(positions):
+                self.exported += len(items)
+                output.write(self.encoder.encode(items).encode('utf-8'))
+                saved[str(segment)] = True if last_key is None else encode_key(last_key)
+
+                if checkpoint:
+                    output.flush()
+                    self._save(checkpoint, {
+                        'format': self.format, 'segments': self.segments, 'offset': output.tell(), 'positions': saved
+                    })
+        finally:
+            if path != '-':
+                output.close()
+
+        if checkpoint and os.path.exists(checkpoint):
+            os.remove(checkpoint)
+
+        return self.exported
+
+    @staticmethod
+    def _save(path: str, state: dict):
+        """Replace a checkpoint atomically
+
+        :param str path: Checkpoint file
+        :param dict state: Checkpoint
+        """
+
+        with open(f"{path}.tmp", 'w', encoding='utf-8') as file:
+            json.dump(state, file)
+
+        os.replace(f"{path}.tmp", path)
+
+
+def main(argv: list = None) -> int:
+    """Export a resource to a file
+
+    :param list argv: Command line arguments
+    :return: Exit code
+    :rtype: int
+    """
+
+    import eve  # pylint: disable=import-outside-toplevel
+    from eve_dynamodb.dynamodb import DynamoDB  # pylint: disable=import-outside-toplevel
+
+    parser = argparse.ArgumentParser(prog='python -m eve_dynamodb.export', description=__doc__.split('\n')[0])
+    parser.add_argument('settings', help="Eve settings file")
+    parser.add_argument('resource', help="resource to export")
+    parser.add_argument('output', help="output file, - for standard output")
+    parser.add_argument('--format', choices=sorted(ENCODERS), default='ndjson', help="output format")
+    parser.add_argument('--segments', type=int, default=None, help="segments scanned in parallel")
+    parser.add_argument('--checkpoint', default=None, help="checkpoint file, resumed from when it exists")
+    args = parser.parse_args(argv)
+
+    app = eve.Eve(settings=os.path.abspath(args.settings), data=DynamoDB)
+
+    with app.app_context():
+        exporter = app.data.export(args.resource, args.format, args.segments)
+        exported = exporter.write(args.output, args.checkpoint)
+
+    sys.stderr.write(f"Exported {exported} items\n")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
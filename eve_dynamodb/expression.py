@@ -127,3 +127,66 @@ def build_key_expression(lookup: dict, parent: str = None) -> ConditionBase:
             operations.append(operator(parent if parent else k, v))
 
     return reduce(lambda acc, val: (acc & val) if acc else val, operations)
+
+
+def build_projection_expression(fields) -> tuple:
+    """Build a projection expression from a list of fields
+
+    Every path segment is replaced with a placeholder so reserved words may be projected safely.
+
+    :param fields: Field names, nested fields use dot notation
+    :return: Projection expression and its expression attribute names
+    :rtype: tuple
+    """
+
+    placeholders = {}
+    paths = []
+
+    for field in fields:
+        segments = []
+
+        for segment in field.split('.'):
+            if segment not in placeholders:
+                placeholders[segment] = f"#p{len(placeholders)}"
+            segments.append(placeholders[segment])
+
+        paths.append('.'.join(segments))
+
+    return ', '.join(paths), {placeholder: name for name, placeholder in placeholders.items()}
+
+
+def build_update_expression(updates: dict, remove=()) -> tuple:
+    """Build an update expression setting every field of a partial document and removing others
+
+    :param dict updates: Field values, nested fields use dot notation
+    :param remove: Fields to remove, nested fields use dot notation
+    :return: Update expression, its expression attribute names and values
+    :rtype: tuple
+    """
+
+    placeholders = {}
+    values = {}
+    assignments = []
+    removals = []
+
+    def path(field: str) -> str:
+        segments = []
+
+        for segment in field.split('.'):
+            if segment not in placeholders:
+                placeholders[segment] = f"#u{len(placeholders)}"
+            segments.append(placeholders[segment])
+
+        return '.'.join(segments)
+
+    for field, value in updates.items():
+        values[f":u{len(values)}"] = value
+        assignments.append(f"{path(field)} = :u{len(values) - 1}")
+
+    for field in remove:
+        removals.append(path(field))
+
+    clauses = [f"SET {', '.join(assignments)}"] if assignments else []
+    clauses += [f"REMOVE {', '.join(removals)}"] if removals else []
+
+    return ' '.join(clauses), {placeholder: name for name, placeholder in placeholders.items()}, values
@@ -0,0 +1,353 @@
+"""Hedged reads and request deadlines
+
+A read that has not returned once a configurable percentile of the recent latency of its table and operation has
+elapsed is sent again, on another pooled connection, and whichever response comes back first wins. Latencies are
+tracked in a rolling histogram of logarithmic buckets.
+
+Every read made while serving a request is also bounded by the time the request has left: ``DYNAMODB_REQUEST_TIMEOUT``
+seconds from its start, or the milliseconds left announced by an upstream proxy in ``DYNAMODB_DEADLINE_HEADER`` (e.g.
+``X-Envoy-Expected-Rq-Timeout-Ms``). Once it expires botocore stops sending and retrying, and when hedging is enabled
+callers also stop waiting on the read in flight. Without hedging, reads run on the calling thread.
+
+Batch requests left unprocessed by a throttled table are resent after an exponential backoff with full jitter, a
+bounded number of times and never past the deadline.
+
+.. codeauthor:: John Lane <john.lane93@gmail.com>
+
+"""
+
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import math
+import random
+import threading
+import time
+from typing import Callable, Iterator
+from botocore.exceptions import ClientError
+from flask import g, has_app_context, has_request_context, request
+
+_local = threading.local()
+
+
+def deadline_exceeded(operation: str) -> ClientError:
+    """Build the error raised when a read outlives the request deadline
+
+    :param str operation: Operation name
+    :return: Client error
+    :rtype: ClientError
+    """
+
+    return ClientError({'Error': {'Code': 'DeadlineExceeded', 'Message': "Request deadline exceeded"}}, operation)
+
+
+def throttled(operation: str, attempts: int) -> ClientError:
+    """Build the error raised when a batch request is still unprocessed after its last attempt
+
+    :param str operation: Operation name
+    :param int attempts: Attempts made
+    :return: Client error
+    :rtype: ClientError
+    """
+
+    return ClientError({'Error': {
+        'Code': 'ProvisionedThroughputExceededException',
+        'Message': f"Requests remained unprocessed after {attempts} attempts"
+    }}, operation)
+
+
+def backoff(attempt: int, base: float = 0.05, cap: float = 2.0) -> float:
+    """Return how long to wait before a retry, drawn uniformly below an exponentially growing bound
+
+    :param int attempt: Retries made so far
+    :param float base: Bound of the first retry, in seconds
+    :param float cap: Largest bound, in seconds
+    :return: Seconds
+    :rtype: float
+    """
+
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def retry_unprocessed(function: Callable, request: dict, unprocessed: str, operation: str, max_attempts: int = 8,
+                      base: float = 0.05, deadline: float = None) -> Iterator:
+    """Send a batch request, resending what is left unprocessed after a backoff
+
+    :param Callable function: Batch operation, called with ``RequestItems``
+    :param dict request: Request items
+    :param str unprocessed: Response field holding the unprocessed request items
+    :param str operation: Operation name
+    :param int max_attempts: Most calls made
+    :param float base: Bound of the first backoff, in seconds
+    :param float deadline: Monotonic time after which no retry is made
+    :return: Responses
+    :rtype: Iterator
+    :raises: ClientError
+    """
+
+    attempt = 0
+
+    while request:
+        if attempt >= max_attempts:
+            raise throttled(operation, attempt)
+
+        if attempt:
+            delay = backoff(attempt - 1, base)
+
+            if deadline is not None and delay >= remaining(deadline):
+                raise deadline_exceeded(operation)
+
+            time.sleep(delay)
+
+        response = function(RequestItems=request)
+        attempt += 1
+        request = response.get(unprocessed)
+        yield response
+
+
+def start_deadline(timeout: float = 0.0, header: str = None):
+    """Set the deadline of the current request
+
+    :param float timeout: Seconds the request may take, 0 for no limit
+    :param str header: Header carrying the milliseconds the request has left
+    """
+
+    budgets = [timeout] if timeout else []
+
+    if header and has_request_context() and request.headers.get(header):
+        try:
+            budgets.append(float(request.headers[header]) / 1000)
+        except ValueError:
+            pass
+
+    g._dynamodb_deadline = time.monotonic() + min(budgets) if budgets else None  # pylint: disable=protected-access
+
+
+def request_deadline() -> float:
+    """Return the deadline of the current request
+
+    :return: Monotonic time or None, without a deadline
+    :rtype: float
+    """
+
+    return g.get('_dynamodb_deadline') if has_app_context() else None
+
+
+def remaining(deadline: float) -> float:
+    """Return the seconds left before a deadline
+
+    :param float deadline: Monotonic time or None
+    :return: Seconds left, None without a deadline
+    :rtype: float
+    """
+
+    return None if deadline is None else max(deadline - time.monotonic(), 0.0)
+
+
+def check_deadline(**_kwargs):
+    """Stop botocore from sending, or retrying, a request past the deadline of the read it serves
+
+    Registered on ``before-send.dynamodb``.
+
+    :param dict _kwargs: Event arguments
+    :raises: ClientError
+    """
+
+    deadline = getattr(_local, 'deadline', None)
+
+    if deadline is not None and time.monotonic() >= deadline:
+        raise deadline_exceeded('Send')
+
+
+class LatencyHistogram:
+    """Rolling histogram of the most recent latencies, in buckets growing by a constant factor
+    """
+
+    def __init__(self, window: int = 1024, smallest: float = 0.0001, growth: float = 1.1):
+        """Initialize latency histogram
+
+        :param int window: Latencies kept
+        :param float smallest: Upper bound of the first bucket, in seconds
+        :param float growth: Ratio between the bounds of consecutive buckets
+        """
+
+        self.smallest = smallest
+        self.growth = growth
+        self._samples = deque(maxlen=window)
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def bucket(self, latency: float) -> int:
+        """Return the bucket holding a latency
+
+        :param float latency: Latency in seconds
+        :return: Bucket
+        :rtype: int
+        """
+
+        return max(math.ceil(math.log(max(latency, self.smallest) / self.smallest, self.growth)), 0)
+
+    def add(self, latency: float):
+        """Record a latency, forgetting the oldest one once the window is full
+
+        :param float latency: Latency in seconds
+        """
+
+        bucket = self.bucket(latency)
+
+        with self._lock:
+            if len(self._samples) == self._samples.maxlen:
+                evicted = self._samples[0]
+                self._counts[evicted] -= 1
+
+            self._samples.append(bucket)
+            self._counts[bucket] = self._counts.get(bucket, 0) + 1
+
+    def percentile(self, percentile: float) -> float:
+        """Return the upper bound of the bucket holding a percentile
+
+        :param float percentile: Percentile, between 0 and 100
+        :return: Latency in seconds, None when empty
+        :rtype: float
+        """
+
+        with self._lock:
+            target, seen = math.ceil(len(self._samples) * percentile / 100), 0
+
+            for bucket in sorted(self._counts):
+                seen += self._counts[bucket]
+
+                if seen >= max(target, 1):
+                    return self.smallest * self.growth ** bucket
+
+        return None
+
+
+class Hedger:
+    """Runs reads on a pool, hedging the slow ones and bounding them by a deadline
+    """
+
+    def __init__(self, percentile: float = 0.0, min_delay: float = 0.001, min_samples: int = 20, workers: int = 16,
+                 window: int = 1024):
+        """Initialize hedger
+
+        :param float percentile: Latency percentile after which a read is hedged, 0 disables hedging
+        :param float min_delay: Least seconds waited before hedging
+        :param int min_samples: Latencies recorded for a table and operation before its reads are hedged
+        :param int workers: Reads in flight at once, hedges included
+        :param int window: Latencies kept per table and operation
+        """
+
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self.workers = workers
+        self.window = window
+        self.hedged = 0
+        self.won = 0
+        self._histograms = {}
+        self._pool = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        """Whether slow reads are hedged
+
+        :return: True, if enabled. False otherwise
+        :rtype: bool
+        """
+
+        return self.percentile > 0
+
+    def histogram(self, key: tuple) -> LatencyHistogram:
+        """Return the latency histogram of a table and operation
+
+        :param tuple key: Table name and operation
+        :return: Latency histogram
+        :rtype: LatencyHistogram
+        """
+
+        with self._lock:
+            if key not in self._histograms:
+                self._histograms[key] = LatencyHistogram(self.window)
+
+            return self._histograms[key]
+
+    def delay(self, key: tuple) -> float:
+        """Return how long a read waits before being hedged
+
+        :param tuple key: Table name and operation
+        :return: Seconds, None if the read is not hedged
+        :rtype: float
+        """
+
+        histogram = self.histogram(key)
+        latency = histogram.percentile(self.percentile) if self.enabled else None
+
+        if latency is None or len(histogram) < self.min_samples:
+            return None
+
+        return max(latency, self.min_delay)
+
+    def call(self, key: tuple, function: Callable, deadline: float = None):
+        """Perform a read, hedging it when slow, and return the first successful response
+
+        :param tuple key: Table name and operation
+        :param Callable function: Read, safe to repeat
+        :param float deadline: Monotonic time after which the read is abandoned
+        :return: Response
+        :raises: ClientError
+        """
+
+        if not self.enabled:
+            return self._timed(key, function, deadline)
+
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix='eve-dynamodb-read')
+
+        first = self._pool.submit(self._timed, key, function, deadline)
+        pending, error = {first}, None
+        delay, budget = self.delay(key), remaining(deadline)
+
+        if delay is not None and (budget is None or delay < budget) and not wait(pending, timeout=delay)[0]:
+            pending.add(self._pool.submit(self._timed, key, function, deadline))
+            self.hedged += 1
+
+        while pending:
+            done, pending = wait(pending, timeout=remaining(deadline), return_when=FIRST_COMPLETED)
+
+            if not done:
+                raise deadline_exceeded(key[1])
+
+            for future in done:
+                if future.exception() is None:
+                    self.won += 0 if future is first else 1
+                    return future.result()
+
+                error = future.exception()
+
+        raise error
+
+    def _timed(self, key: tuple, function: Callable, deadline: float):
+        """Perform a read bounded by a deadline, recording its latency
+
+        :param tuple key: Table name and operation
+        :param Callable function: Read
+        :param float deadline: Monotonic time or None
+        :return: Response
+        """
+
+        previous, _local.deadline = getattr(_local, 'deadline', None), deadline
+        started = time.perf_counter()
+
+        try:
+            if deadline is not None and remaining(deadline) <= 0:
+                raise deadline_exceeded(key[1])
+
+            return function()
+        finally:
+            _local.deadline = previous
+            self.histogram(key).add(time.perf_counter() - started)
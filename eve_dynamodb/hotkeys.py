@@ -0,0 +1,414 @@
+"""Hot partition key detection and write sharding
+
+Every partition key the data layer reads or writes is counted in a Space-Saving sketch kept per table and index: a
+fixed number of counters which track the heaviest keys of the stream, each overestimating its key by at most the
+recorded error. Counts are halved every ``window`` accesses, so keys cool down once their traffic moves elsewhere. A
+key whose recent accesses reach ``share`` of its table's is hot: it is reported to the instrumentation sinks once, and
+reads of hot partitions can be served from a short lived cache.
+
+Partition keys known to stay hot can be sharded on write. Resources opt in by naming the attribute and its hot
+values::
+
+    'write_sharding': {'attribute': 'tenant', 'shards': 8, 'values': ['acme']}
+
+Items written with ``tenant`` set to ``acme`` store ``acme<US><shard>`` instead, the shard chosen from a hash of their
+id, so the writes of a single natural key spread over ``shards`` partitions. The ASCII unit separator ``<US>`` does not
+occur in text, so values written before sharding was enabled, such as ``foo#1``, are read back unchanged. Filters on
+the natural key are rewritten into the set of its shards, which the planner fans out into parallel Queries merged on the
+sort key, and pinned to a single shard when they also pin the id. Negated filters exclude every shard of their values,
+while range and other comparisons on a sharded attribute are rejected. Omit ``values`` to shard every value of the
+attribute.
+
+.. codeauthor:: John Lane <john.lane93@gmail.com>
+
+"""
+
+import threading
+from typing import Callable
+import zlib
+
+from eve_dynamodb.planner import conjuncts
+
+SEPARATOR = '\x1f'
+LOGICAL_OPERATORS = ('$or', '$and', '$nor', '$not', '$xor')
+
+
+class SpaceSaving:
+    """Space-Saving sketch of the heaviest keys of a stream
+    """
+
+    def __init__(self, capacity: int = 64):
+        """Initialize sketch
+
+        :param int capacity: Keys counted at once
+        """
+
+        self.capacity = max(int(capacity), 1)
+        self.total = 0
+        self._counters = {}
+
+    def __len__(self) -> int:
+        return len(self._counters)
+
+    def add(self, key, weight: int = 1) -> int:
+        """Count a key, taking over the counter of the least counted key when every counter is in use
+
+        :param key: Key
+        :param int weight: Accesses counted
+        :return: Estimated count of the key
+        :rtype: int
+        """
+
+        self.total += weight
+        counter = self._counters.get(key)
+
+        if counter is None and len(self._counters) >= self.capacity:
+            evicted = min(self._counters, key=lambda known: self._counters[known][0])
+            count, _ = self._counters.pop(evicted)
+            counter = self._counters[key] = [count, count]
+        elif counter is None:
+            counter = self._counters[key] = [0, 0]
+
+        counter[0] += weight
+        return counter[0]
+
+    def estimate(self, key) -> int:
+        """Return the estimated count of a key
+
+        :param key: Key
+        :return: Count, an overestimate by at most its error, 0 if not counted
+        :rtype: int
+        """
+
+        return self._counters.get(key, (0, 0))[0]
+
+    def top(self, count: int = None) -> list:
+        """Return the heaviest keys
+
+        :param int count: Keys returned, defaults to every counted key
+        :return: Key, estimated count and error triples, heaviest first
+        :rtype: list
+        """
+
+        ranked = sorted(self._counters.items(), key=lambda entry: entry[1][0], reverse=True)
+        return [(key, estimate, error) for key, (estimate, error) in ranked[:count]]
+
+    def decay(self, factor: float = 0.5):
+        """Scale every count down, forgetting the keys left without accesses
+
+        :param float factor: Ratio kept
+        """
+
+        self.total = int(self.total * factor)
+
+        for key, counter in list(self._counters.items()):
+            counter[0], counter[1] = int(counter[0] * factor), int(counter[1] * factor)
+
+            if not counter[0]:
+                del self._counters[key]
+
+
+class HotKeys:
+    """Tracks the partition keys accessed per table and index, reporting those taking a large share of the accesses
+    """
+
+    def __init__(self, capacity: int = 64, share: float = 0.1, min_count: int = 50, window: int = 10000,
+                 notify: Callable = None):
+        """Initialize hot key tracker
+
+        :param int capacity: Keys counted per table and index, 0 disables tracking
+        :param float share: Share of the recent accesses of a table above which a key is hot
+        :param int min_count: Recent accesses a key needs before being hot
+        :param int window: Accesses per table and index after which counts are halved
+        :param Callable notify: Called with the table, index, key, estimated count and share of a key turning hot
+        """
+
+        self.capacity = capacity
+        self.share = share
+        self.min_count = min_count
+        self.window = window
+        self.notify = notify
+        self._sketches = {}
+        self._hot = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        """Whether accesses are tracked
+
+        :return: True, if enabled. False otherwise
+        :rtype: bool
+        """
+
+        return self.capacity > 0
+
+    def _is_hot(self, sketch: SpaceSaving, count: int) -> bool:
+        """Whether an estimated count makes its key hot
+
+        :param SpaceSaving sketch: Sketch counting the key
+        :param int count: Estimated count
+        :return: True, if hot. False otherwise
+        :rtype: bool
+        """
+
+        return count >= self.min_count and count >= self.share * sketch.total
+
+    def observe(self, table: str, index: str, key, weight: int = 1) -> bool:
+        """Count an access to a partition key
+
+        :param str table: Table name
+        :param str index: Index name, None for the table itself
+        :param key: Partition key value
+        :param int weight: Accesses counted
+        :return: True, if the key is hot. False otherwise
+        :rtype: bool
+        """
+
+        if not self.enabled or key is None or isinstance(key, (dict, list, set)):
+            return False
+
+        with self._lock:
+            sketch = self._sketches.get((table, index))
+
+            if sketch is None:
+                sketch = self._sketches[(table, index)] = SpaceSaving(self.capacity)
+                self._hot[(table, index)] = set()
+
+            count = sketch.add(key, weight)
+            hot, reported, share = self._is_hot(sketch, count), self._hot[(table, index)], count / sketch.total
+            report = hot and key not in reported
+
+            if report:
+                reported.add(key)
+
+            if sketch.total >= self.window:
+                sketch.decay()
+                self._hot[(table, index)] = {
+                    known for known in reported if self._is_hot(sketch, sketch.estimate(known))
+                }
+
+        if report and self.notify:
+            self.notify(table, index, key, count, share)
+
+        return hot
+
+    def is_hot(self, table: str, index: str, key) -> bool:
+        """Whether a partition key is hot
+
+        :param str table: Table name
+        :param str index: Index name, None for the table itself
+        :param key: Partition key value
+        :return: True, if hot. False otherwise
+        :rtype: bool
+        """
+
+        with self._lock:
+            sketch = self._sketches.get((table, index))
+            return sketch is not None and self._is_hot(sketch, sketch.estimate(key))
+
+    def hot(self, table: str = None) -> list:
+        """List the hot partition keys
+
+        :param str table: Table name, defaults to every table
+        :return: Table, index, key, estimated count and share of every hot key, hottest first
+        :rtype: list
+        """
+
+        with self._lock:
+            return [
+                {'table': name, 'index': index, 'key': key, 'count': count, 'share': count / max(sketch.total, 1)}
+                for (name, index), sketch in self._sketches.items() if table is None or name == table
+                for key, count, _ in sketch.top() if self._is_hot(sketch, count)
+            ]
+
+    def reset(self):
+        """Forget every access
+        """
+
+        with self._lock:
+            self._sketches.clear()
+            self._hot.clear()
+
+
+class WriteSharding:
+    """Write sharding of the hot values of an attribute, declared for a resource
+    """
+
+    def __init__(self, attribute: str, shards: int = 8, values: list = None, id_field: str = '_id', **_kwargs):
+        """Initialize write sharding
+
+        :param str attribute: Sharded attribute, the partition key of the table or of an index
+        :param int shards: Shards per value
+        :param list values: Sharded values, None to shard every string value
+        :param str id_field: Id field, hashed to choose the shard of an item
+        :param dict _kwargs: Extra arguments
+        """
+
+        self.attribute = attribute
+        self.shards = max(int(shards), 1)
+        self.values = set(values) if values is not None else None
+        self.id_field = id_field
+
+    @classmethod
+    def for_resource(cls, settings: dict, id_field: str):
+        """Return the write sharding declared in the settings of a resource
+
+        :param dict settings: Resource settings
+        :param str id_field: Id field
+        :return: Write sharding or None
+        """
+
+        definition = settings.get('write_sharding')
+        return cls(id_field=id_field, **definition) if definition else None
+
+    def applies(self, value) -> bool:
+        """Whether a value is sharded
+
+        :param value: Attribute value
+        :return: True, if sharded. False otherwise
+        :rtype: bool
+        """
+
+        return isinstance(value, str) and (self.values is None or value in self.values)
+
+    def shard(self, value, id_):
+        """Return the value stored for an item
+
+        :param value: Natural value
+        :param id_: Item id
+        :return: Sharded value, or the value itself when it is not sharded
+        """
+
+        if not self.applies(value):
+            return value
+
+        return f"{value}{SEPARATOR}{zlib.crc32(str(id_).encode('utf-8')) % self.shards}"
+
+    def shards_of(self, value) -> list:
+        """Return every value stored for a natural value
+
+        :param value: Natural value
+        :return: Sharded values
+        :rtype: list
+        """
+
+        if not self.applies(value):
+            return [value]
+
+        return [f"{value}{SEPARATOR}{shard}" for shard in range(self.shards)]
+
+    def restore(self, value):
+        """Return the natural value of a stored value
+
+        :param value: Stored value
+        :return: Natural value
+        """
+
+        if not isinstance(value, str) or SEPARATOR not in value:
+            return value
+
+        natural, _, shard = value.rpartition(SEPARATOR)
+        return natural if shard.isdigit() and self.applies(natural) else value
+
+    def write(self, document: dict) -> dict:
+        """Shard the attribute of a document being written
+
+        :param dict document: Document, with its id
+        :return: Document to write
+        :rtype: dict
+        """
+
+        value = document.get(self.attribute)
+
+        if not self.applies(value):
+            return document
+
+        return dict(document, **{self.attribute: self.shard(value, document[self.id_field])})
+
+    def read(self, document: dict) -> dict:
+        """Restore the natural value of the attribute of a document read
+
+        :param dict document: Document
+        :return: Document
+        :rtype: dict
+        """
+
+        if self.attribute in document:
+            document[self.attribute] = self.restore(document[self.attribute])
+
+        return document
+
+    def rewrite(self, query: dict, pinned=None) -> dict:
+        """Rewrite the filters on natural values into filters on their shards
+
+        Equality and ``$in`` filters match every shard of their values, narrowed to the shard of the id when the
+        query also pins it, and ``$ne`` and ``$nin`` filters exclude every shard of theirs. Other comparisons cannot
+        be answered from the stored values and are rejected.
+
+        :param dict query: Query
+        :param pinned: Id pinned by an enclosing query
+        :return: Query on stored values
+        :rtype: dict
+        :raises: ValueError
+        """
+
+        terms = conjuncts(query)
+        pinned = next((term[self.id_field] for term in terms if self.id_field in term and not isinstance(
+            term[self.id_field], (dict, list)
+        )), pinned)
+        rewritten = [self._term(term, pinned) for term in terms]
+
+        return rewritten[0] if len(rewritten) == 1 else ({'$and': rewritten} if rewritten else query)
+
+    def _term(self, term: dict, pinned) -> dict:
+        """Rewrite a single field or single operator term
+
+        :param dict term: Term
+        :param pinned: Id pinned by the query, or None
+        :return: Term on stored values
+        :rtype: dict
+        :raises: ValueError
+        """
+
+        operator, condition = next(iter(term.items()))
+
+        if operator in LOGICAL_OPERATORS and isinstance(condition, (list, tuple)):
+            return {operator: [self.rewrite(alternative, pinned) for alternative in condition]}
+
+        if operator != self.attribute or isinstance(condition, list):
+            return term
+
+        if not isinstance(condition, dict):
+            stored = self._stored([condition], pinned)
+            return {self.attribute: stored[0] if len(stored) == 1 else {'$in': stored}}
+
+        rewritten = {}
+
+        for comparison, value in condition.items():
+            if comparison in ('$eq', '$in'):
+                rewritten['$in'] = self._stored([value] if comparison == '$eq' else list(value), pinned)
+            elif comparison in ('$ne', '$nin'):
+                excluded = self._stored([value] if comparison == '$ne' else list(value))
+                rewritten.update({'$ne': excluded[0]} if comparison == '$ne' and len(excluded) == 1 else {
+                    '$nin': excluded
+                })
+            elif comparison in ('$exists', '$type'):
+                rewritten[comparison] = value
+            else:
+                raise ValueError(f"Unsupported filter on the sharded attribute {self.attribute}: {comparison}")
+
+        return {self.attribute: rewritten}
+
+    def _stored(self, values: list, pinned=None) -> list:
+        """Return the values stored for natural values
+
+        :param list values: Natural values
+        :param pinned: Id of the only item read, or None
+        :return: Stored values
+        :rtype: list
+        """
+
+        return [
+            stored for value in values
+            for stored in ([self.shard(value, pinned)] if pinned is not None else self.shards_of(value))
+        ]
@@ -0,0 +1,140 @@
+"""Request-scoped identity map and process-wide coalescing of identical reads
+
+.. codeauthor:: John Lane <john.lane93@gmail.com>
+
+"""
+
+import copy
+import threading
+from typing import Callable
+from flask import g, has_app_context
+
+MISSING = object()
+
+
+def freeze_key(key: dict) -> tuple:
+    """Convert an item key into a hashable equivalent
+
+    :param dict key: Item key
+    :return: Hashable key
+    :rtype: tuple
+    """
+
+    return tuple(sorted(key.items()))
+
+
+class IdentityMap:
+    """Items already read during the current request, keyed by table and item key
+    """
+
+    def __init__(self):
+        """Initialize identity map
+        """
+
+        self._items = {}
+
+    def get(self, table: str, key: dict):
+        """Return a copy of a known item
+
+        :param str table: Table name
+        :param dict key: Item key
+        :return: Item, None if the item is known not to exist or MISSING if it was never read
+        """
+
+        item = self._items.get((table, freeze_key(key)), MISSING)
+        return item if item is MISSING else copy.deepcopy(item)
+
+    def put(self, table: str, key: dict, item: dict):
+        """Remember an item, or that it does not exist
+
+        :param str table: Table name
+        :param dict key: Item key
+        :param dict item: Item or None
+        """
+
+        self._items[(table, freeze_key(key))] = copy.deepcopy(item)
+
+    def invalidate(self, table: str, key: dict):
+        """Forget an item
+
+        :param str table: Table name
+        :param dict key: Item key
+        """
+
+        self._items.pop((table, freeze_key(key)), None)
+
+
+def identity_map() -> IdentityMap:
+    """Return the identity map of the current request
+
+    :return: Identity map or None, outside of an application context
+    :rtype: IdentityMap
+    """
+
+    if not has_app_context():
+        return None
+
+    if '_dynamodb_identity_map' not in g:
+        g._dynamodb_identity_map = IdentityMap()  # pylint: disable=protected-access
+
+    return g._dynamodb_identity_map  # pylint: disable=protected-access
+
+
+class _Call:
+    """Call in flight
+    """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Coalesces concurrent calls sharing a key, only the first caller performs the call
+    """
+
+    def __init__(self):
+        """Initialize single flight
+        """
+
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, function: Callable):
+        """Perform a call, or wait for an identical call already in flight and share its result
+
+        :param key: Hashable call key
+        :param Callable function: Call to perform
+        :return: Call result, callers waiting on another call receive a copy
+        """
+
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+
+            if call.error is not None:
+                raise call.error
+
+            return copy.deepcopy(call.result)
+
+        try:
+            call.result = function()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+        return call.result
+
+
+single_flight = SingleFlight()
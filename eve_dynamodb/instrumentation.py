@@ -0,0 +1,535 @@
+"""Per-call instrumentation of DynamoDB operations
+
+Every instrumented call records its operation type, latency, pages read, items scanned and returned, response bytes
+and consumed capacity, and hands the record to pluggable sinks. Sinks defining ``hot_key`` are also told about the
+partition keys turning hot.
+
+.. codeauthor:: John Lane <john.lane93@gmail.com>
+
+"""
+
+from contextlib import contextmanager
+import logging
+import socket
+import threading
+import time
+from typing import Callable, Iterator
+from flask import g, has_app_context
+import simplejson as json
+
+READ_OPERATIONS = {'scan': 'Scan', 'query': 'Query', 'get_item': 'GetItem'}
+WRITE_OPERATIONS = {'put_item': 'PutItem', 'update_item': 'UpdateItem', 'delete_item': 'DeleteItem'}
+
+
+class OperationStats:
+    """Cost of a single DynamoDB call
+    """
+
+    __slots__ = ('table', 'operation', 'latency', 'pages', 'scanned', 'returned', 'bytes', 'capacity', 'indexes')
+
+    def __init__(self, table: str, operation: str, latency: float = 0.0, pages: int = 1, scanned: int = 0,
+                 returned: int = 0, size: int = 0, capacity: float = 0.0, indexes: dict = None):
+        """Initialize operation stats
+
+        :param str table: Table name
+        :param str operation: Operation type, e.g. Scan, Query, GetItem or BatchGetItem
+        :param float latency: Latency in seconds
+        :param int pages: Pages read
+        :param int scanned: Items evaluated by DynamoDB
+        :param int returned: Items returned
+        :param int size: Approximate response size in bytes
+        :param float capacity: Consumed capacity units
+        :param dict indexes: Consumed capacity units per index
+        """
+
+        self.table = table
+        self.operation = operation
+        self.latency = latency
+        self.pages = pages
+        self.scanned = scanned
+        self.returned = returned
+        self.bytes = size
+        self.capacity = capacity
+        self.indexes = indexes or {}
+
+    def as_dict(self) -> dict:
+        """Return the stats as a dictionary
+
+        :return: Stats
+        :rtype: dict
+        """
+
+        return {field: getattr(self, field) for field in self.__slots__}
+
+
+def consumed_capacity(response: dict) -> tuple:
+    """Extract consumed capacity from a response requested with ``ReturnConsumedCapacity='INDEXES'``
+
+    :param dict response: DynamoDB response
+    :return: Total capacity units and capacity units per index
+    :rtype: tuple
+    """
+
+    consumed = response.get('ConsumedCapacity') or []
+    consumed = consumed if isinstance(consumed, list) else [consumed]
+    total, indexes = 0.0, {}
+
+    for entry in consumed:
+        total += float(entry.get('CapacityUnits', 0))
+
+        for kind in ('GlobalSecondaryIndexes', 'LocalSecondaryIndexes'):
+            for index, units in (entry.get(kind) or {}).items():
+                indexes[index] = indexes.get(index, 0.0) + float(units.get('CapacityUnits', 0))
+
+    return total, indexes
+
+
+def response_size(value) -> int:
+    """Approximate the size of a response payload
+
+    :param value: Response payload
+    :return: Size in bytes
+    :rtype: int
+    """
+
+    return len(json.dumps(value, default=str))
+
+
+class LoggingSink:
+    """Logs every operation
+    """
+
+    def __init__(self, logger: logging.Logger = None, level: int = logging.DEBUG):
+        """Initialize logging sink
+
+        :param logging.Logger logger: Logger, defaults to the ``eve_dynamodb`` logger
+        :param int level: Log level
+        """
+
+        self.logger = logger or logging.getLogger('eve_dynamodb')
+        self.level = level
+
+    def __call__(self, stats: OperationStats):
+        self.logger.log(
+            self.level, "%s %s latency=%.1fms pages=%d scanned=%d returned=%d bytes=%d capacity=%.1f",
+            stats.operation, stats.table, stats.latency * 1000, stats.pages, stats.scanned, stats.returned,
+            stats.bytes, stats.capacity
+        )
+
+    def hot_key(self, table: str, index: str, key, count: int, share: float):
+        """Log a partition key turning hot
+
+        :param str table: Table name
+        :param str index: Index name, None for the table itself
+        :param key: Partition key value
+        :param int count: Estimated recent accesses
+        :param float share: Share of the recent accesses of the table
+        """
+
+        self.logger.log(
+            max(self.level, logging.WARNING), "Hot partition key %s%s %r count=%d share=%.1f%%",
+            table, f".{index}" if index else '', key, count, share * 100
+        )
+
+
+class StatsdSink:
+    """Sends every operation to a StatsD daemon over UDP
+    """
+
+    def __init__(self, host: str = 'localhost', port: int = 8125, prefix: str = 'eve_dynamodb'):
+        """Initialize StatsD sink
+
+        :param str host: StatsD host
+        :param int port: StatsD port
+        :param str prefix: Metric prefix
+        """
+
+        self.address = (host, port)
+        self.prefix = prefix
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def metrics(self, stats: OperationStats) -> list:
+        """Format stats as StatsD metrics
+
+        :param OperationStats stats: Operation stats
+        :return: StatsD lines
+        :rtype: list
+        """
+
+        name = f"{self.prefix}.{stats.table}.{stats.operation}"
+
+        return [
+            f"{name}.latency:{stats.latency * 1000:.3f}|ms",
+            f"{name}.calls:1|c",
+            f"{name}.pages:{stats.pages}|c",
+            f"{name}.scanned:{stats.scanned}|c",
+            f"{name}.returned:{stats.returned}|c",
+            f"{name}.bytes:{stats.bytes}|c",
+            f"{name}.capacity:{stats.capacity:g}|c"
+        ]
+
+    def __call__(self, stats: OperationStats):
+        self._send(self.metrics(stats))
+
+    def hot_key(self, table: str, index: str, _key, _count: int, _share: float):
+        """Count a partition key turning hot, leaving the key itself out of the metric name
+
+        :param str table: Table name
+        :param str index: Index name, None for the table itself
+        :param _key: Partition key value
+        :param int _count: Estimated recent accesses
+        :param float _share: Share of the recent accesses of the table
+        """
+
+        self._send([f"{self.prefix}.{table}{f'.{index}' if index else ''}.hot_keys:1|c"])
+
+    def _send(self, metrics: list):
+        """Send metrics, ignoring network errors
+
+        :param list metrics: StatsD lines
+        """
+
+        try:
+            self.socket.sendto('\n'.join(metrics).encode('utf-8'), self.address)
+        except OSError:
+            pass
+
+
+class MemorySink:
+    """Aggregates operations in memory, per table and operation type
+    """
+
+    fields = ('latency', 'pages', 'scanned', 'returned', 'bytes', 'capacity')
+
+    def __init__(self):
+        """Initialize memory sink
+        """
+
+        self._lock = threading.Lock()
+        self._totals = {}
+        self._hot_keys = {}
+
+    def __call__(self, stats: OperationStats):
+
+        with self._lock:
+            totals = self._totals.setdefault((stats.table, stats.operation), dict.fromkeys(('calls',) + self.fields, 0))
+            totals['calls'] += 1
+
+            for field in self.fields:
+                totals[field] += getattr(stats, field)
+
+    def hot_key(self, table: str, index: str, key, count: int, share: float):
+        """Record a partition key turning hot
+
+        :param str table: Table name
+        :param str index: Index name, None for the table itself
+        :param key: Partition key value
+        :param int count: Estimated recent accesses
+        :param float share: Share of the recent accesses of the table
+        """
+
+        with self._lock:
+            self._hot_keys[(table, index, key)] = {'count': count, 'share': share}
+
+    def hot_keys(self) -> dict:
+        """Return the partition keys reported hot
+
+        :return: Estimated accesses and share keyed by table, index and key
+        :rtype: dict
+        """
+
+        with self._lock:
+            return {key: dict(report) for key, report in self._hot_keys.items()}
+
+    def snapshot(self) -> dict:
+        """Return the aggregated totals
+
+        :return: Totals keyed by table and operation type
+        :rtype: dict
+        """
+
+        with self._lock:
+            return {key: dict(totals) for key, totals in self._totals.items()}
+
+    def total(self) -> dict:
+        """Return totals across every table and operation type
+
+        :return: Totals
+        :rtype: dict
+        """
+
+        total = dict.fromkeys(('calls',) + self.fields, 0)
+
+        for totals in self.snapshot().values():
+            for field, value in totals.items():
+                total[field] += value
+
+        return total
+
+    def reset(self):
+        """Forget every aggregated operation
+        """
+
+        with self._lock:
+            self._totals.clear()
+            self._hot_keys.clear()
+
+
+def request_sink() -> MemorySink:
+    """Return the sink aggregating the operations of the current request
+
+    :return: Request sink or None, outside of an application context
+    :rtype: MemorySink
+    """
+
+    if not has_app_context():
+        return None
+
+    if '_dynamodb_request_sink' not in g:
+        g._dynamodb_request_sink = MemorySink()  # pylint: disable=protected-access
+
+    return g._dynamodb_request_sink  # pylint: disable=protected-access
+
+
+class Instrumentation:
+    """Dispatches operation stats to sinks
+    """
+
+    def __init__(self, sinks: list = None, per_request: bool = False):
+        """Initialize instrumentation
+
+        :param list sinks: Callables receiving OperationStats
+        :param bool per_request: Also aggregate the operations of each request on ``flask.g``
+        """
+
+        self.sinks = list(sinks or [])
+        self.per_request = per_request
+        self._local = threading.local()
+
+    @property
+    def enabled(self) -> bool:
+        """Whether any operation is being recorded
+
+        :return: True, if enabled. False otherwise
+        :rtype: bool
+        """
+
+        return bool(self.sinks) or self.per_request or bool(self.captures())
+
+    def captures(self) -> list:
+        """Return the sinks capturing the operations of the current thread
+
+        :return: Capturing sinks
+        :rtype: list
+        """
+
+        return list(getattr(self._local, 'captures', ()))
+
+    @contextmanager
+    def capture(self, *sinks) -> Iterator:
+        """Also hand the operations performed by the current thread within the block to extra sinks
+
+        :param sinks: Callables receiving OperationStats
+        :return: Context manager
+        :rtype: Iterator
+        """
+
+        previous = self.captures()
+        self._local.captures = previous + list(sinks)
+
+        try:
+            yield
+        finally:
+            self._local.captures = previous
+
+    def bind(self, function: Callable) -> Callable:
+        """Bind a function to the sinks capturing the current thread and to the sink of the current request
+
+        Calls the bound function makes from another thread are recorded as if made from the current one.
+
+        :param Callable function: Function
+        :return: Bound function
+        :rtype: Callable
+        """
+
+        captures = self.captures() + ([request_sink()] if self.per_request and request_sink() is not None else [])
+
+        def bound(*args, **kwargs):
+            with self.capture(*captures):
+                return function(*args, **kwargs)
+
+        return bound
+
+    def record(self, stats: OperationStats):
+        """Hand operation stats to every sink
+
+        :param OperationStats stats: Operation stats
+        """
+
+        for sink in self.sinks + self.captures():
+            sink(stats)
+
+        if self.per_request:
+            sink = request_sink()
+
+            if sink is not None:
+                sink(stats)
+
+    def hot_key(self, table: str, index: str, key, count: int, share: float):
+        """Tell the sinks defining ``hot_key`` about a partition key turning hot
+
+        :param str table: Table name
+        :param str index: Index name, None for the table itself
+        :param key: Partition key value
+        :param int count: Estimated recent accesses
+        :param float share: Share of the recent accesses of the table
+        """
+
+        for sink in self.sinks + self.captures():
+            if hasattr(sink, 'hot_key'):
+                sink.hot_key(table, index, key, count, share)
+
+    def call(self, table: str, operation: str, function: Callable, **kwargs) -> dict:
+        """Perform a call requesting its consumed capacity and record its cost
+
+        :param str table: Table name
+        :param str operation: Operation type
+        :param Callable function: Call to perform
+        :param dict kwargs: Call arguments
+        :return: Call response
+        :rtype: dict
+        """
+
+        if not self.enabled:
+            return function(**kwargs)
+
+        started = time.perf_counter()
+        response = function(ReturnConsumedCapacity='INDEXES', **kwargs)
+        latency = time.perf_counter() - started
+
+        if 'Responses' in response:
+            items = [item for items in response['Responses'].values() for item in items]
+        else:
+            items = response.get('Items', [response['Item']] if 'Item' in response else [])
+
+        capacity, indexes = consumed_capacity(response)
+
+        self.record(OperationStats(
+            table, operation, latency=latency, scanned=response.get('ScannedCount', len(items)),
+            returned=response.get('Count', len(items)), size=response_size(items), capacity=capacity,
+            indexes=indexes
+        ))
+
+        return response
+
+
+class InstrumentedTable:
+    """Table proxy recording the cost of every call
+    """
+
+    def __init__(self, table, instrumentation: Instrumentation, batch_write: Callable = None):
+        """Initialize instrumented table
+
+        :param table: DynamoDB table resource
+        :param Instrumentation instrumentation: Instrumentation
+        :param Callable batch_write: Sends BatchWriteItem request items requesting their consumed capacity, retrying
+        unprocessed items, and yields every response. Without it, batches go through the table's own batch writer and
+        their capacity is not recorded
+        """
+
+        self._table = table
+        self._instrumentation = instrumentation
+        self._batch_write = batch_write
+
+    def __getattr__(self, name: str):
+
+        operation = READ_OPERATIONS.get(name) or WRITE_OPERATIONS.get(name)
+        attribute = getattr(self._table, name)
+
+        if operation is None:
+            return attribute
+
+        return lambda **kwargs: self._instrumentation.call(self._table.name, operation, attribute, **kwargs)
+
+    def batch_writer(self, **kwargs):
+        """Return a batch writer recording the items it writes
+
+        :param dict kwargs: Batch writer arguments
+        :return: Batch writer
+        """
+
+        return _InstrumentedBatchWriter(self._table, self._instrumentation, self._batch_write, **kwargs)
+
+
+class _InstrumentedBatchWriter:
+    """Batch writer recording a single BatchWriteItem operation covering everything written
+
+    Sends batches of 25 requests itself through ``batch_write``, when given, so their consumed capacity is recorded.
+    """
+
+    def __init__(self, table, instrumentation: Instrumentation, batch_write: Callable = None, **kwargs):
+        self._table = table
+        self._instrumentation = instrumentation
+        self._batch_write = batch_write
+        self._writer = None if batch_write else table.batch_writer(**kwargs)
+        self._requests = []
+        self._items = 0
+        self._pages = 0
+        self._capacity = 0.0
+        self._started = None
+
+    def put_item(self, Item: dict, **kwargs):  # pylint: disable=invalid-name
+        self._items += 1
+
+        if self._writer:
+            return self._writer.put_item(Item=Item, **kwargs)
+
+        self._requests.append({'PutRequest': {'Item': Item}})
+        return self._flush(25)
+
+    def delete_item(self, Key: dict, **kwargs):  # pylint: disable=invalid-name
+        self._items += 1
+
+        if self._writer:
+            return self._writer.delete_item(Key=Key, **kwargs)
+
+        self._requests.append({'DeleteRequest': {'Key': Key}})
+        return self._flush(25)
+
+    def _flush(self, size: int):
+        """Send the buffered requests, 25 at a time, while at least ``size`` are buffered
+
+        :param int size: Buffered requests which trigger a batch
+        """
+
+        while self._requests and len(self._requests) >= size:
+            batch, self._requests = self._requests[:25], self._requests[25:]
+
+            for response in self._batch_write({self._table.name: batch}):
+                self._pages += 1
+                self._capacity += consumed_capacity(response)[0]
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+
+        if self._writer:
+            self._writer.__enter__()
+
+        return self
+
+    def __exit__(self, *args):
+        if self._writer:
+            result = self._writer.__exit__(*args)
+            pages = (self._items + 24) // 25
+        else:
+            result = self._flush(1) if args[0] is None else None
+            pages = self._pages
+
+        latency = time.perf_counter() - self._started
+
+        self._instrumentation.record(OperationStats(
+            self._table.name, 'BatchWriteItem', latency=latency, pages=pages, returned=self._items,
+            capacity=self._capacity
+        ))
+
+        return result
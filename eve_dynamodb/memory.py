@@ -0,0 +1,1292 @@
+"""In-process DynamoDB engine
+
+A driver exposing the subset of the boto3 DynamoDB service resource the data layer uses, backed by in-memory tables.
+Items are stored in hash partitions kept sorted by range key, global and local secondary indexes (sparse, with
+``ALL``, ``KEYS_ONLY`` or ``INCLUDE`` projections) are maintained on write, and reads follow DynamoDB semantics:
+Scan with parallel segments, Query on tables and indexes, 1 MB pages, ``Limit`` applying to evaluated items,
+BatchGetItem, BatchWriteItem and conditional writes. Consumed capacity is computed from item sizes and can be
+enforced, and every call can be delayed to simulate network latency.
+
+Select it with ``DYNAMODB_DRIVER = 'memory'``.
+
+.. codeauthor:: John Lane <john.lane93@gmail.com>
+
+"""
+
+import bisect
+import copy
+import hashlib
+import math
+import random
+import re
+import threading
+import time
+from decimal import Decimal
+from boto3.dynamodb.conditions import AttributeBase, ConditionBase, Size
+from boto3.dynamodb.types import Binary, TypeDeserializer, TypeSerializer
+from botocore.exceptions import ClientError
+
+from eve_dynamodb.aggregation import attribute_type
+
+PAGE_SIZE = 1024 * 1024
+TOKEN_SPACE = 2 ** 64
+MISSING = object()
+NO_RANGE = ()
+
+_serializer = TypeSerializer()
+_deserializer = TypeDeserializer()
+
+
+def _error(code: str, message: str, operation: str) -> ClientError:
+    """Build the error botocore raises for a failed call
+
+    :param str code: Error code
+    :param str message: Error message
+    :param str operation: Operation name
+    :return: Client error
+    :rtype: ClientError
+    """
+
+    return ClientError({'Error': {'Code': code, 'Message': message}}, operation)
+
+
+def normalise(item: dict) -> dict:
+    """Round trip an item through the boto3 serializers, as DynamoDB would store it
+
+    Numbers come back as decimals and unsupported types, like floats, are rejected the same way boto3 rejects them.
+
+    :param dict item: Item
+    :return: Stored item
+    :rtype: dict
+    """
+
+    return {name: _deserializer.deserialize(_serializer.serialize(value)) for name, value in item.items()}
+
+
+def item_size(value) -> int:
+    """Approximate the size DynamoDB accounts for a value
+
+    :param value: Item or attribute value
+    :return: Size in bytes
+    :rtype: int
+    """
+
+    if isinstance(value, dict):
+        return 3 + sum(len(name.encode('utf-8')) + item_size(val) for name, val in value.items())
+
+    if isinstance(value, (list, set, frozenset, tuple)):
+        return 3 + sum(item_size(val) for val in value)
+
+    if isinstance(value, str):
+        return len(value.encode('utf-8'))
+
+    if isinstance(value, Binary):
+        return len(value.value)
+
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+
+    if isinstance(value, Decimal):
+        return len(str(value)) // 2 + 1
+
+    return 1
+
+
+def _sortable(value):
+    """Return a value usable as a sort key
+
+    :param value: Key attribute value
+    :return: Comparable value
+    """
+
+    return value.value if isinstance(value, Binary) else value
+
+
+def _token(value) -> int:
+    """Hash a partition key value onto the token space, which orders scans and splits segments
+
+    :param value: Partition key value
+    :return: Token
+    :rtype: int
+    """
+
+    return int.from_bytes(hashlib.md5(repr(_sortable(value)).encode('utf-8')).digest()[:8], 'big')
+
+
+def _parse_path(path: str, names: dict) -> list:
+    """Parse a document path into map keys and list indexes
+
+    :param str path: Document path, e.g. ``#a.b[0]``
+    :param dict names: Expression attribute names
+    :return: Path elements
+    :rtype: list
+    """
+
+    elements = []
+
+    for segment in path.strip().split('.'):
+        match = re.match(r'^([^\[\]]+)((?:\[\d+\])*)$', segment.strip())
+
+        if not match:
+            raise ValueError(f"Invalid document path: {path}")
+
+        name = match.group(1)
+        elements.append(names[name] if name.startswith('#') else name)
+        elements.extend(int(index) for index in re.findall(r'\[(\d+)\]', match.group(2)))
+
+    return elements
+
+
+def _resolve(item: dict, elements: list):
+    """Resolve parsed path elements against an item
+
+    :param dict item: Item
+    :param list elements: Path elements
+    :return: Value or MISSING
+    """
+
+    value = item
+
+    for element in elements:
+        if isinstance(element, int):
+            if not isinstance(value, list) or element >= len(value):
+                return MISSING
+        elif not isinstance(value, dict) or element not in value:
+            return MISSING
+
+        value = value[element]
+
+    return value
+
+
+def _assign(item: dict, elements: list, value):
+    """Assign a value at parsed path elements
+
+    :param dict item: Item
+    :param list elements: Path elements
+    :param value: Value
+    """
+
+    target = _resolve(item, elements[:-1])
+
+    if target is MISSING or isinstance(target, (str, bytes)):
+        raise ValueError("The document path provided in the update expression is invalid for update")
+
+    if isinstance(elements[-1], int) and elements[-1] >= len(target):
+        target.append(value)
+    else:
+        target[elements[-1]] = value
+
+
+def _discard(item: dict, elements: list):
+    """Remove the value at parsed path elements
+
+    :param dict item: Item
+    :param list elements: Path elements
+    """
+
+    target = _resolve(item, elements[:-1])
+
+    if isinstance(target, dict):
+        target.pop(elements[-1], None)
+    elif isinstance(target, list) and elements[-1] < len(target):
+        del target[elements[-1]]
+
+
+def project(item: dict, expression: str, names: dict = None) -> dict:
+    """Apply a projection expression to an item
+
+    :param dict item: Item
+    :param str expression: Projection expression
+    :param dict names: Expression attribute names
+    :return: Projected item
+    :rtype: dict
+    """
+
+    projected = {}
+
+    for path in expression.split(','):
+        elements = _parse_path(path, names or {})
+        value = _resolve(item, elements)
+
+        if value is MISSING:
+            continue
+
+        target = projected
+
+        for element in elements[:-1]:
+            target = target.setdefault(element, {})
+
+        target[elements[-1]] = value
+
+    return projected
+
+
+def _operand(item: dict, operand):
+    """Resolve a condition operand
+
+    :param dict item: Item
+    :param operand: Attribute, size of an attribute or literal value
+    :return: Value or MISSING
+    """
+
+    if isinstance(operand, Size):
+        value = _operand(item, operand.get_expression()['values'][0])
+        return MISSING if value is MISSING or isinstance(value, (bool, Decimal)) or value is None else Decimal(
+            len(value.value if isinstance(value, Binary) else value))
+
+    if isinstance(operand, AttributeBase):
+        return _resolve(item, operand.name.split('.'))
+
+    return operand
+
+
+def _comparable(left, right) -> bool:
+    """Whether two values share a DynamoDB type and may be compared
+
+    :param left: Left value
+    :param right: Right value
+    :return: True, if comparable. False otherwise
+    :rtype: bool
+    """
+
+    return left is not MISSING and right is not MISSING and attribute_type(left) == attribute_type(right)
+
+
+def evaluate(condition: ConditionBase, item: dict) -> bool:
+    """Evaluate a boto3 condition against an item
+
+    :param ConditionBase condition: Condition built with ``Attr`` or ``Key``
+    :param dict item: Item
+    :return: True, if the item satisfies the condition. False otherwise
+    :rtype: bool
+    """
+
+    expression = condition.get_expression()
+    operator, values = expression['operator'], expression['values']
+
+    if operator == 'AND':
+        return evaluate(values[0], item) and evaluate(values[1], item)
+
+    if operator == 'OR':
+        return evaluate(values[0], item) or evaluate(values[1], item)
+
+    if operator == 'NOT':
+        return not evaluate(values[0], item)
+
+    left = _operand(item, values[0])
+
+    if operator == 'attribute_exists':
+        return left is not MISSING
+
+    if operator == 'attribute_not_exists':
+        return left is MISSING
+
+    if operator == '<>':
+        right = _operand(item, values[1])
+        return left is MISSING or not _comparable(left, right) or left != right
+
+    if left is MISSING:
+        return False
+
+    if operator == 'IN':
+        return any(_comparable(left, value) and left == value for value in values[1])
+
+    if operator == 'BETWEEN':
+        low, high = _operand(item, values[1]), _operand(item, values[2])
+        return _comparable(left, low) and _comparable(left, high) and _sortable(low) <= _sortable(
+            left) <= _sortable(high)
+
+    right = _operand(item, values[1])
+
+    if operator == 'attribute_type':
+        return attribute_type(left) == right
+
+    if operator == 'begins_with':
+        return _comparable(left, right) and isinstance(_sortable(left), (str, bytes)) and _sortable(
+            left).startswith(_sortable(right))
+
+    if operator == 'contains':
+        if isinstance(left, str):
+            return isinstance(right, str) and right in left
+        if isinstance(left, (set, list)):
+            return right in left
+        return False
+
+    if not _comparable(left, right):
+        return False
+
+    left, right = _sortable(left), _sortable(right)
+
+    return {
+        '=': lambda: left == right,
+        '<': lambda: left < right,
+        '<=': lambda: left <= right,
+        '>': lambda: left > right,
+        '>=': lambda: left >= right
+    }[operator]()
+
+
+def _split(expression: str) -> list:
+    """Split an expression on top level commas
+
+    :param str expression: Expression
+    :return: Parts
+    :rtype: list
+    """
+
+    parts, depth, current = [], 0, ''
+
+    for character in expression:
+        if character == ',' and depth == 0:
+            parts.append(current.strip())
+            current = ''
+            continue
+
+        depth += {'(': 1, ')': -1}.get(character, 0)
+        current += character
+
+    return parts + [current.strip()] if current.strip() else parts
+
+
+def _value(item: dict, operand: str, names: dict, values: dict):
+    """Evaluate an update expression operand
+
+    :param dict item: Item being updated
+    :param str operand: Operand, a value placeholder, path, function or arithmetic
+    :param dict names: Expression attribute names
+    :param dict values: Expression attribute values
+    :return: Value
+    """
+
+    operand = operand.strip()
+    function = re.match(r'^(if_not_exists|list_append)\s*\((.*)\)$', operand)
+
+    if function:
+        first, second = _split(function.group(2))
+
+        if function.group(1) == 'if_not_exists':
+            existing = _resolve(item, _parse_path(first, names))
+            return _value(item, second, names, values) if existing is MISSING else existing
+
+        return list(_value(item, first, names, values)) + list(_value(item, second, names, values))
+
+    arithmetic = re.match(r'^(.+?)\s*([+-])\s*(.+)$', operand)
+
+    if arithmetic:
+        left = _value(item, arithmetic.group(1), names, values)
+        right = _value(item, arithmetic.group(3), names, values)
+        return left + right if arithmetic.group(2) == '+' else left - right
+
+    if operand.startswith(':'):
+        return values[operand]
+
+    value = _resolve(item, _parse_path(operand, names))
+
+    if value is MISSING:
+        raise ValueError("The provided expression refers to an attribute that does not exist in the item")
+
+    return value
+
+
+def apply_update(item: dict, expression: str, names: dict = None, values: dict = None) -> dict:
+    """Apply an update expression to a copy of an item
+
+    Supports ``SET`` (with ``+``, ``-``, ``if_not_exists`` and ``list_append``), ``REMOVE``, ``ADD`` and ``DELETE``.
+
+    :param dict item: Item
+    :param str expression: Update expression
+    :param dict names: Expression attribute names
+    :param dict values: Expression attribute values
+    :return: Updated item
+    :rtype: dict
+    """
+
+    names, values, updated = names or {}, values or {}, copy.deepcopy(item)
+    clauses = re.split(r'\b(SET|REMOVE|ADD|DELETE)\b', expression, flags=re.IGNORECASE)
+
+    for action, body in zip(clauses[1::2], clauses[2::2]):
+        action = action.upper()
+
+        for part in _split(body):
+            if action == 'SET':
+                path, operand = part.split('=', 1)
+                _assign(updated, _parse_path(path, names), _value(item, operand, names, values))
+
+            elif action == 'REMOVE':
+                _discard(updated, _parse_path(part, names))
+
+            else:
+                path, placeholder = part.split()
+                elements = _parse_path(path, names)
+                existing, value = _resolve(updated, elements), values[placeholder]
+
+                if action == 'ADD' and existing is MISSING:
+                    _assign(updated, elements, value)
+                elif action == 'ADD':
+                    _assign(updated, elements, existing | value if isinstance(existing, set) else existing + value)
+                elif existing is not MISSING:
+                    _assign(updated, elements, existing - value)
+
+    return updated
+
+
+class _Index:
+    """Items of a table or index, hash partitioned and sorted by range key within each partition
+    """
+
+    def __init__(self, name: str, key_schema: list, table_keys: tuple, projection: dict = None):
+        """Initialize index
+
+        :param str name: Index name, None for the table itself
+        :param list key_schema: Key schema
+        :param tuple table_keys: Table key attribute names, break ties between equal index keys
+        :param dict projection: Index projection
+        """
+
+        self.name = name
+        self.hash_key = next(key['AttributeName'] for key in key_schema if key['KeyType'] == 'HASH')
+        self.range_key = next((key['AttributeName'] for key in key_schema if key['KeyType'] == 'RANGE'), None)
+        self.table_keys = tuple(key for key in table_keys if key not in (self.hash_key, self.range_key))
+        self.projection = projection or {'ProjectionType': 'ALL'}
+        self.partitions = {}
+        self.order = []
+
+    @property
+    def key_names(self) -> tuple:
+        """Attributes forming the key of an entry
+
+        :return: Key attribute names
+        :rtype: tuple
+        """
+
+        return (self.hash_key,) + ((self.range_key,) if self.range_key else ()) + self.table_keys
+
+    def position(self, item: dict):
+        """Compute where an item lives within the index
+
+        :param dict item: Item or key
+        :return: Partition key value and sort tuple, or None if the item is not indexed
+        """
+
+        if self.hash_key not in item or (self.range_key and self.range_key not in item):
+            return None
+
+        sort = (_sortable(item[self.range_key]) if self.range_key else NO_RANGE,)
+        return item[self.hash_key], sort + tuple(_sortable(item.get(key)) for key in self.table_keys)
+
+    def partition(self, value, create: bool = False):
+        """Return a partition
+
+        :param value: Partition key value
+        :param bool create: Create the partition if it does not exist
+        :return: Partition, made of parallel lists of range values, sort tuples and items
+        """
+
+        value = _sortable(value)
+
+        if value not in self.partitions and create:
+            self.partitions[value] = ([], [], [])
+            bisect.insort(self.order, (_token(value), repr(value), value))
+
+        return self.partitions.get(value)
+
+    def add(self, item: dict):
+        """Index an item
+
+        :param dict item: Item
+        """
+
+        position = self.position(item)
+
+        if position is None:
+            return
+
+        ranges, sorts, items = self.partition(position[0], create=True)
+        index = bisect.bisect_left(sorts, position[1])
+
+        ranges.insert(index, position[1][0])
+        sorts.insert(index, position[1])
+        items.insert(index, item)
+
+    def remove(self, item: dict):
+        """Remove an item from the index
+
+        :param dict item: Item
+        """
+
+        position = self.position(item)
+        partition = self.partition(position[0]) if position else None
+
+        if partition is None:
+            return
+
+        ranges, sorts, items = partition
+        index = bisect.bisect_left(sorts, position[1])
+
+        if index < len(sorts) and sorts[index] == position[1]:
+            del ranges[index], sorts[index], items[index]
+
+        if not sorts:
+            value = _sortable(position[0])
+            del self.partitions[value]
+            self.order.remove((_token(value), repr(value), value))
+
+    def key(self, item: dict) -> dict:
+        """Return the key DynamoDB reports as LastEvaluatedKey for an entry
+
+        :param dict item: Item
+        :return: Key
+        :rtype: dict
+        """
+
+        return {name: item[name] for name in self.key_names if name in item}
+
+    def projected(self, item: dict, table_keys: tuple) -> dict:
+        """Apply the index projection to an item
+
+        :param dict item: Item
+        :param tuple table_keys: Table key attribute names
+        :return: Projected item
+        :rtype: dict
+        """
+
+        kind = self.projection.get('ProjectionType', 'ALL')
+
+        if self.name is None or kind == 'ALL':
+            return item
+
+        keep = set(self.key_names) | set(table_keys)
+
+        if kind == 'INCLUDE':
+            keep |= set(self.projection.get('NonKeyAttributes', []))
+
+        return {name: value for name, value in item.items() if name in keep}
+
+    def scan(self, start: dict = None, segment: int = 0, total_segments: int = 1):
+        """Iterate items in scan order
+
+        :param dict start: Exclusive start key
+        :param int segment: Segment to scan
+        :param int total_segments: Total number of segments
+        :return: Items
+        """
+
+        low, high = segment * TOKEN_SPACE // total_segments, (segment + 1) * TOKEN_SPACE // total_segments
+        begin = bisect.bisect_left(self.order, (low,))
+        position = self.position(start) if start else None
+
+        if position:
+            value = _sortable(position[0])
+            begin = bisect.bisect_left(self.order, (_token(value), repr(value)))
+
+        for token, _, value in list(self.order[begin:]):
+            if token >= high:
+                return
+
+            _, sorts, items = self.partitions[value]
+            first = bisect.bisect_right(sorts, position[1]) if position and value == _sortable(position[0]) else 0
+
+            for item in list(items[first:]):
+                yield item
+
+    def query(self, value, condition=None, forward: bool = True, start: dict = None):
+        """Iterate the items of a partition whose range key satisfies a key condition
+
+        :param value: Partition key value
+        :param condition: Range key condition
+        :param bool forward: Ascending range key order
+        :param dict start: Exclusive start key
+        :return: Items
+        """
+
+        partition = self.partition(value)
+
+        if partition is None:
+            return []
+
+        ranges, sorts, items = partition
+        low, high = 0, len(sorts)
+
+        if condition is not None:
+            expression = condition.get_expression()
+            operator, operands = expression['operator'], [_sortable(operand) for operand in expression['values'][1:]]
+
+            if operator in ('=', '>=', 'BETWEEN', 'begins_with'):
+                low = bisect.bisect_left(ranges, operands[0])
+            elif operator == '>':
+                low = bisect.bisect_right(ranges, operands[0])
+
+            if operator in ('=', '<='):
+                high = bisect.bisect_right(ranges, operands[0])
+            elif operator == '<':
+                high = bisect.bisect_left(ranges, operands[0])
+            elif operator == 'BETWEEN':
+                high = bisect.bisect_right(ranges, operands[1])
+            elif operator == 'begins_with':
+                high = low
+
+                while high < len(ranges) and ranges[high][:len(operands[0])] == operands[0]:
+                    high += 1
+
+        position = self.position(start) if start else None
+
+        if position and forward:
+            low = max(low, bisect.bisect_right(sorts, position[1]))
+        elif position:
+            high = min(high, bisect.bisect_left(sorts, position[1]))
+
+        return items[low:high] if forward else items[low:high][::-1]
+
+
+class _Throttle:
+    """Token bucket enforcing a capacity in units per second
+    """
+
+    def __init__(self, units_per_second: float):
+        self.rate = units_per_second
+        self.tokens = units_per_second
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def consume(self, units: float, operation: str):
+        """Consume capacity, failing like DynamoDB when the bucket is empty
+
+        :param float units: Capacity units
+        :param str operation: Operation name
+        :raises: ClientError
+        """
+
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+            if self.tokens <= 0:
+                raise _error(
+                    'ProvisionedThroughputExceededException',
+                    'The level of configured provisioned throughput for the table was exceeded.', operation
+                )
+
+            self.tokens -= units
+
+
+class MemoryTable:  # pylint: disable=invalid-name
+    """In-memory table with the interface of a boto3 Table resource, arguments keep their boto3 names
+    """
+
+    def __init__(self, driver: 'MemoryDriver', TableName: str, KeySchema: list,
+                 AttributeDefinitions: list = None, GlobalSecondaryIndexes: list = None,
+                 LocalSecondaryIndexes: list = None, **_kwargs):
+        """Initialize memory table, takes the same arguments as ``create_table``
+
+        :param MemoryDriver driver: Driver owning the table
+        :param str TableName: Table name
+        :param list KeySchema: Key schema
+        :param list AttributeDefinitions: Key attribute definitions
+        :param list GlobalSecondaryIndexes: Global secondary indexes
+        :param list LocalSecondaryIndexes: Local secondary indexes
+        :param dict _kwargs: Extra arguments, e.g. billing mode
+        """
+
+        self.driver = driver
+        self.name = self.table_name = TableName
+        self.key_schema = KeySchema
+        self.attribute_definitions = AttributeDefinitions or []
+        self.global_secondary_indexes = GlobalSecondaryIndexes or None
+        self.local_secondary_indexes = LocalSecondaryIndexes or None
+        self.table_status = 'ACTIVE'
+        self.lock = threading.RLock()
+        self.primary = _Index(None, KeySchema, ())
+        self.indexes = {
+            index['IndexName']: _Index(index['IndexName'], index['KeySchema'], self.primary.key_names,
+                                       index.get('Projection'))
+            for index in (GlobalSecondaryIndexes or []) + (LocalSecondaryIndexes or [])
+        }
+        self.reads = _Throttle(driver.read_capacity) if driver.read_capacity else None
+        self.writes = _Throttle(driver.write_capacity) if driver.write_capacity else None
+
+    @property
+    def item_count(self) -> int:
+        """Number of items stored
+
+        :return: Item count
+        :rtype: int
+        """
+
+        return sum(len(partition[2]) for partition in self.primary.partitions.values())
+
+    def load(self):
+        """Table description is always loaded
+        """
+
+    reload = load
+
+    def wait_until_exists(self):
+        """Tables are created synchronously
+        """
+
+    def delete(self):
+        """Delete the table
+        """
+
+        self.driver.delete_table(TableName=self.name)
+
+    def _key(self, key: dict, operation: str) -> dict:
+        """Validate a primary key
+
+        :param dict key: Primary key
+        :param str operation: Operation name
+        :return: Normalised key
+        :rtype: dict
+        :raises: ClientError
+        """
+
+        names = set(self.primary.key_names)
+
+        if set(key.keys()) != names:
+            raise _error('ValidationException', 'The provided key element does not match the schema', operation)
+
+        return normalise(key)
+
+    def _get(self, key: dict):
+        """Return the stored item with a primary key
+
+        :param dict key: Primary key
+        :return: Item or None
+        """
+
+        items = self.primary.query(key[self.primary.hash_key], start=None)
+        position = self.primary.position(key)
+
+        for item in items:
+            if self.primary.position(item) == position:
+                return item
+
+        return None
+
+    def _charge(self, operation: str, read: int = 0, write: int = 0, consistent: bool = False, index: str = None,
+                request: dict = None) -> dict:
+        """Charge capacity for bytes read or written and describe it as DynamoDB would
+
+        :param str operation: Operation name
+        :param int read: Bytes read
+        :param int write: Bytes written, per item
+        :param bool consistent: Strongly consistent read
+        :param str index: Index read
+        :param dict request: Call arguments
+        :return: Consumed capacity, when requested
+        :rtype: dict
+        """
+
+        units = 0.0
+
+        if read:
+            units = math.ceil(read / 4096) * (1.0 if consistent else 0.5)
+            if self.reads:
+                self.reads.consume(units, operation)
+
+        if write:
+            units = float(math.ceil(write / 1024))
+            if self.writes:
+                self.writes.consume(units, operation)
+
+        if not request or request.get('ReturnConsumedCapacity', 'NONE') == 'NONE':
+            return {}
+
+        consumed = {'TableName': self.name, 'CapacityUnits': units}
+
+        if request['ReturnConsumedCapacity'] == 'INDEXES':
+            if index and index in {definition['IndexName'] for definition in self.global_secondary_indexes or []}:
+                consumed['GlobalSecondaryIndexes'] = {index: {'CapacityUnits': units}}
+            elif index:
+                consumed['LocalSecondaryIndexes'] = {index: {'CapacityUnits': units}}
+            else:
+                consumed['Table'] = {'CapacityUnits': units}
+
+        return {'ConsumedCapacity': consumed}
+
+    def _write(self, old: dict, new: dict):
+        """Replace an item in the table and every index
+
+        :param dict old: Previous item or None
+        :param dict new: New item or None
+        """
+
+        for index in [self.primary] + list(self.indexes.values()):
+            if old is not None:
+                index.remove(old)
+            if new is not None:
+                index.add(new)
+
+    def _check(self, condition, item: dict, operation: str):
+        """Enforce a write condition
+
+        :param condition: Condition expression
+        :param dict item: Existing item or None
+        :param str operation: Operation name
+        :raises: ClientError
+        """
+
+        if condition is not None and not evaluate(condition, item or {}):
+            raise _error('ConditionalCheckFailedException', 'The conditional request failed', operation)
+
+    def get_item(self, Key: dict, ConsistentRead: bool = False, ProjectionExpression: str = None,
+                 ExpressionAttributeNames: dict = None, **kwargs) -> dict:
+        """Read a single item
+
+        :return: GetItem response
+        :rtype: dict
+        """
+
+        self.driver.delay()
+        key = self._key(Key, 'GetItem')
+
+        with self.lock:
+            item = self._get(key)
+
+        response = self._charge('GetItem', read=item_size(item) if item else 1, consistent=ConsistentRead,
+                                request=kwargs)
+
+        if item is not None:
+            item = copy.deepcopy(item)
+            response['Item'] = project(item, ProjectionExpression, ExpressionAttributeNames) \
+                if ProjectionExpression else item
+
+        return response
+
+    def put_item(self, Item: dict, ConditionExpression=None, ReturnValues: str = 'NONE',
+                 **kwargs) -> dict:
+        """Create or replace an item
+
+        :return: PutItem response
+        :rtype: dict
+        """
+
+        self.driver.delay()
+        item = normalise(Item)
+        key = self._key({name: item.get(name) for name in self.primary.key_names}, 'PutItem')
+
+        with self.lock:
+            old = self._get(key)
+            self._check(ConditionExpression, old, 'PutItem')
+            response = self._charge('PutItem', write=max(item_size(item), item_size(old) if old else 0),
+                                    request=kwargs)
+            self._write(old, item)
+
+        if ReturnValues == 'ALL_OLD' and old is not None:
+            response['Attributes'] = copy.deepcopy(old)
+
+        return response
+
+    def update_item(self, Key: dict, UpdateExpression: str = None, ConditionExpression=None,
+                    ExpressionAttributeNames: dict = None, ExpressionAttributeValues: dict = None,
+                    ReturnValues: str = 'NONE', **kwargs) -> dict:
+        """Update an item, creating it if it does not exist
+
+        :return: UpdateItem response
+        :rtype: dict
+        """
+
+        self.driver.delay()
+        key = self._key(Key, 'UpdateItem')
+        values = normalise(ExpressionAttributeValues or {})
+
+        with self.lock:
+            old = self._get(key)
+            self._check(ConditionExpression, old, 'UpdateItem')
+
+            try:
+                new = apply_update(old or key, UpdateExpression or '', ExpressionAttributeNames, values)
+            except (KeyError, TypeError, ValueError) as e:
+                raise _error('ValidationException', str(e), 'UpdateItem')
+
+            if any(new.get(name) != value for name, value in key.items()):
+                raise _error('ValidationException', 'Cannot update attribute, it is part of the key', 'UpdateItem')
+
+            response = self._charge('UpdateItem', write=max(item_size(new), item_size(old) if old else 0),
+                                    request=kwargs)
+            self._write(old, new)
+
+        if ReturnValues == 'ALL_NEW':
+            response['Attributes'] = copy.deepcopy(new)
+        elif ReturnValues == 'ALL_OLD' and old is not None:
+            response['Attributes'] = copy.deepcopy(old)
+
+        return response
+
+    def delete_item(self, Key: dict, ConditionExpression=None, ReturnValues: str = 'NONE',
+                    **kwargs) -> dict:
+        """Delete an item
+
+        :return: DeleteItem response
+        :rtype: dict
+        """
+
+        self.driver.delay()
+        key = self._key(Key, 'DeleteItem')
+
+        with self.lock:
+            old = self._get(key)
+            self._check(ConditionExpression, old, 'DeleteItem')
+            response = self._charge('DeleteItem', write=item_size(old) if old else 1, request=kwargs)
+            self._write(old, None)
+
+        if ReturnValues == 'ALL_OLD' and old is not None:
+            response['Attributes'] = copy.deepcopy(old)
+
+        return response
+
+    def _page(self, operation: str, items, index: _Index, request: dict) -> dict:
+        """Read a page from an item iterator, honouring Limit, the 1 MB page size, filters and projections
+
+        :param str operation: Operation name
+        :param items: Items in read order
+        :param _Index index: Table or index being read
+        :param dict request: Call arguments
+        :return: Scan or Query response
+        :rtype: dict
+        """
+
+        limit = request.get('Limit')
+        filter_ = request.get('FilterExpression')
+        projection = request.get('ProjectionExpression')
+        names = request.get('ExpressionAttributeNames')
+        select = request.get('Select')
+
+        if isinstance(filter_, str):
+            raise _error('ValidationException', 'Only condition objects are supported as FilterExpression', operation)
+
+        evaluated, size, matched, last = 0, 0, [], None
+
+        with self.lock:
+            iterator = iter(items)
+
+            for item in iterator:
+                evaluated += 1
+                size += item_size(item)
+                last = item
+
+                item = index.projected(item, self.primary.key_names)
+
+                if filter_ is None or evaluate(filter_, item):
+                    matched.append(item)
+
+                if (limit and evaluated >= limit) or size >= PAGE_SIZE:
+                    if next(iterator, MISSING) is MISSING:
+                        last = None
+                    break
+            else:
+                last = None
+
+        response = {'Count': len(matched), 'ScannedCount': evaluated}
+        response.update(self._charge(operation, read=max(size, 1), consistent=request.get('ConsistentRead', False),
+                                     index=index.name, request=request))
+
+        if select != 'COUNT':
+            matched = copy.deepcopy(matched)
+            response['Items'] = [project(item, projection, names) for item in matched] if projection else matched
+
+        if last is not None:
+            response['LastEvaluatedKey'] = copy.deepcopy(index.key(last))
+            response['LastEvaluatedKey'].update({name: last[name] for name in self.primary.key_names})
+
+        return response
+
+    def _index(self, name: str, operation: str) -> _Index:
+        """Return the table or one of its indexes
+
+        :param str name: Index name
+        :param str operation: Operation name
+        :return: Index
+        :rtype: _Index
+        :raises: ClientError
+        """
+
+        if name is None:
+            return self.primary
+
+        if name not in self.indexes:
+            raise _error('ValidationException', f"The table does not have the specified index: {name}", operation)
+
+        return self.indexes[name]
+
+    def scan(self, **kwargs) -> dict:
+        """Read a page of items in partition token order, optionally within a parallel scan segment
+
+        :return: Scan response
+        :rtype: dict
+        """
+
+        self.driver.delay()
+        index = self._index(kwargs.get('IndexName'), 'Scan')
+        start = normalise(kwargs['ExclusiveStartKey']) if kwargs.get('ExclusiveStartKey') else None
+        segment, total_segments = kwargs.get('Segment', 0), kwargs.get('TotalSegments', 1)
+
+        if not 0 <= segment < total_segments:
+            raise _error('ValidationException', 'Segment must be less than TotalSegments', 'Scan')
+
+        with self.lock:
+            return self._page('Scan', index.scan(start, segment, total_segments), index, kwargs)
+
+    def query(self, KeyConditionExpression, **kwargs) -> dict:
+        """Read a page of items from a single partition, in range key order
+
+        :param KeyConditionExpression: Key condition built with ``Key``
+        :return: Query response
+        :rtype: dict
+        """
+
+        self.driver.delay()
+        index = self._index(kwargs.get('IndexName'), 'Query')
+        start = normalise(kwargs['ExclusiveStartKey']) if kwargs.get('ExclusiveStartKey') else None
+
+        if isinstance(KeyConditionExpression, str):
+            raise _error('ValidationException', 'Only condition objects are supported as KeyConditionExpression',
+                         'Query')
+
+        conditions = [KeyConditionExpression]
+
+        while conditions[0].get_expression()['operator'] == 'AND':
+            conditions = list(conditions[0].get_expression()['values']) + conditions[1:]
+
+        value, range_condition = MISSING, None
+
+        for condition in conditions:
+            expression = condition.get_expression()
+            name = expression['values'][0].name
+
+            if name == index.hash_key and expression['operator'] == '=':
+                value = normalise({'value': expression['values'][1]})['value']
+            elif name == index.range_key:
+                range_condition = condition
+            else:
+                raise _error('ValidationException', 'Query condition missed key schema element', 'Query')
+
+        if value is MISSING:
+            raise _error('ValidationException', 'Query condition missed key schema element', 'Query')
+
+        forward = kwargs.get('ScanIndexForward', True)
+
+        with self.lock:
+            return self._page('Query', index.query(value, range_condition, forward, start), index, kwargs)
+
+    def batch_writer(self, **_kwargs) -> '_BatchWriter':
+        """Return a batch writer
+
+        :param dict _kwargs: Extra arguments
+        :return: Batch writer
+        """
+
+        return _BatchWriter(self)
+
+
+class _BatchWriter:
+    """Batch writer sending requests in batches of 25, like boto3's
+    """
+
+    def __init__(self, table: MemoryTable):
+        self.table = table
+        self.requests = []
+
+    def put_item(self, Item: dict):  # pylint: disable=invalid-name
+        self.requests.append({'PutRequest': {'Item': Item}})
+        self._flush(25)
+
+    def delete_item(self, Key: dict):  # pylint: disable=invalid-name
+        self.requests.append({'DeleteRequest': {'Key': Key}})
+        self._flush(25)
+
+    def _flush(self, size: int):
+        while len(self.requests) >= size and self.requests:
+            batch, self.requests = self.requests[:25], self.requests[25:]
+            self.table.driver.batch_write_item(RequestItems={self.table.name: batch})
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_args):
+        self._flush(1)
+
+
+class _MissingTable:
+    """Table which does not exist, every call fails like DynamoDB does
+    """
+
+    def __init__(self, name: str):
+        self.name = self.table_name = name
+
+    def __getattr__(self, name: str):
+        def missing(*_args, **_kwargs):
+            raise _error('ResourceNotFoundException', 'Requested resource not found', name)
+
+        if name in ('key_schema', 'attribute_definitions', 'global_secondary_indexes', 'local_secondary_indexes',
+                    'item_count', 'table_status'):
+            missing()
+
+        return missing
+
+
+class MemoryDriver:
+    """In-process replacement for ``boto3.resource('dynamodb')``
+    """
+
+    def __init__(self, tables: list = None, auto_create_key: str = None, latency=0.0, read_capacity: float = 0.0,
+                 write_capacity: float = 0.0, seed: int = None):
+        """Initialize memory driver
+
+        :param list tables: ``create_table`` arguments of tables to create up front
+        :param str auto_create_key: Create unknown tables on first use, keyed by this string attribute
+        :param latency: Seconds each call is delayed by, or a ``(low, high)`` range to draw from
+        :param float read_capacity: Read capacity units per second per table, 0 for unlimited
+        :param float write_capacity: Write capacity units per second per table, 0 for unlimited
+        :param int seed: Seed of the latency generator, for reproducible runs
+        """
+
+        self.tables = {}
+        self.auto_create_key = auto_create_key
+        self.latency = latency
+        self.read_capacity = read_capacity
+        self.write_capacity = write_capacity
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+        for definition in tables or []:
+            self.create_table(**definition)
+
+    def delay(self):
+        """Delay a call by the simulated latency
+        """
+
+        latency = self.random.uniform(*self.latency) if isinstance(self.latency, (list, tuple)) else self.latency
+
+        if latency:
+            time.sleep(latency)
+
+    def create_table(self, **kwargs) -> MemoryTable:
+        """Create a table
+
+        :param dict kwargs: Same arguments as boto3's ``create_table``
+        :return: Table
+        :rtype: MemoryTable
+        :raises: ClientError
+        """
+
+        with self.lock:
+            if kwargs['TableName'] in self.tables:
+                raise _error('ResourceInUseException', f"Table already exists: {kwargs['TableName']}", 'CreateTable')
+
+            table = self.tables[kwargs['TableName']] = MemoryTable(self, **kwargs)
+            return table
+
+    def delete_table(self, TableName: str):  # pylint: disable=invalid-name
+        """Delete a table
+
+        :param str TableName: Table name
+        """
+
+        with self.lock:
+            self.tables.pop(TableName, None)
+
+    def Table(self, name: str):  # pylint: disable=invalid-name
+        """Return a table
+
+        :param str name: Table name
+        :return: Table
+        """
+
+        with self.lock:
+            table = self.tables.get(name)
+
+        if table is None and self.auto_create_key:
+            try:
+                return self.create_table(
+                    TableName=name,
+                    KeySchema=[{'AttributeName': self.auto_create_key, 'KeyType': 'HASH'}],
+                    AttributeDefinitions=[{'AttributeName': self.auto_create_key, 'AttributeType': 'S'}]
+                )
+            except ClientError:
+                return self.tables[name]
+
+        return table if table is not None else _MissingTable(name)
+
+    def batch_get_item(self, RequestItems: dict, **kwargs) -> dict:  # pylint: disable=invalid-name
+        """Read up to 100 items across tables, keys beyond 16 MB of results are left unprocessed
+
+        :param dict RequestItems: Keys and projection per table
+        :return: BatchGetItem response
+        :rtype: dict
+        """
+
+        if sum(len(request['Keys']) for request in RequestItems.values()) > 100:
+            raise _error('ValidationException', 'Too many items requested for the BatchGetItem call', 'BatchGetItem')
+
+        self.delay()
+        responses, unprocessed, consumed, size = {}, {}, [], 0
+
+        for name, request in RequestItems.items():
+            table = self.Table(name)
+            found = responses.setdefault(name, [])
+            units = 0.0
+
+            for key in request['Keys']:
+                if size >= 16 * PAGE_SIZE:
+                    unprocessed.setdefault(name, dict(request, Keys=[]))['Keys'].append(key)
+                    continue
+
+                response = table.get_item(
+                    Key=key, ConsistentRead=request.get('ConsistentRead', False),
+                    ProjectionExpression=request.get('ProjectionExpression'),
+                    ExpressionAttributeNames=request.get('ExpressionAttributeNames'),
+                    ReturnConsumedCapacity='TOTAL'
+                )
+                units += response['ConsumedCapacity']['CapacityUnits']
+
+                if 'Item' in response:
+                    found.append(response['Item'])
+                    size += item_size(response['Item'])
+
+            consumed.append({'TableName': name, 'CapacityUnits': units})
+
+        response = {'Responses': responses, 'UnprocessedKeys': unprocessed}
+
+        if kwargs.get('ReturnConsumedCapacity', 'NONE') != 'NONE':
+            response['ConsumedCapacity'] = consumed
+
+        return response
+
+    def batch_write_item(self, RequestItems: dict, **kwargs) -> dict:  # pylint: disable=invalid-name
+        """Put or delete up to 25 items across tables
+
+        :param dict RequestItems: Put and delete requests per table
+        :return: BatchWriteItem response
+        :rtype: dict
+        """
+
+        if sum(len(requests) for requests in RequestItems.values()) > 25:
+            raise _error('ValidationException', 'Too many items requested for the BatchWriteItem call',
+                         'BatchWriteItem')
+
+        self.delay()
+        consumed = []
+
+        for name, requests in RequestItems.items():
+            table = self.Table(name)
+            units = 0.0
+
+            for request in requests:
+                if 'PutRequest' in request:
+                    response = table.put_item(Item=request['PutRequest']['Item'], ReturnConsumedCapacity='TOTAL')
+                else:
+                    response = table.delete_item(Key=request['DeleteRequest']['Key'], ReturnConsumedCapacity='TOTAL')
+
+                units += response['ConsumedCapacity']['CapacityUnits']
+
+            consumed.append({'TableName': name, 'CapacityUnits': units})
+
+        response = {'UnprocessedItems': {}}
+
+        if kwargs.get('ReturnConsumedCapacity', 'NONE') != 'NONE':
+            response['ConsumedCapacity'] = consumed
+
+        return response
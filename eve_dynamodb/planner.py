@@ -0,0 +1,549 @@
+"""Access path planning
+
+Chooses how a query reads a table: GetItem when it pins a whole primary key, Query on the table or a secondary index
+when it pins a partition key, or a (possibly parallel) Scan otherwise. Queries pinning a partition key to a set of
+values, through ``$in`` or an ``$or`` of key equalities, fan out to one Query per key, or to BatchGetItem when every
+key is a whole primary key. Terms the access path does not consume are left as a residual filter.
+
+.. codeauthor:: John Lane <john.lane93@gmail.com>
+
+"""
+
+from boto3.dynamodb.conditions import ConditionExpressionBuilder
+
+from eve_dynamodb.expression import build_attr_expression, build_key_expression, build_projection_expression
+
+RANGE_OPERATORS = ('$lt', '$lte', '$gt', '$gte', '$between', '$startsWith')
+
+
+class IndexSchema:
+    """Keys and projection of a table or one of its secondary indexes
+    """
+
+    def __init__(self, name: str, key_schema: list, projection: dict = None):
+        """Initialize index schema
+
+        :param str name: Index name, None for the table itself
+        :param list key_schema: Key schema
+        :param dict projection: Index projection
+        """
+
+        self.name = name
+        self.hash_key = next(key['AttributeName'] for key in key_schema if key['KeyType'] == 'HASH')
+        self.range_key = next((key['AttributeName'] for key in key_schema if key['KeyType'] == 'RANGE'), None)
+        self.projection = projection or {'ProjectionType': 'ALL'}
+
+    @property
+    def keys(self) -> tuple:
+        """Key attribute names
+
+        :return: Key attributes
+        :rtype: tuple
+        """
+
+        return (self.hash_key,) + ((self.range_key,) if self.range_key else ())
+
+    def covers(self, fields, table_keys: tuple) -> bool:
+        """Whether every field is projected into the index
+
+        :param fields: Root field names, None for every field
+        :param tuple table_keys: Table key attribute names, always projected
+        :return: True, if the index holds every field. False otherwise
+        :rtype: bool
+        """
+
+        if self.projection.get('ProjectionType', 'ALL') == 'ALL':
+            return True
+
+        if fields is None:
+            return False
+
+        projected = set(self.keys) | set(table_keys) | set(self.projection.get('NonKeyAttributes', []))
+        return set(fields) <= projected
+
+
+class Schema:
+    """Key schema of a table and its secondary indexes
+    """
+
+    def __init__(self, key_schema: list, global_secondary_indexes: list = None, local_secondary_indexes: list = None):
+        """Initialize schema
+
+        :param list key_schema: Table key schema
+        :param list global_secondary_indexes: Global secondary index descriptions
+        :param list local_secondary_indexes: Local secondary index descriptions
+        """
+
+        self.table = IndexSchema(None, key_schema)
+        self.indexes = [
+            IndexSchema(index['IndexName'], index['KeySchema'], index.get('Projection'))
+            for index in (global_secondary_indexes or []) + (local_secondary_indexes or [])
+        ]
+
+    @classmethod
+    def from_table(cls, table) -> 'Schema':
+        """Read the schema of a table resource
+
+        :param table: DynamoDB table resource
+        :return: Schema
+        :rtype: Schema
+        """
+
+        return cls(table.key_schema, table.global_secondary_indexes, table.local_secondary_indexes)
+
+
+def conjuncts(query: dict) -> list:
+    """Split a query into terms joined by $and
+
+    :param dict query: Query
+    :return: Single field or single operator queries
+    :rtype: list
+    """
+
+    terms = []
+
+    for key, value in (query or {}).items():
+        if key == '$and' and isinstance(value, (list, tuple)):
+            for condition in value:
+                terms.extend(conjuncts(condition))
+        else:
+            terms.append({key: value})
+
+    return terms
+
+
+def query_fields(query) -> set:
+    """Collect the root fields a query references
+
+    :param query: Query
+    :return: Root field names
+    :rtype: set
+    """
+
+    fields = set()
+
+    if isinstance(query, dict):
+        for key, value in query.items():
+            if not key.startswith('$'):
+                fields.add(key.split('.')[0])
+            elif isinstance(value, (dict, list, tuple)):
+                fields |= query_fields(value)
+
+    elif isinstance(query, (list, tuple)):
+        for value in query:
+            fields |= query_fields(value)
+
+    return fields
+
+
+def residual(terms: list, used: set) -> dict:
+    """Join the terms an access path does not consume back into a query
+
+    :param list terms: Query terms
+    :param set used: Positions of the consumed terms
+    :return: Residual query
+    :rtype: dict
+    """
+
+    remaining = [term for position, term in enumerate(terms) if position not in used]
+    return remaining[0] if len(remaining) == 1 else ({'$and': remaining} if remaining else {})
+
+
+def _equality(term: dict, field: str):
+    """Return the value a term pins a field to
+
+    :param dict term: Single field query
+    :param str field: Field name
+    :return: Value wrapped in a tuple, or None if the term does not pin the field
+    """
+
+    if field not in term:
+        return None
+
+    value = term[field]
+
+    if isinstance(value, dict):
+        return (value['$eq'],) if list(value.keys()) == ['$eq'] else None
+
+    return None if isinstance(value, (list, tuple)) else (value,)
+
+
+def _unique(values) -> list:
+    """Drop repeated values, keeping the first occurrence of each
+
+    :param values: Values
+    :return: Distinct values
+    :rtype: list
+    """
+
+    distinct = []
+
+    for value in values:
+        if value not in distinct:
+            distinct.append(value)
+
+    return distinct
+
+
+def _values(term: dict, field: str) -> list:
+    """Return the values a term pins a field to, by equality or ``$in``
+
+    :param dict term: Single field query
+    :param str field: Field name
+    :return: Values or None if the term does not pin the field
+    :rtype: list
+    """
+
+    equal = _equality(term, field)
+
+    if equal:
+        return [equal[0]]
+
+    value = term.get(field)
+
+    if isinstance(value, dict) and list(value.keys()) == ['$in'] and isinstance(value['$in'], (list, tuple)):
+        return _unique(value['$in']) or None
+
+    return None
+
+
+def _range(term: dict, field: str):
+    """Return the key condition a term places on a sort key
+
+    :param dict term: Single field query
+    :param str field: Field name
+    :return: Key condition operators or None
+    """
+
+    value = term.get(field)
+
+    if not isinstance(value, dict) or not value or not set(value.keys()) <= set(RANGE_OPERATORS):
+        return None
+
+    if len(value) == 1:
+        return value
+
+    if set(value.keys()) == {'$gte', '$lte'}:
+        return {'$between': [value['$gte'], value['$lte']]}
+
+    return None
+
+
+def _disjoint(keys: list, index: IndexSchema) -> tuple:
+    """Merge the key conditions reading the same partition, so no item is read by two of them
+
+    A partition read whole by one condition is read once, whole. Distinct sort keys pinned in a partition are read as
+    they are. Sort key ranges which may overlap are widened to the whole partition, and the conditions no longer match
+    exactly the items they were meant to.
+
+    :param list keys: Key conditions
+    :param IndexSchema index: Index
+    :return: Disjoint key conditions, and whether they match exactly the items of the given ones
+    :rtype: tuple
+    """
+
+    partitions = {}
+
+    for key in keys:
+        partitions.setdefault(key[index.hash_key], []).append(key)
+
+    disjoint, exact = [], True
+
+    for value, group in partitions.items():
+        conditions = [key.get(index.range_key) for key in group]
+
+        if len(group) == 1 or all(condition is not None and not isinstance(condition, dict)
+                                  for condition in conditions):
+            disjoint.extend(group)
+            continue
+
+        disjoint.append({index.hash_key: value})
+        exact = exact and None in conditions
+
+    return disjoint, exact
+
+
+def _alternatives(term: dict, index: IndexSchema) -> tuple:
+    """Return the key conditions of an ``$or`` whose every alternative is answered by keys of an index
+
+    Alternatives reading the same partition are merged, see ``_disjoint``.
+
+    :param dict term: Single operator query
+    :param IndexSchema index: Index
+    :return: Disjoint key conditions and whether they match exactly the items of the ``$or``, or None
+    :rtype: tuple
+    """
+
+    alternatives = term.get('$or') if len(term) == 1 else None
+
+    if not isinstance(alternatives, (list, tuple)) or not alternatives:
+        return None
+
+    keys = []
+
+    for alternative in alternatives:
+        terms = conjuncts(alternative) if isinstance(alternative, dict) else []
+        found = key_conditions(terms, index) if terms else None
+
+        if found is None or len(found[1]) != len(terms):
+            return None
+
+        keys.extend(found[0])
+
+    return _disjoint(_unique(keys), index)
+
+
+def key_conditions(terms: list, index: IndexSchema) -> tuple:
+    """Return the key conditions query terms place on an index
+
+    :param list terms: Query terms
+    :param IndexSchema index: Index
+    :return: Key condition queries and positions of the consumed terms, or None if no term pins the partition key
+    :rtype: tuple
+    """
+
+    hashed = next(((position, _values(term, index.hash_key)) for position, term in enumerate(terms)
+                   if _values(term, index.hash_key)), None)
+
+    if hashed is None:
+        ored = next(((position, _alternatives(term, index)) for position, term in enumerate(terms)
+                     if _alternatives(term, index)), None)
+
+        if ored is None:
+            return None
+
+        (keys, exact), position = ored[1], ored[0]
+        return keys, {position} if exact else set()
+
+    used, ranges = {hashed[0]}, [None]
+
+    for position, term in enumerate(terms if index.range_key else []):
+        pinned = _values(term, index.range_key)
+        ranged = _range(term, index.range_key)
+
+        if pinned or ranged:
+            ranges = pinned or [ranged]
+            used.add(position)
+            break
+
+    keys = [
+        dict({index.hash_key: value}, **({index.range_key: ranged} if ranged is not None else {}))
+        for value in hashed[1] for ranged in ranges
+    ]
+
+    return keys, used
+
+
+class Plan:
+    """Access path chosen for a query
+    """
+
+    def __init__(self, operation: str, table: str, index: str = None, key: dict = None, filter_: dict = None,
+                 segments: int = 1, forward: bool = True, sorted_: bool = False, keys: list = None,
+                 merge: tuple = None):
+        """Initialize plan
+
+        :param str operation: GetItem, BatchGetItem, Query or Scan
+        :param str table: Table name
+        :param str index: Index read, None for the table itself
+        :param dict key: Primary key for GetItem, key condition query for Query
+        :param dict filter_: Residual filter
+        :param int segments: Parallel scan segments
+        :param bool forward: Read sort keys in ascending order
+        :param bool sorted_: Whether items come back in the requested sort order
+        :param list keys: Primary keys for BatchGetItem, key condition queries of Queries fanned out in parallel
+        :param tuple merge: Field and direction the results of fanned out Queries are merged on, None to concatenate
+        """
+
+        self.operation = operation
+        self.table = table
+        self.index = index
+        self.key = key or (keys[0] if keys else {})
+        self.keys = list(keys) if keys else [self.key]
+        self.merge = merge
+        self.filter = filter_ or {}
+        self.segments = segments
+        self.forward = forward
+        self.sorted = sorted_
+
+    @property
+    def access_path(self) -> str:
+        """Human readable access path
+
+        :return: Access path
+        :rtype: str
+        """
+
+        if self.operation == 'Query':
+            path = f"Query on index {self.index}" if self.index else "Query on table"
+            return f"{path} x {len(self.keys)}" if len(self.keys) > 1 else path
+
+        if self.operation == 'Scan':
+            path = f"Scan on index {self.index}" if self.index else "Scan"
+            return f"{path} with {self.segments} segments" if self.segments > 1 else path
+
+        if self.operation == 'BatchGetItem':
+            return f"BatchGetItem x {len(self.keys)}"
+
+        return self.operation
+
+    def arguments(self, projection=None) -> dict:
+        """Build the arguments of the Query or Scan call
+
+        :param projection: Projected fields, None for every field
+        :return: Call arguments
+        :rtype: dict
+        """
+
+        args = {}
+
+        if self.index:
+            args['IndexName'] = self.index
+
+        if self.operation == 'Query':
+            args['KeyConditionExpression'] = build_key_expression(self.key)
+            args['ScanIndexForward'] = self.forward
+
+        if self.filter:
+            args['FilterExpression'] = build_attr_expression(self.filter)
+
+        if projection:
+            args['ProjectionExpression'], args['ExpressionAttributeNames'] = build_projection_expression(projection)
+
+        return args
+
+    def queries(self, projection=None) -> list:
+        """Build the arguments of every Query the plan fans out to
+
+        :param projection: Projected fields, None for every field
+        :return: Call arguments, one per key condition
+        :rtype: list
+        """
+
+        args = self.arguments(projection)
+        return [dict(args, KeyConditionExpression=build_key_expression(key)) for key in self.keys]
+
+    def describe(self, projection=None) -> dict:
+        """Describe the plan with its compiled expressions
+
+        :param projection: Projected fields, None for every field
+        :return: Plan description
+        :rtype: dict
+        """
+
+        builder = ConditionExpressionBuilder()
+        description = {'access_path': self.access_path, 'table': self.table, 'index': self.index}
+
+        if self.operation == 'GetItem':
+            description['key'] = self.key
+
+        if self.operation == 'BatchGetItem':
+            description['keys'] = self.keys
+
+        if self.operation == 'Query' and len(self.keys) > 1:
+            description['key_conditions'] = [_compiled(builder, build_key_expression(key), True) for key in self.keys]
+            description['scan_index_forward'] = self.forward
+        elif self.operation == 'Query':
+            description['key_condition'] = _compiled(builder, build_key_expression(self.key), True)
+            description['scan_index_forward'] = self.forward
+
+        description['filter'] = _compiled(builder, build_attr_expression(self.filter), False) if self.filter else None
+        description['projection'] = build_projection_expression(projection)[0] if projection else None
+        description['sorted'] = self.sorted
+
+        return description
+
+
+def _compiled(builder: ConditionExpressionBuilder, condition, key: bool) -> dict:
+    """Compile a condition into its expression string and placeholders
+
+    :param ConditionExpressionBuilder builder: Expression builder
+    :param condition: Condition
+    :param bool key: Whether it is a key condition
+    :return: Expression, attribute names and attribute values
+    :rtype: dict
+    """
+
+    built = builder.build_expression(condition, is_key_condition=key)
+
+    return {
+        'expression': built.condition_expression,
+        'names': built.attribute_name_placeholders,
+        'values': built.attribute_value_placeholders
+    }
+
+
+def choose_plan(table: str, schema: Schema, query: dict, projection=None, sort: list = None, segments: int = 1,
+                single: bool = False, live_index: str = None, deleted_field: str = None, max_fanout: int = 100) -> Plan:
+    """Choose the access path of a query
+
+    Queries pinning a single key are preferred over those fanning out to several. Fanned out Queries are merged on the
+    index sort key when the requested sort follows it, and issued in key order when it follows the partition key.
+    Queries which would otherwise scan, and only exclude soft deleted items, scan the sparse index holding live items
+    instead when one is given.
+
+    :param str table: Table name
+    :param Schema schema: Table schema
+    :param dict query: Query
+    :param projection: Projected root fields, None for every field
+    :param list sort: Requested sort, as ``(field, direction)`` pairs
+    :param int segments: Segments of a parallel Scan
+    :param bool single: Whether a single item is being read, allowing GetItem
+    :param str live_index: Sparse index holding only items which are not soft deleted
+    :param str deleted_field: Soft delete field
+    :param int max_fanout: Most keys a query fans out to, queries pinning more keys scan instead
+    :return: Plan
+    :rtype: Plan
+    """
+
+    terms = conjuncts(query)
+    fields = None if projection is None else set(projection) | query_fields(query)
+    sort = list(sort or [])
+    best, best_score = None, 0
+
+    for index in [schema.table] + schema.indexes:
+        if index.name and not index.covers(fields, schema.table.keys):
+            continue
+
+        found = key_conditions(terms, index)
+
+        if found is None or len(found[0]) > max_fanout:
+            continue
+
+        keys, used = found
+        ranged = index.range_key and any(index.range_key in key for key in keys)
+        pinned = all(not index.range_key or not isinstance(key.get(index.range_key, {}), dict) for key in keys)
+
+        if single and index.name is None and pinned and len(keys) == 1:
+            return Plan('GetItem', table, key=keys[0], filter_=residual(terms, used), sorted_=True)
+
+        follows = len(sort) == 1 and sort[0][0] in index.keys and (sort[0][0] == index.range_key or len(keys) > 1)
+        score = 2 + (2 if ranged else 0) + (1 if follows else 0) + (0.5 if index.name is None else 0)
+        score -= 1 if len(keys) > 1 else 0
+
+        if score <= best_score:
+            continue
+
+        direction = sort[0][1] if follows else 1
+        operation = 'BatchGetItem' if index.name is None and pinned and len(keys) > 1 else 'Query'
+        merge = None
+
+        if follows and (operation == 'BatchGetItem' or sort[0][0] == index.hash_key):
+            keys = sorted(keys, key=lambda key: key[sort[0][0]], reverse=direction == -1)
+        elif follows and len(keys) > 1:
+            merge = (index.range_key, direction)
+        best = Plan(operation, table, index=index.name, keys=keys, filter_=residual(terms, used),
+                    forward=direction != -1, sorted_=bool(follows) or not sort, merge=merge)
+        best_score = score
+
+    if best:
+        return best
+
+    live = next((index for index in schema.indexes if index.name == live_index), None)
+    excluded = {deleted_field: {'$ne': True}}
+
+    if live and excluded in terms and live.covers(fields, schema.table.keys):
+        return Plan('Scan', table, index=live_index, filter_=residual(terms, {terms.index(excluded)}),
+                    segments=segments, sorted_=not sort)
+
+    return Plan('Scan', table, filter_=query, segments=segments, sorted_=not sort)
@@ -0,0 +1,378 @@
+"""Materialised per-group counters maintained on write
+
+Resources opt in by declaring rollups in their settings, each rollup counts documents per value of ``group_by`` and
+optionally sums numeric fields::
+
+    'rollups': [{'group_by': 'category', 'sum': ['price']}]
+
+Counters live in a side table (``DYNAMODB_ROLLUP_TABLE``) keyed by a ``rollup`` partition key and a ``group`` sort key,
+both strings. They are adjusted with atomic ``ADD`` updates whenever the data layer writes, and only reflect live
+documents, soft deleted documents are not counted.
+
+Counters start at zero when a rollup is declared: documents written before then are not counted until the rollup is
+rebuilt with ``DynamoDB.rebuild_rollups(resource)``, which recounts the whole resource. Rebuild while writes to the
+resource are paused, since writes made during the rebuild may be counted twice or not at all.
+
+.. codeauthor:: John Lane <john.lane93@gmail.com>
+
+"""
+
+import copy
+from decimal import Decimal
+from numbers import Number
+import simplejson as json
+
+from eve_dynamodb.aggregation import get_field
+from eve_dynamodb.expression import build_key_expression
+
+
+class Rollup:
+    """Rollup declared for a resource
+    """
+
+    def __init__(self, resource: str, group_by: str, sum: list = None, **_kwargs):  # pylint: disable=redefined-builtin
+        """Initialize rollup
+
+        :param str resource: Resource name
+        :param str group_by: Field to group documents by
+        :param list sum: Numeric fields to sum per group
+        :param dict _kwargs: Extra arguments
+        """
+
+        self.resource = resource
+        self.group_by = group_by
+        self.sums = list(sum or [])
+
+    @property
+    def name(self) -> str:
+        """Partition key value of the rollup within the side table
+
+        :return: Rollup name
+        :rtype: str
+        """
+
+        return f"{self.resource}#{self.group_by}"
+
+    def contribution(self, document: dict, deleted_field: str = None) -> tuple:
+        """Compute the group and counters a single document contributes to
+
+        :param dict document: Document
+        :param str deleted_field: Soft delete field, documents flagged deleted contribute nothing
+        :return: Group key and counter deltas, or None if the document does not contribute
+        :rtype: tuple
+        """
+
+        if deleted_field and document.get(deleted_field):
+            return None
+
+        counters = {'count': 1}
+
+        for field in self.sums:
+            value = get_field(document, field)
+
+            if isinstance(value, Number) and not isinstance(value, bool):
+                counters[f"sum_{field}"] = Decimal(str(value))
+                counters[f"num_{field}"] = 1
+
+        return encode_group(get_field(document, self.group_by)), counters
+
+    def answers(self, operator: str, expression) -> bool:
+        """Whether an accumulator can be computed from the rollup counters
+
+        :param str operator: Accumulator operator
+        :param expression: Accumulated expression
+        :return: True, if the rollup answers the accumulator. False otherwise
+        :rtype: bool
+        """
+
+        if operator == '$count' or (operator == '$sum' and expression == 1):
+            return True
+
+        if operator in ('$sum', '$avg') and isinstance(expression, str) and expression.startswith('$'):
+            return expression[1:] in self.sums
+
+        return False
+
+
+def encode_group(value) -> str:
+    """Encode a group value as the side table sort key
+
+    :param value: Group value
+    :return: Encoded group
+    :rtype: str
+    """
+
+    return json.dumps(value, sort_keys=True, default=str)
+
+
+def decode_group(group: str):
+    """Decode a side table sort key back into the group value
+
+    :param str group: Encoded group
+    :return: Group value
+    """
+
+    return json.loads(group, use_decimal=True)
+
+
+def table_definition(name: str) -> dict:
+    """Return the ``create_table`` arguments of the side table
+
+    :param str name: Side table name
+    :return: Table definition
+    :rtype: dict
+    """
+
+    return {
+        'TableName': name,
+        'KeySchema': [{'AttributeName': 'rollup', 'KeyType': 'HASH'}, {'AttributeName': 'group', 'KeyType': 'RANGE'}],
+        'AttributeDefinitions': [
+            {'AttributeName': 'rollup', 'AttributeType': 'S'}, {'AttributeName': 'group', 'AttributeType': 'S'}
+        ],
+        'BillingMode': 'PAY_PER_REQUEST'
+    }
+
+
+def rollups_for(resource: str, settings: dict) -> list:
+    """Return the rollups declared for a resource
+
+    :param str resource: Resource name
+    :param dict settings: Resource settings
+    :return: Declared rollups
+    :rtype: list
+    """
+
+    return [Rollup(resource, **definition) for definition in settings.get('rollups') or []]
+
+
+def apply_updates(original: dict, updates: dict) -> dict:
+    """Apply partial updates to a copy of a document
+
+    :param dict original: Original document
+    :param dict updates: Field values, nested fields use dot notation
+    :return: Updated document
+    :rtype: dict
+    """
+
+    document = copy.deepcopy(original)
+
+    for field, value in updates.items():
+        *parents, leaf = field.split('.')
+        target = document
+
+        for parent in parents:
+            target = target.setdefault(parent, {})
+
+        target[leaf] = value
+
+    return document
+
+
+class RollupTable:
+    """Side table holding rollup counters
+    """
+
+    def __init__(self, table):
+        """Initialize rollup table
+
+        :param table: DynamoDB table resource
+        """
+
+        self.table = table
+
+    def apply(self, rollups: list, removed: list = (), added: list = (), deleted_field: str = None):
+        """Adjust counters for documents leaving and entering the resource, one atomic update per touched group
+
+        :param list rollups: Rollups declared for the resource
+        :param list removed: Documents no longer present, or their previous version
+        :param list added: Documents now present, or their new version
+        :param str deleted_field: Soft delete field
+        """
+
+        for rollup in rollups:
+            deltas = {}
+
+            for sign, documents in ((-1, removed), (1, added)):
+                for document in documents:
+                    contribution = rollup.contribution(document, deleted_field)
+
+                    if contribution is None:
+                        continue
+
+                    group, counters = contribution
+                    totals = deltas.setdefault(group, {})
+
+                    for counter, value in counters.items():
+                        totals[counter] = totals.get(counter, 0) + sign * value
+
+            for group, counters in deltas.items():
+                counters = {counter: value for counter, value in counters.items() if value}
+
+                if counters:
+                    self._add(rollup, group, counters)
+
+    def rebuild(self, rollups: list, documents, deleted_field: str = None):
+        """Replace the counters of rollups with counters recomputed from every document
+
+        :param list rollups: Rollups declared for the resource
+        :param documents: Every document of the resource
+        :param str deleted_field: Soft delete field
+        """
+
+        for rollup in rollups:
+            for _, counters in self.groups(rollup):
+                self.table.delete_item(Key={'rollup': counters['rollup'], 'group': counters['group']})
+
+        self.apply(rollups, added=list(documents), deleted_field=deleted_field)
+
+    def _add(self, rollup: Rollup, group: str, counters: dict):
+        """Atomically add deltas to the counters of a group
+
+        :param Rollup rollup: Rollup
+        :param str group: Encoded group
+        :param dict counters: Counter deltas
+        """
+
+        names = {f"#c{index}": counter for index, counter in enumerate(counters)}
+        values = {f":c{index}": Decimal(value) for index, value in enumerate(counters.values())}
+
+        self.table.update_item(
+            Key={'rollup': rollup.name, 'group': group},
+            UpdateExpression='ADD ' + ', '.join(f"#c{index} :c{index}" for index in range(len(counters))),
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values
+        )
+
+    def groups(self, rollup: Rollup) -> list:
+        """Read the counters of every group of a rollup
+
+        :param Rollup rollup: Rollup
+        :return: Group values and their counters
+        :rtype: list
+        """
+
+        groups = []
+        args = {'KeyConditionExpression': build_key_expression({'rollup': rollup.name})}
+
+        while True:
+            page = self.table.query(**args)
+            groups.extend((decode_group(item['group']), item) for item in page.get('Items', []))
+
+            if 'LastEvaluatedKey' not in page:
+                return groups
+
+            args['ExclusiveStartKey'] = page['LastEvaluatedKey']
+
+    def group(self, rollup: Rollup, value) -> dict:
+        """Read the counters of a single group
+
+        :param Rollup rollup: Rollup
+        :param value: Group value
+        :return: Group counters
+        :rtype: dict
+        """
+
+        return self.table.get_item(Key={'rollup': rollup.name, 'group': encode_group(value)}).get('Item', {})
+
+    def count(self, rollup: Rollup, value=None, every: bool = False) -> int:
+        """Count documents within a group, or across every group
+
+        :param Rollup rollup: Rollup
+        :param value: Group value
+        :param bool every: Count across every group
+        :return: Document count
+        :rtype: int
+        """
+
+        if every:
+            return int(sum(counters.get('count', 0) for _, counters in self.groups(rollup)))
+
+        return int(self.group(rollup, value).get('count', 0))
+
+    def aggregate(self, rollup: Rollup, group: dict) -> list:
+        """Compute a $group stage from rollup counters
+
+        :param Rollup rollup: Rollup grouping by the stage key
+        :param dict group: $group stage specification
+        :return: Grouped documents
+        :rtype: list
+        """
+
+        documents = []
+
+        for value, counters in self.groups(rollup):
+
+            if not counters.get('count'):
+                continue
+
+            document = {'_id': value}
+
+            for field, accumulator in group.items():
+                if field == '_id':
+                    continue
+
+                operator, expression = next(iter(accumulator.items()))
+
+                if operator == '$count' or expression == 1:
+                    document[field] = counters['count']
+                elif operator == '$sum':
+                    document[field] = counters.get(f"sum_{expression[1:]}", 0)
+                else:
+                    number = counters.get(f"num_{expression[1:]}", 0)
+                    document[field] = counters.get(f"sum_{expression[1:]}", 0) / number if number else None
+
+            documents.append(document)
+
+        return documents
+
+
+def rollup_for_group(rollups: list, group: dict):
+    """Find a rollup able to answer a $group stage
+
+    :param list rollups: Rollups declared for the resource
+    :param dict group: $group stage specification
+    :return: Matching rollup or None
+    """
+
+    key = group.get('_id')
+
+    if not isinstance(key, str) or not key.startswith('$'):
+        return None
+
+    for rollup in rollups:
+        if rollup.group_by != key[1:]:
+            continue
+
+        if all(isinstance(accumulator, dict) and len(accumulator) == 1 and rollup.answers(*next(iter(
+                accumulator.items()))) for field, accumulator in group.items() if field != '_id'):
+            return rollup
+
+    return None
+
+
+def equality_terms(query: dict) -> dict:
+    """Flatten a query made only of field equalities joined by $and
+
+    :param dict query: Query
+    :return: Field values or None, if the query has any other shape or sets a field to different values
+    :rtype: dict
+    """
+
+    terms = {}
+
+    for key, value in query.items():
+        if key == '$and' and isinstance(value, (list, tuple)):
+            for condition in value:
+                nested = equality_terms(condition)
+
+                if nested is None or any(field in terms and terms[field] != term for field, term in nested.items()):
+                    return None
+                terms.update(nested)
+
+        elif key.startswith('$'):
+            return None
+
+        else:
+            terms[key] = value
+
+    return terms
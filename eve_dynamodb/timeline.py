@@ -0,0 +1,200 @@
+"""Time bucketed index of updated items
+
+Resources opt in by declaring a global secondary index partitioned on a time bucket and sorted on the update time::
+
+    'updated_index': {'name': 'updated', 'bucket_seconds': 3600}
+
+The data layer stores ``<resource>#<bucket start>`` in ``attribute`` (``_bucket``) and the update time as a sortable
+ISO-8601 UTC string in ``sort_attribute`` (``_updated_at``), since DynamoDB cannot key on datetimes. Filters on
+``LAST_UPDATED`` with ``$gt`` or ``$gte``, including If-Modified-Since, are then answered with one range Query per
+bucket between the requested time and now, run in parallel, instead of a scan.
+
+.. codeauthor:: John Lane <john.lane93@gmail.com>
+
+"""
+
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+import math
+from eve.utils import str_to_date
+
+from eve_dynamodb.planner import Plan, Schema, conjuncts, query_fields, residual
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def to_utc(value) -> datetime:
+    """Convert a timestamp into a naive UTC datetime
+
+    :param value: Datetime, RFC 1123 or ISO-8601 string, or seconds since the epoch
+    :return: Naive UTC datetime
+    :rtype: datetime
+    """
+
+    if isinstance(value, datetime):
+        return value.astimezone(timezone.utc).replace(tzinfo=None) if value.tzinfo else value
+
+    if isinstance(value, (int, float, Decimal)) and not isinstance(value, bool):
+        return EPOCH + timedelta(seconds=float(value))
+
+    try:
+        return str_to_date(value)
+    except ValueError:
+        return to_utc(datetime.fromisoformat(value.replace('Z', '+00:00')))
+
+
+def utcnow() -> datetime:
+    """Return the current naive UTC datetime
+
+    :return: Current time
+    :rtype: datetime
+    """
+
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class Timeline:
+    """Time bucketed index declared for a resource
+    """
+
+    def __init__(self, resource: str, name: str, field: str = '_updated', attribute: str = '_bucket',
+                 sort_attribute: str = '_updated_at', bucket_seconds: int = 3600, max_buckets: int = 48,
+                 **_kwargs):
+        """Initialize timeline
+
+        :param str resource: Resource name
+        :param str name: Index name
+        :param str field: Update time field, ``LAST_UPDATED``
+        :param str attribute: Bucket attribute, the index partition key
+        :param str sort_attribute: Sortable update time attribute, the index sort key
+        :param int bucket_seconds: Width of a bucket
+        :param int max_buckets: Most buckets queried by a single read, older filters scan instead
+        :param dict _kwargs: Extra arguments
+        """
+
+        self.resource = resource
+        self.name = name
+        self.field = field
+        self.attribute = attribute
+        self.sort_attribute = sort_attribute
+        self.width = int(bucket_seconds)
+        self.max_buckets = int(max_buckets)
+
+    @classmethod
+    def for_resource(cls, resource: str, settings: dict, field: str):
+        """Return the timeline declared in the settings of a resource
+
+        :param str resource: Resource name
+        :param dict settings: Resource settings
+        :param str field: Update time field, ``LAST_UPDATED``
+        :return: Timeline or None
+        """
+
+        definition = settings.get('updated_index')
+        return cls(resource, field=field, **definition) if definition else None
+
+    @property
+    def attributes(self) -> tuple:
+        """Attributes maintained by the data layer
+
+        :return: Attribute names
+        :rtype: tuple
+        """
+
+        return self.attribute, self.sort_attribute
+
+    def start(self, moment: datetime) -> datetime:
+        """Return the start of the bucket holding a moment
+
+        :param datetime moment: Naive UTC datetime
+        :return: Bucket start
+        :rtype: datetime
+        """
+
+        seconds = (moment - EPOCH).total_seconds()
+        return EPOCH + timedelta(seconds=math.floor(seconds / self.width) * self.width)
+
+    def bucket(self, moment: datetime) -> str:
+        """Return the partition key of the bucket holding a moment
+
+        :param datetime moment: Naive UTC datetime
+        :return: Bucket
+        :rtype: str
+        """
+
+        return f"{self.resource}#{self.start(moment):%Y-%m-%dT%H:%M:%SZ}"
+
+    @staticmethod
+    def sort_value(moment: datetime) -> str:
+        """Format a moment as a sortable string
+
+        :param datetime moment: Naive UTC datetime
+        :return: Sort key value
+        :rtype: str
+        """
+
+        return f"{moment:%Y-%m-%dT%H:%M:%S.%fZ}"
+
+    def values(self, updated) -> dict:
+        """Compute the maintained attributes of an item updated at a given time
+
+        :param updated: Update time
+        :return: Attribute values
+        :rtype: dict
+        """
+
+        moment = to_utc(updated)
+        return {self.attribute: self.bucket(moment), self.sort_attribute: self.sort_value(moment)}
+
+    def buckets(self, since: datetime, now: datetime = None) -> list:
+        """List the buckets between a moment and now, plus one to absorb clock skew
+
+        :param datetime since: Naive UTC datetime
+        :param datetime now: Naive UTC datetime, defaults to the current time
+        :return: Buckets, oldest first, none when the moment is more than a bucket ahead of now
+        :rtype: list
+        """
+
+        first, last = self.start(since), self.start(now or utcnow()) + timedelta(seconds=self.width)
+        count = int((last - first).total_seconds() // self.width) + 1
+        return [self.bucket(first + timedelta(seconds=self.width * step)) for step in range(count)]
+
+    def plan(self, table: str, schema: Schema, query: dict, projection=None, sort: list = None,
+             now: datetime = None) -> Plan:
+        """Plan a read filtering on the update time through the bucketed index
+
+        :param str table: Table name
+        :param Schema schema: Table schema
+        :param dict query: Query
+        :param projection: Projected root fields, None for every field
+        :param list sort: Requested sort, as ``(field, direction)`` pairs
+        :param datetime now: Naive UTC datetime, defaults to the current time
+        :return: Plan fanning out one Query per bucket, or None if the index cannot answer the query
+        :rtype: Plan
+        """
+
+        terms = conjuncts(query)
+        position = next((position for position, term in enumerate(terms) if isinstance(term.get(self.field), dict)
+                         and len(term[self.field]) == 1 and set(term[self.field]) <= {'$gt', '$gte'}), None)
+        index = next((index for index in schema.indexes if index.name == self.name), None)
+        fields = None if projection is None else set(projection) | query_fields(query)
+
+        if position is None or index is None or not index.covers(fields, schema.table.keys):
+            return None
+
+        operator, value = next(iter(terms[position][self.field].items()))
+        since = to_utc(value)
+        buckets = self.buckets(since, now)
+
+        if not buckets or len(buckets) > self.max_buckets:
+            return None
+
+        sort = list(sort or [])
+        follows = len(sort) == 1 and sort[0][0] == self.field
+        descending = follows and sort[0][1] == -1
+        keys = [{self.attribute: bucket, self.sort_attribute: {operator: self.sort_value(since)}} for bucket in buckets]
+
+        return Plan(
+            'Query', table, index=self.name, keys=keys[::-1] if descending else keys,
+            filter_=residual(terms, {position}), forward=not descending, sorted_=follows or not sort
+        )
@@ -5,6 +5,8 @@
 """
 
 from eve.io.mongo.validation import Validator
+from eve.utils import config
+from flask import current_app as app
 
 
 class ValidatorDynamoDB(Validator):
@@ -12,31 +14,57 @@ class ValidatorDynamoDB(Validator):
     """
 
     def _is_value_unique(self, unique, field, value, query):
-        """ Validates that a field value is unique
-        """
-
-        # TODO: Finish this
-
-        """
-        if unique:
-            query[field] = value
+        """Validates that a field value is unique, probing for a matching document other than the current one
 
-            resource_config = config.DOMAIN[self.resource]
+        Soft deleted documents are ignored, and the probe never answers from the existence cache.
 
-            label, _, _, _ = app.data.datasource(self.resource)
-            selected = app.data.driver.select(label, **query)
-
-            # exclude current document
-            if self._id:
-                id_field = resource_config['id_field']
-                selected = selected.where(
-                    '_.%s <> "%s"' % (id_field, self._id))
-
-            if count_selection(selected) > 0:
-                self._error(field, "value '%s' is not unique" % value)
+        :param bool unique: Whether the value must be unique
+        :param str field: Resource field name
+        :param value: Field value
+        :param dict query: Query the value must be unique within
         """
 
-        raise NotImplementedError
+        if unique:
+            schema, path, field_schema_path = self.root_schema, list(self.document_path) + [field], []
+
+            # List fields in between are skipped, a document matches when any of their items does
+            while path:
+                step = path.pop(0)
+
+                if schema.get('type') == 'list':
+                    schema = schema['schema']
+                    continue
+
+                schema = schema['schema'][step] if schema.get('type') == 'dict' else schema[step]
+                field_schema_path.append(step)
+
+            query['.'.join(field_schema_path)] = value
+
+            if self.document_id:
+                id_field = config.DOMAIN[self.resource]['id_field']
+                excluded = {'$ne': self.document_id}
+                query[id_field] = dict(excluded, **{'$eq': query[id_field]}) if id_field in query else excluded
+
+            if app.data.exists(self.resource, query, cache=False):
+                self._error(field, f"value '{value}' is not unique")
+
+    def _validate_data_relation(self, data_relation, field, value):
+        """{'type': 'dict',
+        'schema': {
+           'resource': {'type': 'string', 'required': True},
+           'field': {'type': 'string', 'required': True},
+           'embeddable': {'type': 'boolean', 'default': False},
+           'version': {'type': 'boolean', 'default': False}
+        }}"""
+
+        if data_relation.get('version') or (not value and self.schema[field].get('nullable')):
+            super()._validate_data_relation(data_relation, field, value)
+            return
+
+        for item in value if isinstance(value, list) else [value]:
+            if not app.data.exists(data_relation['resource'], {data_relation['field']: item}):
+                self._error(field, f"value '{item}' must exist in resource '{data_relation['resource']}', "
+                                   f"field '{data_relation['field']}'.")
 
     # Override validation for Mongo fields
     def _validate_type_objectid(self, field: str, value):
@@ -49,6 +49,10 @@ setup(
         "pytest-pylint>=0.14.0"
     ],
     extras_require={
+        "benchmark": [
+            "moto[dynamodb]>=5.0.0",
+            "pytest-benchmark>=3.2.0"
+        ],
         "release": [
             "bumpversion>=0.5.0",
             "Sphinx>=2.0.0",
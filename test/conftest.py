@@ -30,3 +30,88 @@ def server():
     }
 
     return eve.Eve(settings=settings, data=DynamoDB)
+
+
+def memory_table(name: str, keys: list, indexes: dict = None) -> dict:
+    """Describe a table of the in-process DynamoDB engine, keyed on string attributes
+
+    :param str name: Table name
+    :param list keys: Hash key, then optionally range key, attribute names
+    :param dict indexes: Hash key, then optionally range key, attribute names of global secondary indexes by name
+    :return: Table description
+    :rtype: dict
+    """
+
+    def key_schema(attributes: list) -> list:
+        return [{'AttributeName': attribute, 'KeyType': kind} for attribute, kind in zip(attributes, ('HASH', 'RANGE'))]
+
+    attributes = list(dict.fromkeys(keys + [attribute for index in (indexes or {}).values() for attribute in index]))
+    table = {
+        'TableName': name,
+        'KeySchema': key_schema(keys),
+        'AttributeDefinitions': [{'AttributeName': attribute, 'AttributeType': 'S'} for attribute in attributes]
+    }
+
+    if indexes:
+        table['GlobalSecondaryIndexes'] = [
+            {'IndexName': index, 'KeySchema': key_schema(index_keys), 'Projection': {'ProjectionType': 'ALL'}}
+            for index, index_keys in indexes.items()
+        ]
+
+    return table
+
+
+@pytest.fixture()
+def memory_app():
+    """Returns a factory of Eve servers backed by the in-process DynamoDB engine
+
+    The factory takes the domain, the key schema of the tables to create, as ``{name: keys}`` or
+    ``{name: (keys, indexes)}`` (see :func:`memory_table`), and extra settings. Tables left out are created on first
+    use, keyed on ``_id``.
+
+    :return: Eve server factory
+    :rtype: Callable
+    """
+
+    def build(domain: dict, tables: dict = None, validator=None, **settings) -> eve.Eve:
+        settings = dict(settings, DYNAMODB_DRIVER='memory', DOMAIN=domain)
+
+        if tables:
+            settings['DYNAMODB_MEMORY_TABLES'] = [
+                memory_table(name, *(schema if isinstance(schema, tuple) else (schema,)))
+                for name, schema in tables.items()
+            ]
+
+        return eve.Eve(settings=settings, data=DynamoDB, **({'validator': validator} if validator else {}))
+
+    return build
+
+
+@pytest.fixture()
+def memory_server(memory_app):
+    """Returns an Eve server instance backed by the in-process DynamoDB engine
+
+    :param memory_app: Eve server factory
+    :return: Eve server
+    :rtype: eve.Eve
+    """
+
+    return memory_app({
+        'actor': {
+            'item_url': 'regex("[\\w]+")',
+            'schema': {
+                '_id': {'type': 'string', 'unique': True},
+                'name': {'type': 'string'},
+                'rating': {'type': 'integer'}
+            }
+        },
+        'public_actor': {
+            'datasource': {'source': 'actor', 'filter': {'public': True}, 'projection': {'name': 1}},
+            'schema': {
+                '_id': {'type': 'string'},
+                'name': {'type': 'string'},
+                'public': {'type': 'boolean'},
+                'secret': {'type': 'string'}
+            }
+        }
+    })
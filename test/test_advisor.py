@@ -0,0 +1,106 @@
+"""test_advisor
+
+.. codeauthor:: John Lane <john.lane93@gmail.com>
+
+"""
+
+from eve import Eve
+from eve.utils import ParsedRequest
+import pytest
+import simplejson as json
+from eve_dynamodb.advisor import main, recommend, shape, update_table
+
+
+@pytest.mark.parametrize(('query', 'sort', 'expected'), (
+        ({'name': 'x', 'rating': {'$gte': 2}}, None,
+         {'equality': ['name'], 'range': ['rating'], 'other': [], 'sort': None, 'types': {'name': 'S', 'rating': 'N'}}),
+        ({'$and': [{'name': {'$eq': 'x'}}, {'tags': {'$contains': 'a'}}]}, [('rating', -1)],
+         {'equality': ['name'], 'range': [], 'other': ['tags'], 'sort': 'rating', 'types': {'name': 'S'}}),
+        ({'$or': [{'name': 'x'}, {'name': 'y'}]}, None,
+         {'equality': [], 'range': [], 'other': [], 'sort': None, 'types': {}})
+))
+def test_shape(query: dict, sort: list, expected: dict):
+    """Test to ensure query shapes capture equality, range, other and sort fields
+
+    :param dict query: Query
+    :param list sort: Requested sort
+    :param dict expected: Expected shape
+    :raises: AssertionError
+    """
+
+    assert shape(query, sort) == expected
+
+
+@pytest.fixture()
+def report(memory_server: Eve) -> dict:
+    """Returns the advisor report of a few filtered reads
+
+    :param Eve memory_server: Eve server using the memory driver
+    :return: Advisor report
+    :rtype: dict
+    """
+
+    memory_server.data.advisor.sample_rate = 1
+
+    with memory_server.app_context():
+        memory_server.data.insert('actor', [{'_id': str(i), 'name': f"actor{i % 10}", 'rating': i % 5}
+                                            for i in range(100)])
+
+        for where in ('{"name": "actor1"}', '{"name": "actor2", "rating": {"$gte": 3}}', '{"rating": {"$lt": 1}}'):
+            req = ParsedRequest()
+            req.where = where
+            memory_server.data.find('actor', req, perform_count=False)
+
+        memory_server.data.find_one('actor', None, _id='1')
+
+    return memory_server.data.advisor.report()
+
+
+def test_recommend(report: dict):
+    """Test to ensure scanned equality filters are recommended an index, and served or unpinned shapes are not
+
+    :param dict report: Advisor report
+    :raises: AssertionError
+    """
+
+    recommendations = recommend(report)
+
+    assert len(report['resources']['actor']['shapes']) == 4
+    assert [(item['hash_key'], item['range_key']) for item in recommendations] == [('name', 'rating'), ('name', None)]
+    assert all(item['estimated_rcu_saved'] > 0 for item in recommendations)
+
+
+def test_update_table(report: dict):
+    """Test to ensure recommendations translate into UpdateTable arguments
+
+    :param dict report: Advisor report
+    :raises: AssertionError
+    """
+
+    arguments = update_table(recommend(report)[0])
+
+    assert arguments['TableName'] == 'actor'
+    assert arguments['AttributeDefinitions'] == [
+        {'AttributeName': 'name', 'AttributeType': 'S'}, {'AttributeName': 'rating', 'AttributeType': 'N'}
+    ]
+    assert arguments['GlobalSecondaryIndexUpdates'][0]['Create']['Projection'] == {
+        'ProjectionType': 'INCLUDE', 'NonKeyAttributes': ['_created', '_etag', '_id', '_updated']
+    }
+
+
+def test_cli(report: dict, tmp_path, capsys):
+    """Test to ensure the command line prints recommendations from a dumped report
+
+    :param dict report: Advisor report
+    :param tmp_path: Temporary directory
+    :param capsys: Output capture fixture
+    :raises: AssertionError
+    """
+
+    path = tmp_path / 'report.json'
+    path.write_text(json.dumps(report))
+
+    assert main([str(path), '--top', '1']) == 0
+    assert capsys.readouterr().out.startswith('actor: name-rating (HASH name, RANGE rating)')
+    assert main([str(path), '--update-table']) == 0
+    assert len(json.loads(capsys.readouterr().out)) == 2
@@ -0,0 +1,154 @@
+"""test_aggregation
+
+.. codeauthor:: John Lane <john.lane93@gmail.com>
+
+"""
+
+from decimal import Decimal
+import pytest
+from eve_dynamodb.aggregation import Pipeline, match_document, project_document
+
+
+DOCUMENTS = [
+    {'_id': '1', 'category': 'a', 'price': Decimal(10), 'name': 'foo'},
+    {'_id': '2', 'category': 'a', 'price': Decimal(20), 'name': 'bar'},
+    {'_id': '3', 'category': 'b', 'price': Decimal(5), 'name': 'baz'},
+    {'_id': '4', 'category': 'b', 'name': 'qux'}
+]
+
+
+@pytest.mark.parametrize(('query', 'expectation'), (
+        ({'category': 'a'}, ['1', '2']),
+        ({'price': {'$gte': 10}}, ['1', '2']),
+        ({'price': {'$exists': False}}, ['4']),
+        ({'$or': [{'name': 'foo'}, {'name': 'qux'}]}, ['1', '4']),
+        ({'name': {'$startsWith': 'ba'}}, ['2', '3']),
+        ({'_id': {'$in': ['3', '4']}, 'category': {'$ne': 'a'}}, ['3', '4'])
+))
+def test_match_document(query: dict, expectation: list):
+    """Test to ensure queries are evaluated against documents the same way DynamoDB filters them
+
+    :param dict query: Query to evaluate
+    :param list expectation: Expected matching ids
+    :raises: AssertionError
+    """
+
+    assert [doc['_id'] for doc in DOCUMENTS if match_document(doc, query)] == expectation
+
+
+def test_group_accumulators():
+    """Test to ensure group accumulators are computed per group
+
+    :raises: AssertionError
+    """
+
+    pipeline = Pipeline([
+        {'$group': {
+            '_id': '$category',
+            'total': {'$sum': '$price'},
+            'count': {'$sum': 1},
+            'low': {'$min': '$price'},
+            'high': {'$max': '$price'},
+            'mean': {'$avg': '$price'}
+        }},
+        {'$sort': {'_id': 1}}
+    ])
+
+    assert pipeline.execute(DOCUMENTS) == [
+        {'_id': 'a', 'total': 30, 'count': 2, 'low': 10, 'high': 20, 'mean': 15},
+        {'_id': 'b', 'total': 5, 'count': 2, 'low': 5, 'high': 5, 'mean': 5}
+    ]
+
+
+def test_match_and_projection_push_down():
+    """Test to ensure leading matches and required fields are pushed down to the scan
+
+    :raises: AssertionError
+    """
+
+    pipeline = Pipeline([
+        {'$match': {'category': 'a'}},
+        {'$match': {'price': {'$gt': 5}}},
+        {'$group': {'_id': '$category', 'total': {'$sum': '$price'}}}
+    ])
+
+    assert pipeline.match == {'$and': [{'category': 'a'}, {'price': {'$gt': 5}}]}
+    assert pipeline.projection == ['category', 'price']
+    assert pipeline.decomposable
+
+
+def test_sort_limit_and_project():
+    """Test to ensure sort, skip, limit and project stages are applied in order
+
+    :raises: AssertionError
+    """
+
+    pipeline = Pipeline([
+        {'$sort': {'price': -1}},
+        {'$skip': 1},
+        {'$limit': 2},
+        {'$project': {'name': 1, '_id': 0}}
+    ])
+
+    assert pipeline.projection is None
+    assert pipeline.execute(DOCUMENTS) == [{'name': 'foo'}, {'name': 'baz'}]
+
+
+def test_facet_pagination():
+    """Test to ensure the facet stage Eve appends for pagination is supported
+
+    :raises: AssertionError
+    """
+
+    pipeline = Pipeline([
+        {'$match': {'category': 'b'}},
+        {'$facet': {
+            'paginated_results': [{'$skip': 0}, {'$limit': 1}],
+            'total_count': [{'$count': 'count'}]
+        }}
+    ])
+
+    result = pipeline.execute(doc for doc in DOCUMENTS if match_document(doc, pipeline.match))
+
+    assert result == [{'paginated_results': [DOCUMENTS[2]], 'total_count': [{'count': 2}]}]
+
+
+def test_parallel_partial_aggregates():
+    """Test to ensure partial aggregates computed per segment are merged
+
+    :raises: AssertionError
+    """
+
+    pipeline = Pipeline([
+        {'$group': {'_id': None, 'total': {'$sum': '$price'}, 'mean': {'$avg': '$price'}}}
+    ])
+
+    result = pipeline.execute_parallel([lambda: DOCUMENTS[:2], lambda: DOCUMENTS[2:]])
+
+    assert result == pipeline.execute(DOCUMENTS) == [{'_id': None, 'total': 35, 'mean': Decimal(35) / 3}]
+
+
+def test_unsupported_stage():
+    """Test to ensure unsupported stages are rejected
+
+    :raises: AssertionError
+    """
+
+    with pytest.raises(ValueError):
+        Pipeline([{'$lookup': {'from': 'other'}}])
+
+
+@pytest.mark.parametrize(('fields', 'expected'), (
+        (['_id', 'name'], {'_id': '1', 'name': 'foo'}),
+        (['cast.lead', 'missing'], {'cast': {'lead': 'x'}}),
+        (['cast.lead', 'cast'], {'cast': {'lead': 'x', 'extras': 2}})
+))
+def test_project_document(fields: list, expected: dict):
+    """Test to ensure documents read in full keep only their projected fields
+
+    :param list fields: Projected fields
+    :param dict expected: Projected document
+    :raises: AssertionError
+    """
+
+    assert project_document({'_id': '1', 'name': 'foo', 'cast': {'lead': 'x', 'extras': 2}}, fields) == expected
@@ -0,0 +1,78 @@
+"""test_cache
+
+.. codeauthor:: John Lane <john.lane93@gmail.com>
+
+"""
+
+import time
+import pytest
+from eve_dynamodb.cache import ResultCache, normalise
+
+
+@pytest.mark.parametrize(('left', 'right'), (
+        ({'a': 1, 'b': 2}, {'b': 2, 'a': 1}),
+        ({'$and': [{'a': 1}, {'$and': [{'b': 2}, {'c': 3}]}]}, {'$and': [{'c': 3}, {'b': 2}, {'a': 1}]}),
+        ({'$and': [{'a': 1}]}, {'a': 1}),
+        ({'$or': [{'a': 1}, {'b': 2}]}, {'$or': [{'b': 2}, {'a': 1}]})
+))
+def test_equivalent_queries_share_a_key(left: dict, right: dict):
+    """Test to ensure equivalent queries are normalised to the same cache key
+
+    :param dict left: Query
+    :param dict right: Equivalent query
+    :raises: AssertionError
+    """
+
+    cache = ResultCache(10)
+
+    assert normalise(left) == normalise(right)
+    assert cache.key('actor', spec=left) == cache.key('actor', spec=right)
+
+
+def test_write_invalidates_table():
+    """Test to ensure bumping a table generation invalidates its pages only
+
+    :raises: AssertionError
+    """
+
+    cache = ResultCache(10)
+    actor, movie = cache.key('actor', spec={}), cache.key('movie', spec={})
+    cache.put(actor, ([{'_id': '1'}], 1), 60)
+    cache.put(movie, ([{'_id': '2'}], 1), 60)
+
+    cache.invalidate('actor')
+
+    assert cache.get(cache.key('actor', spec={})) is None
+    assert cache.get(cache.key('movie', spec={})) == ([{'_id': '2'}], 1)
+
+
+def test_lru_eviction_and_expiry():
+    """Test to ensure the cache is size bounded and honours ttl
+
+    :raises: AssertionError
+    """
+
+    cache = ResultCache(2)
+    cache.put('a', [1], 60)
+    cache.put('b', [2], 60)
+    cache.get('a')
+    cache.put('c', [3], 60)
+    cache.put('d', [4], 0.01)
+
+    assert len(cache) == 2
+    assert cache.get('a') is None and cache.get('b') is None and cache.get('c') == [3]
+
+    time.sleep(0.02)
+    assert cache.get('d') is None
+
+
+def test_disabled_cache():
+    """Test to ensure nothing is cached unless a size is configured
+
+    :raises: AssertionError
+    """
+
+    cache = ResultCache()
+    cache.put('a', [1], 60)
+
+    assert cache.get('a') is None
@@ -0,0 +1,67 @@
+"""test_driver
+
+.. codeauthor:: John Lane <john.lane93@gmail.com>
+
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import eve
+from eve import Eve
+import pytest
+from eve_dynamodb.dynamodb import DynamoDB
+
+
+def test_lazy_driver(memory_server: Eve):
+    """Test to ensure the driver is created once, on first use, even when first used by several threads at once
+
+    :param Eve memory_server: Eve server
+    :raises: AssertionError
+    """
+
+    data = memory_server.data
+
+    assert data._connection is None  # pylint: disable=protected-access
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        drivers = list(pool.map(lambda _: data.driver, range(32)))
+
+    assert all(driver is drivers[0] for driver in drivers)
+    assert data.driver is drivers[0]
+
+    data.driver = None
+
+    assert data.driver is not drivers[0]
+
+
+@pytest.mark.parametrize('driver', ('boto3', 'memory'))
+def test_warm_up(driver: str):
+    """Test to ensure warming up creates the driver and loads its service models without making calls
+
+    :param str driver: Selected driver
+    :raises: AssertionError
+    """
+
+    settings = {
+        'DYNAMODB_DRIVER': driver,
+        'DYNAMODB_WARM_UP': True,
+        'DOMAIN': {'actor': {'schema': {'_id': {'type': 'string'}}}}
+    }
+
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+        server = eve.Eve(settings=settings, data=DynamoDB)
+
+    assert server.data._connection is not None  # pylint: disable=protected-access
+    assert server.data.schemas == {}
+
+
+def test_unknown_driver():
+    """Test to ensure an unknown driver is reported on first use
+
+    :raises: AssertionError
+    """
+
+    server = eve.Eve(settings={'DYNAMODB_DRIVER': 'x', 'DOMAIN': {'actor': {}}}, data=DynamoDB)
+
+    with pytest.raises(ValueError):
+        assert server.data.driver
@@ -0,0 +1,162 @@
+"""test_exists
+
+.. codeauthor:: John Lane <john.lane93@gmail.com>
+
+"""
+
+from botocore.exceptions import ClientError
+from eve import Eve
+import pytest
+from werkzeug.exceptions import HTTPException
+from eve_dynamodb.instrumentation import MemorySink
+from eve_dynamodb.validation import ValidatorDynamoDB
+
+
+@pytest.fixture()
+def probe_server(memory_app) -> Eve:
+    """Returns an Eve server caching existence probes, with movies related to actors
+
+    :param memory_app: Eve server factory
+    :return: Eve server
+    :rtype: Eve
+    """
+
+    return memory_app({
+        'actor': {
+            'schema': {'_id': {'type': 'string'}, 'name': {'type': 'string', 'unique': True}}
+        },
+        'movie': {
+            'schema': {
+                '_id': {'type': 'string'},
+                'actor': {'type': 'string', 'data_relation': {'resource': 'actor', 'field': '_id'}}
+            }
+        }
+    }, validator=ValidatorDynamoDB, DYNAMODB_EXISTS_CACHE_TTL=60)
+
+
+@pytest.mark.parametrize(('lookup', 'expected', 'calls'), (
+        ({}, True, 1),
+        ({'_id': '7'}, True, 1),
+        ({'_id': 'x'}, False, 1),
+        ({'name': 'actor19'}, True, None),
+        ({'name': 'x'}, False, 5)
+))
+def test_exists(probe_server: Eve, lookup: dict, expected: bool, calls: int):
+    """Test to ensure probes stop at the first match, doubling their page size until they find one
+
+    :param Eve probe_server: Eve server
+    :param dict lookup: Lookup
+    :param bool expected: Whether a document matches
+    :param int calls: Expected DynamoDB calls, None when it depends on the item order
+    :raises: AssertionError
+    """
+
+    with probe_server.app_context():
+        data = probe_server.data
+        data.insert('actor', [{'_id': str(i), 'name': f"actor{i}"} for i in range(20)])
+        sink = MemorySink()
+
+        with data.instrumentation.capture(sink):
+            assert data.exists('actor', lookup) is expected
+
+        assert sink.total()['calls'] == calls or calls is None
+        assert sink.total()['calls'] <= 5
+
+
+def test_exists_cache(probe_server: Eve):
+    """Test to ensure probe answers are cached until the data layer writes the table
+
+    :param Eve probe_server: Eve server
+    :raises: AssertionError
+    """
+
+    with probe_server.app_context():
+        data = probe_server.data
+        sink = MemorySink()
+
+        with data.instrumentation.capture(sink):
+            assert data.is_empty('actor')
+            assert data.is_empty('actor')
+            assert sink.total()['calls'] == 1
+
+            data.insert('actor', [{'_id': '1', 'name': 'actor1'}])
+
+            assert not data.is_empty('actor')
+            assert data.exists('actor', {'name': 'actor1'}, cache=False)
+            assert sink.total()['calls'] == 4
+
+
+def test_is_empty_soft_deleted(memory_app):
+    """Test to ensure soft deleted documents keep a resource from being empty, unless it has a datasource filter
+
+    :param memory_app: Eve server factory
+    :raises: AssertionError
+    """
+
+    server = memory_app({
+        'actor': {'soft_delete': True, 'schema': {'_id': {'type': 'string'}, 'name': {'type': 'string'}}},
+        'star': {
+            'soft_delete': True,
+            'datasource': {'source': 'actor', 'filter': {'name': 'star'}},
+            'schema': {'_id': {'type': 'string'}, 'name': {'type': 'string'}}
+        }
+    })
+
+    with server.app_context():
+        data = server.data
+        data.insert('actor', [{'_id': '1', 'name': 'star', '_deleted': True}])
+
+        assert not data.is_empty('actor')
+        assert data.is_empty('star')
+        assert not data.exists('actor', {'name': 'star'})
+
+
+def test_is_empty_error(probe_server: Eve, monkeypatch):
+    """Test to ensure failed emptiness probes abort with a 400, and failed existence probes with a 500
+
+    :param Eve probe_server: Eve server
+    :param monkeypatch: Monkeypatch fixture
+    :raises: AssertionError
+    """
+
+    def fail(*_args, **_kwargs):
+        raise ClientError({'Error': {'Code': 'ValidationException', 'Message': 'invalid'}}, 'Scan')
+
+    monkeypatch.setattr(probe_server.data, '_probe', fail)
+
+    with probe_server.app_context():
+        with pytest.raises(HTTPException) as error:
+            probe_server.data.is_empty('actor')
+
+        assert error.value.code == 400
+
+        with pytest.raises(HTTPException) as error:
+            probe_server.data.exists('actor', {'name': 'actor1'})
+
+        assert error.value.code == 500
+
+
+@pytest.mark.parametrize(('resource', 'document', 'document_id', 'valid'), (
+        ('actor', {'name': 'actor1'}, None, False),
+        ('actor', {'name': 'actor1'}, '1', True),
+        ('actor', {'name': 'actor2'}, None, True),
+        ('movie', {'actor': '1'}, None, True),
+        ('movie', {'actor': '2'}, None, False)
+))
+def test_validation(probe_server: Eve, resource: str, document: dict, document_id: str, valid: bool):
+    """Test to ensure unique values and data relations are checked with existence probes
+
+    :param Eve probe_server: Eve server
+    :param str resource: Resource name
+    :param dict document: Document
+    :param str document_id: Identifier of the document being updated
+    :param bool valid: Whether the document is valid
+    :raises: AssertionError
+    """
+
+    with probe_server.test_request_context():
+        probe_server.data.insert('actor', [{'_id': '1', 'name': 'actor1'}])
+        validator = ValidatorDynamoDB(probe_server.config['DOMAIN'][resource]['schema'], resource=resource)
+        validator.document_id = document_id
+
+        assert validator.validate(document) is valid
@@ -0,0 +1,75 @@
+"""test_explain
+
+.. codeauthor:: John Lane <john.lane93@gmail.com>
+
+"""
+
+import logging
+from eve import Eve
+import pytest
+from eve_dynamodb.explain import Explain, SlowOperationLog
+from eve_dynamodb.instrumentation import OperationStats
+from eve_dynamodb.planner import Plan
+
+
+def explained(latency: float, scanned: int, returned: int) -> Explain:
+    """Build an explanation of a read with a known cost
+
+    :param float latency: Latency in seconds
+    :param int scanned: Items scanned
+    :param int returned: Items returned
+    :return: Explanation
+    :rtype: Explain
+    """
+
+    explain = Explain('actor', 'find', Plan('Scan', 'actor'))
+    explain.sink(OperationStats('actor', 'Scan', latency=latency, scanned=scanned, returned=returned))
+    explain.latency = latency
+    return explain
+
+
+@pytest.mark.parametrize(('latency', 'scanned', 'returned', 'slow'), (
+        (0.01, 10, 10, False),
+        (0.5, 10, 10, True),
+        (0.01, 1000, 10, True),
+        (0.01, 50, 0, True)
+))
+def test_slow_operation_log(caplog, latency: float, scanned: int, returned: int, slow: bool):
+    """Test to ensure reads crossing a latency or scanned to returned threshold are logged
+
+    :param caplog: Log capture fixture
+    :param float latency: Latency in seconds
+    :param int scanned: Items scanned
+    :param int returned: Items returned
+    :param bool slow: Whether the read should be logged
+    :raises: AssertionError
+    """
+
+    log = SlowOperationLog(latency=0.1, ratio=20)
+
+    with caplog.at_level(logging.WARNING, logger='eve_dynamodb'):
+        log(explained(latency, scanned, returned))
+
+    assert ('Slow DynamoDB operation' in caplog.text) == slow
+
+
+def test_explain_parameter(memory_server: Eve):
+    """Test to ensure the explain query parameter adds the plan and its cost to the payload in debug mode
+
+    :param Eve memory_server: Eve server using the memory driver
+    :raises: AssertionError
+    """
+
+    memory_server.config['DEBUG'] = True
+
+    with memory_server.app_context():
+        memory_server.data.insert('actor', [{'_id': str(i), 'name': f"actor{i}"} for i in range(5)])
+
+    payload = memory_server.test_client().get('/actor?explain=1').get_json()
+    item = memory_server.test_client().get('/actor/1?explain=1').get_json()
+
+    assert payload['_explain'][0]['access_path'] == 'Scan'
+    assert payload['_explain'][0]['calls'] == 2
+    assert payload['_explain'][0]['scanned'] == payload['_explain'][0]['returned'] == 10
+    assert item['_explain'][0]['access_path'] == 'GetItem'
+    assert '_explain' not in memory_server.test_client().get('/actor').get_json()
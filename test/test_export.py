@@ -0,0 +1,171 @@
+"""test_export
+
+.. codeauthor:: John Lane <john.lane93@gmail.com>
+
+"""
+
+import csv
+from decimal import Decimal
+import itertools
+import os
+from boto3.dynamodb.types import Binary
+from eve import Eve
+import pytest
+import simplejson as json
+from eve_dynamodb.export import decode_key, encode_key, main, plain
+
+
+@pytest.mark.parametrize(('value', 'schema', 'expected'), (
+        (Decimal('3'), None, 3),
+        (Decimal('1.5'), None, Decimal('1.5')),
+        (Decimal('2'), {'type': 'float'}, 2.0),
+        ({Decimal('2'), Decimal('1')}, None, [1, 2]),
+        (Binary(b'ab'), None, 'YWI='),
+        ({'a': [Decimal('1')]}, {'type': 'dict', 'schema': {'a': {'type': 'list', 'schema': {'type': 'float'}}}},
+         {'a': [1.0]})
+))
+def test_plain(value, schema: dict, expected):
+    """Test to ensure DynamoDB values are converted following their schema
+
+    :param value: DynamoDB value
+    :param dict schema: Field schema
+    :param expected: Expected value
+    :raises: AssertionError
+    """
+
+    assert plain(value, schema) == expected
+
+
+def test_key_encoding():
+    """Test to ensure checkpointed keys survive a JSON round trip
+
+    :raises: AssertionError
+    """
+
+    key = {'a': 'x', 'b': Decimal('1.5'), 'c': Binary(b'\x00')}
+
+    assert decode_key(json.loads(json.dumps(encode_key(key)))) == key
+
+
+@pytest.fixture()
+def export_server(memory_app) -> Eve:
+    """Returns an Eve server exposing exports, holding 50 actors
+
+    :param memory_app: Eve server factory
+    :return: Eve server
+    :rtype: Eve
+    """
+
+    server = memory_app({
+        'actor': {'schema': {'_id': {'type': 'string'}, 'name': {'type': 'string'}, 'rating': {'type': 'integer'}}}
+    }, DYNAMODB_EXPORT_URL='export')
+
+    with server.app_context():
+        server.data.insert('actor', [{'_id': f"{i:02d}", 'name': f"actor{i}", 'rating': i % 5} for i in range(50)])
+
+    return server
+
+
+def test_stream(export_server: Eve):
+    """Test to ensure every item is streamed once, as NDJSON
+
+    :param Eve export_server: Eve server
+    :raises: AssertionError
+    """
+
+    with export_server.app_context():
+        exporter = export_server.data.export('actor', segments=4)
+        exporter.arguments['Limit'] = 3
+        lines = ''.join(exporter.stream()).splitlines()
+
+    items = [json.loads(line) for line in lines]
+
+    assert sorted(item['_id'] for item in items) == [f"{i:02d}" for i in range(50)]
+    assert all(isinstance(item['rating'], int) for item in items)
+    assert exporter.exported == 50
+
+
+def test_resume(export_server: Eve, tmp_path):
+    """Test to ensure an interrupted export resumes from its checkpoint without losing or repeating items
+
+    :param Eve export_server: Eve server
+    :param tmp_path: Temporary directory
+    :raises: AssertionError
+    """
+
+    output, checkpoint = str(tmp_path / 'actor.csv'), str(tmp_path / 'actor.checkpoint')
+    calls = itertools.count()
+
+    with export_server.app_context():
+        exporter = export_server.data.export('actor', 'csv', segments=3)
+        scan = exporter.scan
+        exporter.arguments['Limit'] = 4
+
+        def failing_scan(**kwargs):
+            if next(calls) == 6:
+                raise RuntimeError("connection reset")
+
+            return scan(**kwargs)
+
+        exporter.scan = failing_scan
+
+        with pytest.raises(RuntimeError):
+            exporter.write(output, checkpoint)
+
+        assert os.path.exists(checkpoint)
+
+        exporter = export_server.data.export('actor', 'csv', segments=3)
+        exporter.arguments['Limit'] = 4
+        exporter.write(output, checkpoint)
+
+    with open(output, encoding='utf-8') as file:
+        rows = list(csv.DictReader(file))
+
+    assert sorted(row['_id'] for row in rows) == [f"{i:02d}" for i in range(50)]
+    assert not os.path.exists(checkpoint)
+
+    with pytest.raises(ValueError):
+        with export_server.app_context():
+            with open(checkpoint, 'w', encoding='utf-8') as file:
+                json.dump({'format': 'ndjson', 'segments': 3, 'offset': 0, 'positions': {}}, file)
+
+            export_server.data.export('actor', 'csv', segments=3).write(output, checkpoint)
+
+
+@pytest.mark.parametrize(('query', 'status', 'mimetype', 'lines'), (
+        ('?format=csv&segments=2', 200, 'text/csv', 51),
+        ('', 200, 'application/x-ndjson', 50),
+        ('?format=xml', 400, 'application/json', None)
+))
+def test_export_route(export_server: Eve, query: str, status: int, mimetype: str, lines: int):
+    """Test to ensure the export route streams the requested format
+
+    :param Eve export_server: Eve server
+    :param str query: Query string
+    :param int status: Expected status code
+    :param str mimetype: Expected media type
+    :param int lines: Expected lines
+    :raises: AssertionError
+    """
+
+    response = export_server.test_client().get(f"/export/actor{query}")
+
+    assert response.status_code == status
+    assert response.mimetype == mimetype
+    assert lines is None or len(response.get_data(as_text=True).splitlines()) == lines
+
+
+def test_cli(tmp_path, capsys):
+    """Test to ensure the command line exports a resource
+
+    :param tmp_path: Temporary directory
+    :param capsys: Captured output
+    :raises: AssertionError
+    """
+
+    settings = tmp_path / 'settings.py'
+    settings.write_text("DYNAMODB_DRIVER = 'memory'\nDOMAIN = {'actor': {'schema': {'_id': {'type': 'string'}}}}\n")
+
+    assert main([str(settings), 'actor', str(tmp_path / 'actor.ndjson')]) == 0
+    assert capsys.readouterr().err == "Exported 0 items\n"
+    assert (tmp_path / 'actor.ndjson').read_text() == ''
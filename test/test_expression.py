@@ -6,7 +6,9 @@
 
 import pytest
 from boto3.dynamodb.conditions import Attr, Key
-from eve_dynamodb.expression import build_attr_expression, build_key_expression
+from eve_dynamodb.expression import (
+    build_attr_expression, build_key_expression, build_projection_expression, build_update_expression
+)
 
 
 @pytest.mark.parametrize(('query', 'expectation'), (
@@ -152,3 +154,44 @@ def test_compound_expression(query: dict, expectation: Key):
     """
 
     assert build_key_expression(query) == expectation
+
+
+@pytest.mark.parametrize(('fields', 'expectation'), (
+        (['foo'], ('#p0', {'#p0': 'foo'})),
+        (['foo', 'bar'], ('#p0, #p1', {'#p0': 'foo', '#p1': 'bar'})),
+        (['foo.bar', 'foo.baz'], ('#p0.#p1, #p0.#p2', {'#p0': 'foo', '#p1': 'bar', '#p2': 'baz'}))
+))
+def test_projection_expression(fields: list, expectation: tuple):
+    """Test to ensure projection expressions are properly built from field names
+
+    :param list fields: Fields to project
+    :param tuple expectation: Expected expression and attribute names
+    :raises: AssertionError
+    """
+
+    assert build_projection_expression(fields) == expectation
+
+
+def test_update_expression():
+    """Test to ensure update expressions set every field, including nested ones
+
+    :raises: AssertionError
+    """
+
+    assert build_update_expression({'name': 'foo', 'address.city': 'bar'}) == (
+        'SET #u0 = :u0, #u1.#u2 = :u1',
+        {'#u0': 'name', '#u1': 'address', '#u2': 'city'},
+        {':u0': 'foo', ':u1': 'bar'}
+    )
+
+
+def test_update_expression_removes_fields():
+    """Test to ensure update expressions remove fields after setting others
+
+    :raises: AssertionError
+    """
+
+    assert build_update_expression({'_deleted': True}, remove=['_live']) == (
+        'SET #u0 = :u0 REMOVE #u1', {'#u0': '_deleted', '#u1': '_live'}, {':u0': True}
+    )
+    assert build_update_expression({}, remove=['a.b']) == ('REMOVE #u0.#u1', {'#u0': 'a', '#u1': 'b'}, {})
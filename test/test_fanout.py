@@ -0,0 +1,89 @@
+"""test_fanout
+
+.. codeauthor:: John Lane <john.lane93@gmail.com>
+
+"""
+
+from eve import Eve
+from eve.utils import ParsedRequest
+import pytest
+from eve_dynamodb.explain import explanations
+
+
+@pytest.fixture()
+def tenant_server(memory_app) -> Eve:
+    """Returns an Eve server storing orders partitioned by tenant
+
+    :param memory_app: Eve server factory
+    :return: Eve server
+    :rtype: Eve
+    """
+
+    return memory_app({
+        'order': {'schema': {'_id': {'type': 'string'}, 'tenant': {'type': 'string'}, 'total': {'type': 'integer'}}}
+    }, {'order': ['tenant', '_id']}, DYNAMODB_EXPLAIN=True)
+
+
+@pytest.mark.parametrize(('where', 'sort', 'expected', 'access_path', 'scanned'), (
+        ('{"tenant": {"$in": ["a", "c"]}}', '[("_id", -1)]', ['8', '6', '5', '3', '2', '0'], 'Query on table x 2', 12),
+        ('{"tenant": {"$in": ["c", "a"]}, "total": {"$gt": 3}}', '[("tenant", 1)]', ['6', '5', '8'],
+         'Query on table x 2', 12),
+        ('{"$or": [{"tenant": "a", "_id": "3"}, {"tenant": "b", "_id": "1"}, {"tenant": "b", "_id": "2"}]}',
+         '[("_id", 1)]', ['1', '3'], 'BatchGetItem x 3', 2),
+        ('{"$or": [{"tenant": "a"}, {"tenant": "a", "_id": {"$gt": "2"}}]}', '[("_id", 1)]', ['0', '3', '6'],
+         'Query on table', 6),
+        ('{"$or": [{"tenant": "a", "_id": {"$gt": "2"}}, {"tenant": "a", "_id": {"$lt": "7"}}, {"tenant": "b"}]}',
+         '[("_id", 1)]', ['0', '1', '3', '4', '6', '7'], 'Query on table x 2', 12)
+))
+def test_fanout(tenant_server: Eve, where: str, sort: str, expected: list, access_path: str, scanned: int):
+    """Test to ensure filters on a set of partition keys fan out to their keys and keep the requested sort
+
+    :param Eve tenant_server: Eve server
+    :param str where: Filter
+    :param str sort: Requested sort
+    :param list expected: Expected identifiers, in order
+    :param str access_path: Expected access path
+    :param int scanned: Expected items scanned, including the count
+    :raises: AssertionError
+    """
+
+    with tenant_server.app_context():
+        data = tenant_server.data
+        data.insert('order', [{'_id': str(i), 'tenant': 'abc'[i % 3], 'total': i} for i in range(9)])
+
+        req = ParsedRequest()
+        req.where, req.sort = where, sort
+        items, count = data.find('order', req)
+        explanation = explanations()[-1]
+
+        assert [item['_id'] for item in items] == expected
+        assert count == len(expected)
+        assert explanation['access_path'] == access_path
+        assert explanation['scanned'] == scanned
+
+
+def test_fanout_projection(tenant_server: Eve):
+    """Test to ensure fanned out reads return only the projected fields, including the field they are merged on
+
+    :param Eve tenant_server: Eve server
+    :raises: AssertionError
+    """
+
+    with tenant_server.app_context():
+        data = tenant_server.data
+        data.insert('order', [{'_id': str(i), 'tenant': 'abc'[i % 3], 'total': i} for i in range(9)])
+
+        req = ParsedRequest()
+        req.where = '{"$or": [{"tenant": "a", "_id": "3"}, {"tenant": "b", "_id": "1"}]}'
+        req.projection = '{"total": 1}'
+        items, _ = data.find('order', req)
+
+        assert sorted(item['total'] for item in items) == [1, 3]
+        assert all('tenant' not in item for item in items)
+
+        plan = data._plan('order', 'order', {'tenant': {'$in': ['a', 'c']}}, ['total'], [('_id', -1)])
+        items = list(data._read(data._table('order'), plan, projection=['total']))
+
+        assert plan.merge == ('_id', -1)
+        assert [item['total'] for item in items] == [8, 6, 5, 3, 2, 0]
+        assert all(set(item) == {'total'} for item in items)
@@ -0,0 +1,178 @@
+"""test_hedging
+
+.. codeauthor:: John Lane <john.lane93@gmail.com>
+
+"""
+
+import itertools
+import threading
+import time
+from botocore.exceptions import ClientError
+from eve import Eve
+import pytest
+from eve_dynamodb.hedging import Hedger, LatencyHistogram, backoff, retry_unprocessed
+
+
+def test_histogram():
+    """Test to ensure percentiles are read from the most recent latencies only
+
+    :raises: AssertionError
+    """
+
+    histogram = LatencyHistogram(window=100)
+
+    for latency in [0.001] * 90 + [0.1] * 10:
+        histogram.add(latency)
+
+    assert histogram.percentile(50) == pytest.approx(0.001, rel=0.1)
+    assert histogram.percentile(95) == pytest.approx(0.1, rel=0.1)
+
+    for _ in range(100):
+        histogram.add(0.01)
+
+    assert len(histogram) == 100
+    assert histogram.percentile(99) == pytest.approx(0.01, rel=0.1)
+
+
+@pytest.mark.parametrize(('failures', 'max_attempts', 'deadline', 'error'), (
+        (0, 3, None, None),
+        (2, 3, None, None),
+        (3, 3, None, 'ProvisionedThroughputExceededException'),
+        (1, 3, 0.0, 'DeadlineExceeded')
+))
+def test_retry_unprocessed(failures: int, max_attempts: int, deadline: float, error: str):
+    """Test to ensure unprocessed batch requests are resent a bounded number of times, within the deadline
+
+    :param int failures: Calls leaving a key unprocessed
+    :param int max_attempts: Most calls made
+    :param float deadline: Seconds left before the deadline, None without one
+    :param str error: Expected error code, None if every key is processed
+    :raises: AssertionError
+    """
+
+    calls = []
+
+    def batch_get_item(RequestItems: dict) -> dict:  # pylint: disable=invalid-name
+        calls.append(RequestItems)
+        keys = RequestItems['t']['Keys']
+
+        if len(calls) <= failures:
+            return {'Responses': {'t': keys[1:]}, 'UnprocessedKeys': {'t': {'Keys': keys[:1]}}}
+
+        return {'Responses': {'t': keys}, 'UnprocessedKeys': {}}
+
+    responses = retry_unprocessed(
+        batch_get_item, {'t': {'Keys': [1, 2, 3]}}, 'UnprocessedKeys', 'BatchGetItem', max_attempts, base=0.001,
+        deadline=None if deadline is None else time.monotonic() + deadline
+    )
+
+    if error:
+        with pytest.raises(ClientError) as e:
+            list(responses)
+
+        assert e.value.response['Error']['Code'] == error
+    else:
+        assert sorted(key for response in responses for key in response['Responses']['t']) == [1, 2, 3]
+        assert len(calls) == failures + 1
+
+    assert all(0 <= backoff(attempt, 0.1, 1.0) <= min(1.0, 0.1 * 2 ** attempt) for attempt in range(10))
+
+
+def test_hedge():
+    """Test to ensure a read slower than the hedging percentile is sent again and the first response wins
+
+    :raises: AssertionError
+    """
+
+    hedger = Hedger(percentile=90, min_samples=5)
+    calls = itertools.count()
+
+    def read():
+        if next(calls) == 0:
+            time.sleep(0.5)
+            return 'slow'
+
+        return 'fast'
+
+    for _ in range(5):
+        hedger.histogram(('actor', 'GetItem')).add(0.002)
+
+    started = time.perf_counter()
+
+    assert hedger.call(('actor', 'GetItem'), read) == 'fast'
+    assert time.perf_counter() - started < 0.4
+    assert (hedger.hedged, hedger.won) == (1, 1)
+
+
+def test_deadline():
+    """Test to ensure a hedged read is abandoned once its deadline passes
+
+    :raises: AssertionError
+    """
+
+    hedger = Hedger(percentile=99)
+
+    with pytest.raises(ClientError) as error:
+        hedger.call(('actor', 'Query'), lambda: time.sleep(0.5), time.monotonic() + 0.02)
+
+    assert error.value.response['Error']['Code'] == 'DeadlineExceeded'
+
+    with pytest.raises(ClientError):
+        hedger.call(('actor', 'Query'), lambda: 'never sent', time.monotonic())
+
+
+def test_inline():
+    """Test to ensure reads run on the calling thread when hedging is disabled, and are not sent past the deadline
+
+    :raises: AssertionError
+    """
+
+    hedger = Hedger()
+
+    assert hedger.call(('actor', 'Query'), threading.get_ident, time.monotonic() + 5) == threading.get_ident()
+    assert hedger._pool is None
+
+    with pytest.raises(ClientError) as error:
+        hedger.call(('actor', 'Query'), lambda: 'never sent', time.monotonic())
+
+    assert error.value.response['Error']['Code'] == 'DeadlineExceeded'
+
+
+@pytest.mark.parametrize(('headers', 'status'), (({}, 200), ({'X-Timeout-Ms': '0'}, 500), ({'X-Timeout-Ms': 'x'}, 200)))
+def test_request_deadline(memory_app, headers: dict, status: int):
+    """Test to ensure reads made while serving a request are bounded by the time it has left
+
+    :param memory_app: Eve server factory
+    :param dict headers: Request headers
+    :param int status: Expected status code
+    :raises: AssertionError
+    """
+
+    server = memory_app(
+        {'actor': {'item_url': 'regex("[\\w]+")', 'schema': {'_id': {'type': 'string'}}}},
+        DYNAMODB_DEADLINE_HEADER='X-Timeout-Ms', DYNAMODB_HEDGE_PERCENTILE=99
+    )
+
+    with server.app_context():
+        server.data.insert('actor', [{'_id': 'a'}])
+
+    assert server.test_client().get('/actor/a', headers=headers).status_code == status
+
+
+def test_hedged_reads(memory_server: Eve):
+    """Test to ensure hedged reads return what unhedged ones do
+
+    :param Eve memory_server: Eve server
+    :raises: AssertionError
+    """
+
+    data = memory_server.data
+    data.hedger.percentile, data.hedger.min_samples = 50, 0
+
+    with memory_server.app_context():
+        data.insert('actor', [{'_id': str(i), 'name': f"actor{i}"} for i in range(5)])
+
+        assert data.find_one('actor', None, _id='3')['name'] == 'actor3'
+        assert data.find_one_raw('actor', _id='4')['name'] == 'actor4'
+        assert len(list(data.find_list_of_ids('actor', ['1', '2', 'x']))) == 2
+        assert len(data.hedger.histogram(('actor', 'GetItem'))) >= 2
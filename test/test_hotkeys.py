@@ -0,0 +1,286 @@
+"""test_hotkeys
+
+.. codeauthor:: John Lane <john.lane93@gmail.com>
+
+"""
+
+from eve import Eve
+from eve.utils import ParsedRequest
+import pytest
+from werkzeug.exceptions import HTTPException
+from eve_dynamodb.explain import explanations
+from eve_dynamodb.hotkeys import HotKeys, SpaceSaving, WriteSharding
+from eve_dynamodb.instrumentation import MemorySink
+
+
+def test_space_saving():
+    """Test to ensure the heaviest keys survive evictions and are never underestimated
+
+    :raises: AssertionError
+    """
+
+    sketch = SpaceSaving(4)
+
+    for i in range(200):
+        sketch.add('hot')
+        sketch.add(f"cold{i}")
+
+    assert len(sketch) == 4
+    assert sketch.top(1)[0][0] == 'hot'
+    assert sketch.estimate('hot') >= 200
+    assert sketch.total == 400
+
+    sketch.decay()
+
+    assert sketch.estimate('hot') >= 100
+    assert sketch.total == 200
+
+
+def test_hot_keys():
+    """Test to ensure keys taking a large share of the accesses are reported once, and cool down
+
+    :raises: AssertionError
+    """
+
+    reported = []
+    hot_keys = HotKeys(capacity=8, share=0.5, min_count=10, window=100, notify=lambda *args: reported.append(args))
+
+    for i in range(30):
+        hot_keys.observe('order', None, 'acme')
+        hot_keys.observe('order', None, f"tenant{i}")
+
+    assert [args[:3] for args in reported] == [('order', None, 'acme')]
+    assert hot_keys.is_hot('order', None, 'acme')
+    assert not hot_keys.is_hot('order', 'by_tenant', 'acme')
+    assert [entry['key'] for entry in hot_keys.hot('order')] == ['acme']
+
+    for i in range(300):
+        hot_keys.observe('order', None, f"tenant{i % 3}")
+
+    assert not hot_keys.is_hot('order', None, 'acme')
+    assert not HotKeys(capacity=0).observe('order', None, 'acme')
+
+
+SHARDING = WriteSharding('tenant', shards=2, values=['acme'])
+SHARD = SHARDING.shard('acme', '7')
+
+
+@pytest.mark.parametrize(('query', 'expected'), (
+        ({'tenant': 'acme'}, {'tenant': {'$in': ['acme\x1f0', 'acme\x1f1']}}),
+        ({'tenant': 'other'}, {'tenant': 'other'}),
+        ({'tenant': 'acme', '_id': '7'}, {'$and': [{'tenant': SHARD}, {'_id': '7'}]}),
+        ({'tenant': {'$in': ['acme', 'other']}}, {'tenant': {'$in': ['acme\x1f0', 'acme\x1f1', 'other']}}),
+        ({'tenant': {'$ne': 'acme'}}, {'tenant': {'$nin': ['acme\x1f0', 'acme\x1f1']}}),
+        ({'tenant': {'$ne': 'other'}}, {'tenant': {'$ne': 'other'}}),
+        ({'tenant': {'$nin': ['acme', 'other']}, '_id': '7'},
+         {'$and': [{'tenant': {'$nin': ['acme\x1f0', 'acme\x1f1', 'other']}}, {'_id': '7'}]}),
+        ({'tenant': {'$exists': True, '$eq': 'acme'}},
+         {'tenant': {'$exists': True, '$in': ['acme\x1f0', 'acme\x1f1']}}),
+        ({'$nor': [{'tenant': 'acme'}]}, {'$nor': [{'tenant': {'$in': ['acme\x1f0', 'acme\x1f1']}}]}),
+        ({'$or': [{'tenant': 'acme', '_id': '7'}, {'tenant': 'other'}]},
+         {'$or': [{'$and': [{'tenant': SHARD}, {'_id': '7'}]}, {'tenant': 'other'}]})
+))
+def test_rewrite(query: dict, expected: dict):
+    """Test to ensure filters on sharded values are rewritten into filters on their shards
+
+    :param dict query: Query
+    :param dict expected: Rewritten query
+    :raises: AssertionError
+    """
+
+    assert SHARDING.rewrite(query) == expected
+
+
+@pytest.mark.parametrize('query', [
+    {'tenant': {'$gt': 'a'}}, {'tenant': {'$startsWith': 'ac'}}, {'$or': [{'tenant': {'$between': ['a', 'b']}}]}
+])
+def test_rewrite_unsupported(query: dict):
+    """Test to ensure comparisons the stored values cannot answer are rejected
+
+    :param dict query: Query
+    :raises: AssertionError
+    """
+
+    with pytest.raises(ValueError):
+        SHARDING.rewrite(query)
+
+
+@pytest.mark.parametrize(('stored', 'expected'), (
+        ('acme\x1f1', 'acme'),
+        ('acme', 'acme'),
+        ('acme#1', 'acme#1'),
+        ('other\x1f1', 'other\x1f1'),
+        ('acme\x1fx', 'acme\x1fx'),
+        (3, 3)
+))
+def test_restore(stored, expected):
+    """Test to ensure stored values are restored to their natural value
+
+    :param stored: Stored value
+    :param expected: Natural value
+    :raises: AssertionError
+    """
+
+    assert SHARDING.restore(stored) == expected
+
+
+@pytest.fixture()
+def hot_server(memory_app) -> Eve:
+    """Returns an Eve server sharding the writes of a hot tenant, reporting hot keys to a memory sink
+
+    :param memory_app: Eve server factory
+    :return: Eve server
+    :rtype: Eve
+    """
+
+    return memory_app({
+        'order': {
+            'schema': {'_id': {'type': 'string'}, 'tenant': {'type': 'string'}, 'total': {'type': 'integer'}},
+            'write_sharding': {'attribute': 'tenant', 'shards': 4, 'values': ['acme']}
+        },
+        'actor': {
+            'schema': {'_id': {'type': 'string'}, 'name': {'type': 'string'}},
+            'hot_key_cache_ttl': 60
+        },
+        'account': {
+            'schema': {'_id': {'type': 'string'}, 'region': {'type': 'string'}},
+            'write_sharding': {'attribute': 'region', 'shards': 4}
+        }
+    }, {'order': ['tenant', '_id']}, DYNAMODB_EXPLAIN=True, DYNAMODB_IDENTITY_MAP=False, DYNAMODB_HOT_KEY_MIN_COUNT=10,
+        DYNAMODB_HOT_KEY_SHARE=0.5, DYNAMODB_INSTRUMENTATION_SINKS=[MemorySink()])
+
+
+def test_write_sharding(hot_server: Eve):
+    """Test to ensure writes of a sharded value spread over its shards, and reads gather them back
+
+    :param Eve hot_server: Eve server
+    :raises: AssertionError
+    """
+
+    with hot_server.app_context():
+        data = hot_server.data
+        data.insert('order', [{'_id': f"{i:02d}", 'tenant': 'acme', 'total': i} for i in range(20)])
+        data.insert('order', [{'_id': f"{i:02d}", 'tenant': 'other', 'total': i} for i in range(5)])
+        stored = {item['tenant'] for item in data.driver.Table('order').scan()['Items']}
+
+        req = ParsedRequest()
+        req.where, req.sort = '{"tenant": "acme"}', '[("_id", -1)]'
+        items, count = data.find('order', req)
+
+        assert 'acme' not in stored and len(stored - {'other'}) > 1
+        assert [item['_id'] for item in items] == [f"{i:02d}" for i in reversed(range(20))]
+        assert {item['tenant'] for item in items} == {'acme'} and count == 20
+        assert explanations()[-1]['access_path'] == 'Query on table x 4'
+
+        document = data.find_one('order', None, tenant='acme', _id='07')
+
+        assert document['tenant'] == 'acme' and document['total'] == 7
+        assert explanations()[-1]['access_path'] == 'GetItem'
+
+        groups = data.aggregate('order', [{'$group': {'_id': '$tenant', 'count': {'$sum': 1}}}], {})
+
+        assert sorted((group['_id'], group['count']) for group in groups) == [('acme', 20), ('other', 5)]
+        assert ''.join(data.export('order', segments=2).stream()).count('"acme"') == 20
+
+
+def test_sharded_writes(hot_server: Eve):
+    """Test to ensure items stored under a sharded partition key can be read raw, updated, replaced and removed
+
+    :param Eve hot_server: Eve server
+    :raises: AssertionError
+    """
+
+    with hot_server.app_context():
+        data = hot_server.data
+        data.insert('order', [{'_id': f"{i:02d}", 'tenant': 'acme', 'total': i} for i in range(4)])
+        original = data.find_one_raw('order', _id='01')
+
+        assert original == {'_id': '01', 'tenant': 'acme', 'total': 1}
+
+        data.update('order', '01', {'tenant': 'acme', 'total': 10}, original)
+
+        assert data.find_one_raw('order', _id='01', tenant='acme')['total'] == 10
+
+        data.replace('order', '02', {'tenant': 'acme', 'total': 20}, data.find_one_raw('order', _id='02'))
+
+        assert data.find_one_raw('order', _id='02')['total'] == 20
+
+        data.remove('order', {'_id': '03'})
+
+        assert data.find_one_raw('order', _id='03') is None
+        assert sorted(item['_id'] for item in data.driver.Table('order').scan()['Items']) == ['00', '01', '02']
+
+
+def test_negated_filters(hot_server: Eve):
+    """Test to ensure negated filters on a sharded value exclude its shards, and range filters are rejected
+
+    :param Eve hot_server: Eve server
+    :raises: AssertionError
+    """
+
+    with hot_server.app_context():
+        data = hot_server.data
+        data.insert('order', [{'_id': f"{i:02d}", 'tenant': 'acme', 'total': i} for i in range(8)])
+        data.insert('order', [{'_id': f"{i:02d}", 'tenant': 'other', 'total': i} for i in range(3)])
+
+        for where in ('{"tenant": {"$ne": "acme"}}', '{"tenant": {"$nin": ["acme"]}}'):
+            req = ParsedRequest()
+            req.where = where
+            items, count = data.find('order', req)
+
+            assert {item['tenant'] for item in items} == {'other'} and count == 3
+
+        req = ParsedRequest()
+        req.where = '{"tenant": {"$gt": "a"}}'
+
+        with pytest.raises(HTTPException) as error:
+            data.find('order', req)
+
+        assert error.value.code == 400
+
+
+def test_hot_key_cache(hot_server: Eve):
+    """Test to ensure hot partition keys are reported, and their reads cached until the table is written
+
+    :param Eve hot_server: Eve server
+    :raises: AssertionError
+    """
+
+    sink = hot_server.config['DYNAMODB_INSTRUMENTATION_SINKS'][0]
+
+    with hot_server.app_context():
+        data = hot_server.data
+        data.insert('actor', [{'_id': 'star', 'name': 'star'}, {'_id': 'extra', 'name': 'extra'}])
+
+        for _ in range(20):
+            assert data.find_one('actor', None, _id='star')['name'] == 'star'
+
+        calls = sink.snapshot()[('actor', 'GetItem')]['calls']
+        data.find_one('actor', None, _id='star')
+
+        assert ('actor', None, 'star') in sink.hot_keys()
+        assert sink.snapshot()[('actor', 'GetItem')]['calls'] == calls
+
+        data.replace('actor', 'star', {'name': 'renamed'}, {})
+
+        assert data.find_one('actor', None, _id='star')['name'] == 'renamed'
+        assert sink.snapshot()[('actor', 'GetItem')]['calls'] == calls + 1
+
+
+def test_find_one_raw(hot_server: Eve):
+    """Test to ensure raw reads return the natural value of a sharded attribute, also when written before sharding
+
+    :param Eve hot_server: Eve server
+    :raises: AssertionError
+    """
+
+    with hot_server.app_context():
+        data = hot_server.data
+        data.insert('account', [{'_id': '1', 'region': 'eu'}])
+
+        assert data.driver.Table('account').get_item(Key={'_id': '1'})['Item']['region'].startswith('eu\x1f')
+        assert data.find_one_raw('account', _id='1') == {'_id': '1', 'region': 'eu'}
+
+        data.driver.Table('account').put_item(Item={'_id': '2', 'region': 'eu#1'})
+
+        assert data.find_one_raw('account', _id='2') == {'_id': '2', 'region': 'eu#1'}
@@ -0,0 +1,83 @@
+"""test_identity
+
+.. codeauthor:: John Lane <john.lane93@gmail.com>
+
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+from flask import Flask
+from eve_dynamodb.identity import MISSING, SingleFlight, identity_map
+
+
+def test_identity_map_is_request_scoped():
+    """Test to ensure each application context gets its own identity map
+
+    :raises: AssertionError
+    """
+
+    app = Flask(__name__)
+
+    with app.app_context():
+        identity_map().put('actor', {'_id': '1'}, {'_id': '1', 'name': 'Oprah'})
+        identity_map().put('actor', {'_id': '2'}, None)
+
+        assert identity_map().get('actor', {'_id': '1'}) == {'_id': '1', 'name': 'Oprah'}
+        assert identity_map().get('actor', {'_id': '2'}) is None
+        assert identity_map().get('actor', {'_id': '3'}) is MISSING
+
+    with app.app_context():
+        assert identity_map().get('actor', {'_id': '1'}) is MISSING
+
+    assert identity_map() is None
+
+
+def test_identity_map_returns_copies():
+    """Test to ensure callers mutating a returned item do not alter the identity map
+
+    :raises: AssertionError
+    """
+
+    with Flask(__name__).app_context():
+        identity_map().put('actor', {'_id': '1'}, {'_id': '1', 'name': 'Oprah'})
+        identity_map().get('actor', {'_id': '1'})['name'] = 'Beyonce'
+
+        assert identity_map().get('actor', {'_id': '1'})['name'] == 'Oprah'
+
+        identity_map().invalidate('actor', {'_id': '1'})
+        assert identity_map().get('actor', {'_id': '1'}) is MISSING
+
+
+def test_single_flight_coalesces_concurrent_calls():
+    """Test to ensure concurrent identical calls are performed once
+
+    :raises: AssertionError
+    """
+
+    flights = SingleFlight()
+    release = threading.Event()
+    entered = threading.Semaphore(0)
+    calls = []
+
+    def call():
+        calls.append(1)
+        release.wait(5)
+        return {'_id': '1'}
+
+    def read():
+        entered.release()
+        return flights.do('key', call)
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        futures = [pool.submit(read) for _ in range(4)]
+
+        for _ in range(4):
+            entered.acquire()
+
+        time.sleep(0.1)
+        release.set()
+        results = [future.result() for future in futures]
+
+    assert results == [{'_id': '1'}] * 4
+    assert len(calls) == 1
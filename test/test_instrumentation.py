@@ -0,0 +1,169 @@
+"""test_instrumentation
+
+.. codeauthor:: John Lane <john.lane93@gmail.com>
+
+"""
+
+from eve_dynamodb.instrumentation import (
+    Instrumentation, InstrumentedTable, MemorySink, OperationStats, StatsdSink, consumed_capacity
+)
+
+
+class ScanningTable:
+    """Table stand-in answering scans with a fixed page
+    """
+
+    name = 'actor'
+
+    def __init__(self):
+        self.calls = []
+
+    def scan(self, **kwargs) -> dict:
+        """Return a single page, reporting the consumed capacity when asked to
+
+        :param dict kwargs: Scan arguments
+        :return: Scan response
+        :rtype: dict
+        """
+
+        self.calls.append(kwargs)
+        response = {'Items': [{'_id': '1'}], 'Count': 1, 'ScannedCount': 4}
+
+        if kwargs.get('ReturnConsumedCapacity') == 'INDEXES':
+            response['ConsumedCapacity'] = {'TableName': 'actor', 'CapacityUnits': 0.5}
+
+        return response
+
+
+def test_consumed_capacity():
+    """Test to ensure consumed capacity is totalled across tables and indexes
+
+    :raises: AssertionError
+    """
+
+    response = {'ConsumedCapacity': [
+        {'CapacityUnits': 2.0, 'GlobalSecondaryIndexes': {'by_name': {'CapacityUnits': 1.0}}},
+        {'CapacityUnits': 1.5}
+    ]}
+
+    assert consumed_capacity(response) == (3.5, {'by_name': 1.0})
+    assert consumed_capacity({}) == (0.0, {})
+
+
+def test_instrumented_table_records_calls():
+    """Test to ensure instrumented calls request and record their cost
+
+    :raises: AssertionError
+    """
+
+    sink = MemorySink()
+    table = ScanningTable()
+    instrumented = InstrumentedTable(table, Instrumentation([sink]))
+
+    assert instrumented.scan(Limit=10)['Count'] == 1
+    instrumented.scan()
+
+    assert table.calls[0] == {'Limit': 10, 'ReturnConsumedCapacity': 'INDEXES'}
+    totals = sink.snapshot()[('actor', 'Scan')]
+    assert (totals['calls'], totals['pages'], totals['scanned'], totals['returned'], totals['capacity']) == (
+        2, 2, 8, 2, 1.0
+    )
+
+
+def test_disabled_instrumentation_passes_through():
+    """Test to ensure calls are untouched when nothing is recorded
+
+    :raises: AssertionError
+    """
+
+    table = ScanningTable()
+    Instrumentation().call('actor', 'Scan', table.scan, Limit=1)
+
+    assert table.calls == [{'Limit': 1}]
+
+
+def test_statsd_metrics():
+    """Test to ensure stats are formatted as StatsD metrics
+
+    :raises: AssertionError
+    """
+
+    stats = OperationStats('actor', 'Query', latency=0.002, scanned=3, returned=2, size=10, capacity=0.5)
+
+    assert StatsdSink(prefix='api').metrics(stats) == [
+        'api.actor.Query.latency:2.000|ms',
+        'api.actor.Query.calls:1|c',
+        'api.actor.Query.pages:1|c',
+        'api.actor.Query.scanned:3|c',
+        'api.actor.Query.returned:2|c',
+        'api.actor.Query.bytes:10|c',
+        'api.actor.Query.capacity:0.5|c'
+    ]
+
+
+def test_batch_writer_records_capacity():
+    """Test to ensure batch writes request and record their consumed capacity, resending unprocessed items
+
+    :raises: AssertionError
+    """
+
+    calls = []
+
+    def batch_write(request: dict):
+        calls.append(request['actor'])
+        unprocessed = {'actor': request['actor'][:1]} if len(calls) == 1 else {}
+        yield {'UnprocessedItems': unprocessed, 'ConsumedCapacity': [{'CapacityUnits': len(request['actor'])}]}
+
+        if unprocessed:
+            calls.append(unprocessed['actor'])
+            yield {'UnprocessedItems': {}, 'ConsumedCapacity': [{'CapacityUnits': 1.0}]}
+
+    sink = MemorySink()
+    instrumented = InstrumentedTable(ScanningTable(), Instrumentation([sink]), batch_write)
+
+    with instrumented.batch_writer() as batch:
+        for i in range(30):
+            batch.put_item(Item={'_id': str(i)})
+
+        batch.delete_item(Key={'_id': '0'})
+
+    totals = sink.snapshot()[('actor', 'BatchWriteItem')]
+
+    assert [len(requests) for requests in calls] == [25, 1, 6]
+    assert (totals['calls'], totals['pages'], totals['returned'], totals['capacity']) == (1, 3, 31, 32.0)
+
+
+def test_insert_records_capacity(memory_server):
+    """Test to ensure inserted documents report the write capacity they consumed
+
+    :param memory_server: Eve server
+    :raises: AssertionError
+    """
+
+    sink = MemorySink()
+
+    with memory_server.app_context(), memory_server.data.instrumentation.capture(sink):
+        memory_server.data.insert('actor', [{'_id': str(i), 'name': f"actor{i}"} for i in range(30)])
+
+    assert sink.snapshot()[('actor', 'BatchWriteItem')]['capacity'] == 30.0
+
+
+def test_parallel_aggregate_records_scans(memory_server):
+    """Test to ensure the segments of a parallel aggregation are recorded as if scanned from the calling thread
+
+    :param memory_server: Eve server
+    :raises: AssertionError
+    """
+
+    sink = MemorySink()
+
+    with memory_server.app_context():
+        memory_server.data.insert('actor', [{'_id': str(i), 'name': f"actor{i}"} for i in range(10)])
+
+        with memory_server.data.instrumentation.capture(sink):
+            groups = memory_server.data.aggregate('actor', [{'$group': {'_id': None, 'count': {'$sum': 1}}}], {
+                'segments': 3
+            })
+
+    assert [group['count'] for group in groups] == [10]
+    assert sink.snapshot()[('actor', 'Scan')]['calls'] == 3
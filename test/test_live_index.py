@@ -0,0 +1,59 @@
+"""test_live_index
+
+.. codeauthor:: John Lane <john.lane93@gmail.com>
+
+"""
+
+from eve import Eve
+from eve.utils import ParsedRequest
+import pytest
+from eve_dynamodb.explain import explanations
+
+
+@pytest.fixture()
+def live_server(memory_app) -> Eve:
+    """Returns an Eve server soft deleting actors and indexing the live ones in a sparse index
+
+    :param memory_app: Eve server factory
+    :return: Eve server
+    :rtype: Eve
+    """
+
+    return memory_app({
+        'actor': {
+            'soft_delete': True,
+            'live_index': {'name': 'live'},
+            'schema': {'_id': {'type': 'string'}, 'name': {'type': 'string'}}
+        }
+    }, {'actor': (['_id'], {'live': ['_live']})}, DYNAMODB_EXPLAIN=True)
+
+
+def test_live_index(live_server: Eve):
+    """Test to ensure live items are read from the sparse index and soft deleted ones leave it
+
+    :param Eve live_server: Eve server
+    :raises: AssertionError
+    """
+
+    with live_server.app_context():
+        data = live_server.data
+        data.insert('actor', [{'_id': str(i), 'name': f"actor{i}", '_deleted': False} for i in range(10)])
+        data.update('actor', '1', {'_deleted': True}, {'_id': '1', '_deleted': False})
+        data.replace('actor', '2', {'name': 'actor2', '_deleted': True}, {'_id': '2', '_deleted': False})
+        data.update('actor', '3', {'_deleted': True}, {'_id': '3', '_deleted': False})
+        data.update('actor', '3', {'_deleted': False}, {'_id': '3', '_deleted': True})
+
+        items, count = data.find('actor', ParsedRequest())
+        explanation = explanations()[-1]
+
+        assert sorted(item['_id'] for item in items) == [str(i) for i in range(10) if i not in (1, 2)]
+        assert count == 8
+        assert all('_live' not in item for item in items)
+        assert explanation['access_path'] == 'Scan on index live'
+        assert explanation['filter'] is None
+        assert explanation['scanned'] == 16
+
+        assert data.find_one('actor', None, _id='1') is None
+        assert '_live' not in data.find_one('actor', None, _id='3')
+        assert data.driver.Table('actor').get_item(Key={'_id': '4'})['Item']['_live'] == '4'
+        assert data.find_one_raw('actor', _id='4') == {'_id': '4', 'name': 'actor4', '_deleted': False}
@@ -0,0 +1,269 @@
+"""test_memory
+
+.. codeauthor:: John Lane <john.lane93@gmail.com>
+
+"""
+
+from decimal import Decimal
+from boto3.dynamodb.conditions import Attr, Key
+from botocore.exceptions import ClientError
+from eve import Eve
+from eve.utils import ParsedRequest
+import pytest
+from eve_dynamodb.memory import MemoryDriver, apply_update, evaluate, project
+
+MOVIES = {
+    'TableName': 'movie',
+    'KeySchema': [{'AttributeName': 'studio', 'KeyType': 'HASH'}, {'AttributeName': 'year', 'KeyType': 'RANGE'}],
+    'AttributeDefinitions': [
+        {'AttributeName': 'studio', 'AttributeType': 'S'}, {'AttributeName': 'year', 'AttributeType': 'N'},
+        {'AttributeName': 'genre', 'AttributeType': 'S'}
+    ],
+    'GlobalSecondaryIndexes': [{
+        'IndexName': 'genre',
+        'KeySchema': [{'AttributeName': 'genre', 'KeyType': 'HASH'}],
+        'Projection': {'ProjectionType': 'KEYS_ONLY'}
+    }]
+}
+
+
+@pytest.fixture()
+def movies():
+    """Returns a memory table holding a few movies
+
+    :return: Movie table
+    :rtype: eve_dynamodb.memory.MemoryTable
+    """
+
+    table = MemoryDriver([MOVIES]).Table('movie')
+
+    for studio in ('a', 'b', 'c'):
+        for year in range(2000, 2010):
+            item = {'studio': studio, 'year': year, 'title': f"{studio}{year}"}
+
+            if year % 2:
+                item['genre'] = 'drama'
+
+            table.put_item(Item=item)
+
+    return table
+
+
+@pytest.mark.parametrize(('condition', 'expected'), (
+        (Attr('a').eq(1), True),
+        (Attr('a').ne(2), True),
+        (Attr('missing').ne(2), True),
+        (Attr('a').eq('1'), False),
+        (Attr('a').between(0, 2), True),
+        (Attr('s').begins_with('he'), True),
+        (Attr('s').contains('ll'), True),
+        (Attr('l').contains(2), True),
+        (Attr('m.n').gt(3), True),
+        (Attr('s').size().eq(5), True),
+        (Attr('a').is_in([2, 3]), False),
+        (Attr('missing').exists(), False),
+        (Attr('missing').not_exists() & Attr('a').lte(1), True),
+        (~Attr('a').eq(1) | Attr('s').attribute_type('S'), True)
+))
+def test_evaluate(condition, expected: bool):
+    """Test to ensure boto3 conditions are evaluated with DynamoDB semantics
+
+    :param condition: Condition
+    :param bool expected: Expected result
+    :raises: AssertionError
+    """
+
+    item = {'a': Decimal(1), 's': 'hello', 'l': [Decimal(1), Decimal(2)], 'm': {'n': Decimal(4)}}
+
+    assert evaluate(condition, item) == expected
+
+
+def test_apply_update():
+    """Test to ensure update expressions are applied to a copy of the item
+
+    :raises: AssertionError
+    """
+
+    item = {'id': '1', 'count': Decimal(1), 'tags': {'a'}, 'old': True, 'list': [Decimal(1)]}
+    updated = apply_update(
+        item, 'SET #c = #c + :one, nested = if_not_exists(nested, :m), list = list_append(list, :l) REMOVE old '
+              'ADD tags :t',
+        {'#c': 'count'}, {':one': Decimal(1), ':m': {'x': Decimal(0)}, ':l': [Decimal(2)], ':t': {'b'}}
+    )
+
+    assert updated == {'id': '1', 'count': 2, 'tags': {'a', 'b'}, 'nested': {'x': 0}, 'list': [1, 2]}
+    assert item['count'] == 1 and item['old'] is True
+
+
+def test_project():
+    """Test to ensure projection expressions keep nested paths
+
+    :raises: AssertionError
+    """
+
+    assert project({'a': 1, 'b': {'c': 2, 'd': 3}}, '#a, b.c', {'#a': 'a'}) == {'a': 1, 'b': {'c': 2}}
+
+
+def test_query_range_and_order(movies):
+    """Test to ensure queries read a single partition in range key order
+
+    :param movies: Movie table
+    :raises: AssertionError
+    """
+
+    page = movies.query(KeyConditionExpression=Key('studio').eq('b') & Key('year').between(2003, 2005),
+                        ScanIndexForward=False)
+
+    assert [item['year'] for item in page['Items']] == [2005, 2004, 2003]
+    assert 'LastEvaluatedKey' not in page
+
+
+def test_sparse_index(movies):
+    """Test to ensure indexes only hold items carrying their keys and apply their projection
+
+    :param movies: Movie table
+    :raises: AssertionError
+    """
+
+    page = movies.query(IndexName='genre', KeyConditionExpression=Key('genre').eq('drama'))
+
+    assert page['Count'] == 15
+    assert set(page['Items'][0].keys()) == {'studio', 'year', 'genre'}
+
+
+@pytest.mark.parametrize('segments', (1, 2, 7))
+def test_scan_pagination_and_segments(movies, segments: int):
+    """Test to ensure paginated, segmented scans read every item exactly once
+
+    :param movies: Movie table
+    :param int segments: Total segments
+    :raises: AssertionError
+    """
+
+    titles = []
+
+    for segment in range(segments):
+        args = {'Limit': 4, 'Segment': segment, 'TotalSegments': segments, 'FilterExpression': Attr('year').gte(2000)}
+
+        while True:
+            page = movies.scan(**args)
+            assert page['ScannedCount'] <= 4
+            titles.extend(item['title'] for item in page['Items'])
+
+            if 'LastEvaluatedKey' not in page:
+                break
+
+            args['ExclusiveStartKey'] = page['LastEvaluatedKey']
+
+    assert sorted(titles) == sorted(f"{studio}{year}" for studio in 'abc' for year in range(2000, 2010))
+
+
+def test_conditional_write_fails(movies):
+    """Test to ensure failed conditions raise the error botocore raises
+
+    :param movies: Movie table
+    :raises: AssertionError
+    """
+
+    with pytest.raises(ClientError) as error:
+        movies.update_item(Key={'studio': 'z', 'year': 1}, UpdateExpression='SET title = :t',
+                           ExpressionAttributeValues={':t': 'x'}, ConditionExpression=Attr('studio').exists())
+
+    assert error.value.response['Error']['Code'] == 'ConditionalCheckFailedException'
+    assert 'Item' not in movies.get_item(Key={'studio': 'z', 'year': 1})
+
+
+def test_batch_get_and_capacity(movies):
+    """Test to ensure batch reads report found items and consumed capacity
+
+    :param movies: Movie table
+    :raises: AssertionError
+    """
+
+    response = movies.driver.batch_get_item(
+        RequestItems={'movie': {'Keys': [{'studio': 'a', 'year': 2000}, {'studio': 'q', 'year': 1}]}},
+        ReturnConsumedCapacity='TOTAL'
+    )
+
+    assert [item['title'] for item in response['Responses']['movie']] == ['a2000']
+    assert response['ConsumedCapacity'] == [{'TableName': 'movie', 'CapacityUnits': 1.0}]
+
+
+def test_unknown_table():
+    """Test to ensure undeclared tables fail unless auto created
+
+    :raises: AssertionError
+    """
+
+    with pytest.raises(ClientError) as error:
+        MemoryDriver().Table('missing').scan()
+
+    assert error.value.response['Error']['Code'] == 'ResourceNotFoundException'
+    assert MemoryDriver(auto_create_key='_id').Table('actor').scan()['Count'] == 0
+
+
+def test_data_layer(memory_server: Eve):
+    """Test to ensure the data layer runs against the memory driver
+
+    :param Eve memory_server: Eve server using the memory driver
+    :raises: AssertionError
+    """
+
+    with memory_server.app_context():
+        memory_server.data.insert('actor', [{'_id': str(i), 'name': f"actor{i}", 'rating': i % 3} for i in range(10)])
+        memory_server.data.update('actor', '1', {'name': 'renamed'}, {'_id': '1'})
+
+        assert memory_server.data.find_one_raw('actor', _id='1')['name'] == 'renamed'
+        assert memory_server.data.find_list_of_ids('actor', ['2', '3']).count() == 2
+
+        memory_server.data.remove('actor', {'_id': '2'})
+
+        assert memory_server.data.find_one_raw('actor', _id='2') is None
+
+
+def test_find_list_of_ids_datasource(memory_server: Eve):
+    """Test to ensure documents looked up by id follow the datasource filter and projection of their resource
+
+    :param Eve memory_server: Eve server using the memory driver
+    :raises: AssertionError
+    """
+
+    with memory_server.app_context():
+        memory_server.data.insert('actor', [
+            {'_id': '1', 'name': 'actor1', 'public': True, 'secret': 'a'},
+            {'_id': '2', 'name': 'actor2', 'public': False, 'secret': 'b'}
+        ])
+        items = list(memory_server.data.find_list_of_ids('public_actor', ['1', '2']))
+
+    assert [item['_id'] for item in items] == ['1']
+    assert items[0]['name'] == 'actor1' and 'public' not in items[0] and 'secret' not in items[0]
+
+
+@pytest.mark.parametrize(('sort', 'page', 'projection', 'expected'), (
+        ('[("name", 1)]', 1, None, ['a', 'b', 'c']),
+        ('[("rating", -1)]', 1, None, ['d', 'a', 'e']),
+        ('[("rating", -1)]', 2, None, ['c', 'b']),
+        ('[("rating", 1), ("name", -1)]', 1, '{"name": 1}', ['b', 'c', 'e'])
+))
+def test_sort_in_memory(memory_server: Eve, sort: str, page: int, projection: str, expected: list):
+    """Test to ensure sorts the access path cannot follow are applied in memory, before paging
+
+    :param Eve memory_server: Eve server using the memory driver
+    :param str sort: Requested sort
+    :param int page: Requested page, of 3 items
+    :param str projection: Requested projection
+    :param list expected: Expected names, in order
+    :raises: AssertionError
+    """
+
+    with memory_server.app_context():
+        memory_server.data.insert('actor', [
+            {'_id': str(i), 'name': name, 'rating': rating}
+            for i, (name, rating) in enumerate(zip('ebacd', [3, 1, 4, 2, 5]))
+        ])
+        req = ParsedRequest()
+        req.sort, req.page, req.max_results, req.projection = sort, page, 3, projection
+        items, _ = memory_server.data.find('actor', req)
+
+    assert [item['name'] for item in items] == expected
+    assert projection is None or all('rating' not in item for item in items)
@@ -0,0 +1,169 @@
+"""test_planner
+
+.. codeauthor:: John Lane <john.lane93@gmail.com>
+
+"""
+
+import pytest
+from eve_dynamodb.planner import Schema, choose_plan, conjuncts, key_conditions
+
+SCHEMA = Schema(
+    [{'AttributeName': 'studio', 'KeyType': 'HASH'}, {'AttributeName': 'year', 'KeyType': 'RANGE'}],
+    [
+        {
+            'IndexName': 'genre',
+            'KeySchema': [
+                {'AttributeName': 'genre', 'KeyType': 'HASH'}, {'AttributeName': 'rating', 'KeyType': 'RANGE'}
+            ],
+            'Projection': {'ProjectionType': 'ALL'}
+        },
+        {
+            'IndexName': 'director',
+            'KeySchema': [{'AttributeName': 'director', 'KeyType': 'HASH'}],
+            'Projection': {'ProjectionType': 'INCLUDE', 'NonKeyAttributes': ['title']}
+        }
+    ]
+)
+
+
+@pytest.mark.parametrize(('query', 'projection', 'single', 'access_path', 'key', 'filter_'), (
+        ({'studio': 'a', 'year': 2000}, None, True, 'GetItem', {'studio': 'a', 'year': 2000}, {}),
+        ({'studio': 'a', 'year': 2000, '_deleted': {'$ne': True}}, None, True, 'GetItem',
+         {'studio': 'a', 'year': 2000}, {'_deleted': {'$ne': True}}),
+        ({'studio': 'a', 'year': 2000}, None, False, 'Query on table', {'studio': 'a', 'year': 2000}, {}),
+        ({'$and': [{'studio': 'a'}, {'year': {'$gte': 2000, '$lte': 2005}}]}, None, False, 'Query on table',
+         {'studio': 'a', 'year': {'$between': [2000, 2005]}}, {}),
+        ({'genre': 'drama', 'rating': {'$gt': 3}, 'title': 'x'}, None, False, 'Query on index genre',
+         {'genre': 'drama', 'rating': {'$gt': 3}}, {'title': 'x'}),
+        ({'director': 'x'}, ['title'], False, 'Query on index director', {'director': 'x'}, {}),
+        ({'director': 'x'}, None, False, 'Scan', {}, {'director': 'x'}),
+        ({'studio': {'$in': ['a', 'b']}}, None, False, 'Query on table x 2', {'studio': 'a'}, {}),
+        ({'studio': {'$in': ['a', 'b']}, 'year': 2000}, None, True, 'BatchGetItem x 2',
+         {'studio': 'a', 'year': 2000}, {}),
+        ({'$or': [{'genre': 'drama'}, {'genre': 'comedy', 'rating': {'$gt': 3}}], 'title': 'x'}, None, False,
+         'Query on index genre x 2', {'genre': 'drama'}, {'title': 'x'}),
+        ({'$or': [{'genre': 'drama'}, {'title': 'x'}]}, None, False, 'Scan', {},
+         {'$or': [{'genre': 'drama'}, {'title': 'x'}]})
+))
+def test_access_path(query: dict, projection: list, single: bool, access_path: str, key: dict, filter_: dict):
+    """Test to ensure the cheapest access path is chosen and the rest of the query is left as a filter
+
+    :param dict query: Query
+    :param list projection: Projected fields
+    :param bool single: Whether a single item is read
+    :param str access_path: Expected access path
+    :param dict key: Expected key or key condition
+    :param dict filter_: Expected residual filter
+    :raises: AssertionError
+    """
+
+    plan = choose_plan('movie', SCHEMA, query, projection, single=single)
+
+    assert plan.access_path == access_path
+    assert plan.key == key
+    assert plan.filter == filter_
+
+
+@pytest.mark.parametrize(('sort', 'forward', 'sorted_'), (
+        ([('year', -1)], False, True),
+        ([('year', 1)], True, True),
+        ([('title', 1)], True, False),
+        (None, True, True)
+))
+def test_sort_follows_range_key(sort: list, forward: bool, sorted_: bool):
+    """Test to ensure a sort on the range key is served by the read order
+
+    :param list sort: Requested sort
+    :param bool forward: Expected read order
+    :param bool sorted_: Whether the plan returns items in the requested order
+    :raises: AssertionError
+    """
+
+    plan = choose_plan('movie', SCHEMA, {'studio': 'a'}, sort=sort)
+
+    assert plan.forward == forward
+    assert plan.sorted == sorted_
+
+
+def test_scan_segments_and_description():
+    """Test to ensure scans carry their segments and plans describe their compiled expressions
+
+    :raises: AssertionError
+    """
+
+    plan = choose_plan('movie', SCHEMA, {'title': 'x'}, ['title'], segments=4)
+    description = plan.describe(['title'])
+
+    assert description['access_path'] == 'Scan with 4 segments'
+    assert description['filter']['expression'] == '#n0 = :v0'
+    assert description['projection'] == '#p0'
+    assert choose_plan('movie', SCHEMA, {'studio': 'a'}).describe()['key_condition']['expression'] == '#n0 = :v0'
+
+
+def test_conjuncts():
+    """Test to ensure nested $and terms are flattened
+
+    :raises: AssertionError
+    """
+
+    assert conjuncts({'a': 1, '$and': [{'b': 2}, {'$and': [{'c': 3}]}]}) == [{'a': 1}, {'b': 2}, {'c': 3}]
+
+
+@pytest.mark.parametrize(('query', 'sort', 'keys', 'merge'), (
+        ({'studio': {'$in': ['b', 'a', 'b']}}, None, [{'studio': 'b'}, {'studio': 'a'}], None),
+        ({'studio': {'$in': ['b', 'a']}}, [('studio', 1)], [{'studio': 'a'}, {'studio': 'b'}], None),
+        ({'studio': {'$in': ['a', 'b']}}, [('studio', -1)], [{'studio': 'b'}, {'studio': 'a'}], None),
+        ({'studio': {'$in': ['a', 'b']}}, [('year', -1)], [{'studio': 'a'}, {'studio': 'b'}], ('year', -1)),
+        ({'studio': 'a', 'year': {'$in': [2001, 2000]}}, [('year', 1)],
+         [{'studio': 'a', 'year': 2000}, {'studio': 'a', 'year': 2001}], None),
+        ({'$or': [{'studio': 'a'}, {'studio': 'a', 'year': {'$gt': 2000}}, {'studio': 'b', 'year': 2000}]}, None,
+         [{'studio': 'a'}, {'studio': 'b', 'year': 2000}], None)
+))
+def test_fanout(query: dict, sort: list, keys: list, merge: tuple):
+    """Test to ensure fanned out keys are ordered, or merged, to preserve the requested sort
+
+    :param dict query: Query
+    :param list sort: Requested sort
+    :param list keys: Expected keys, in the order they are read
+    :param tuple merge: Expected merge field and direction
+    :raises: AssertionError
+    """
+
+    plan = choose_plan('movie', SCHEMA, query, sort=sort)
+
+    assert plan.keys == keys
+    assert plan.merge == merge
+    assert plan.sorted
+
+
+def test_fanout_limit():
+    """Test to ensure queries pinning more keys than the fan-out limit scan instead
+
+    :raises: AssertionError
+    """
+
+    assert choose_plan('movie', SCHEMA, {'studio': {'$in': ['a', 'b', 'c']}}, max_fanout=2).operation == 'Scan'
+    assert key_conditions(conjuncts({'studio': {'$in': []}}), SCHEMA.table) is None
+
+
+@pytest.mark.parametrize(('query', 'keys', 'exact'), (
+        ({'$or': [{'studio': 'a', 'year': 2000}, {'studio': 'a', 'year': 2001}]},
+         [{'studio': 'a', 'year': 2000}, {'studio': 'a', 'year': 2001}], True),
+        ({'$or': [{'studio': 'a', 'year': {'$gt': 2000}}, {'studio': 'a'}]}, [{'studio': 'a'}], True),
+        ({'$or': [{'studio': 'a', 'year': {'$gt': 2000}}, {'studio': 'a', 'year': {'$lt': 2005}}]},
+         [{'studio': 'a'}], False),
+        ({'$or': [{'studio': 'a', 'year': 2000}, {'studio': 'a', 'year': {'$gt': 1990}}]}, [{'studio': 'a'}], False)
+))
+def test_overlapping_alternatives(query: dict, keys: list, exact: bool):
+    """Test to ensure alternatives reading the same partition never read an item twice
+
+    :param dict query: Query
+    :param list keys: Expected key conditions
+    :param bool exact: Whether the key conditions consume the $or, or leave it as a filter
+    :raises: AssertionError
+    """
+
+    plan = choose_plan('movie', SCHEMA, query)
+
+    assert plan.keys == keys
+    assert plan.filter == ({} if exact else query)
@@ -5,6 +5,8 @@
 """
 
 from eve import Eve
+from eve.utils import ParsedRequest
+from eve_dynamodb.instrumentation import MemorySink
 
 
 def test_remove_one(server: Eve):
@@ -21,3 +23,39 @@ def test_remove_one(server: Eve):
         server.data.remove('actor', {id_field: '1'})
 
         assert not server.data.find_one_raw('actor', **{id_field: '1'})
+
+
+def test_remove_reads_once(memory_server: Eve):
+    """Test to ensure removing documents reads the table once, without counting them first
+
+    :param Eve memory_server: Eve server
+    :raises: AssertionError
+    """
+
+    sink = MemorySink()
+
+    with memory_server.app_context(), memory_server.data.instrumentation.capture(sink):
+        memory_server.data.insert('actor', [{'_id': str(i), 'name': f"actor{i}"} for i in range(5)])
+        memory_server.data.remove('actor', {})
+
+        assert sink.snapshot()[('actor', 'Scan')]['calls'] == 1
+        assert not memory_server.data.find('actor', ParsedRequest())[1]
+
+
+def test_remove_bypasses_caches(memory_server: Eve):
+    """Test to ensure removing documents deletes those written elsewhere since a cached read
+
+    :param Eve memory_server: Eve server
+    :raises: AssertionError
+    """
+
+    memory_server.config['DYNAMODB_RESULT_CACHE_TTL'] = 60
+    memory_server.data.result_cache.max_entries = 16
+
+    with memory_server.app_context():
+        memory_server.data.insert('actor', [{'_id': '1', 'name': 'cached'}])
+        memory_server.data.find('actor', None, perform_count=False)
+        memory_server.data.driver.Table('actor').put_item(Item={'_id': '2', 'name': 'elsewhere'})
+        memory_server.data.remove('actor', {})
+
+        assert not memory_server.data.driver.Table('actor').scan()['Items']
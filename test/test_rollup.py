@@ -0,0 +1,196 @@
+"""test_rollup
+
+.. codeauthor:: John Lane <john.lane93@gmail.com>
+
+"""
+
+from decimal import Decimal
+from eve import Eve
+from eve.utils import ParsedRequest
+import pytest
+from eve_dynamodb.dynamodb import DynamoDB
+from eve_dynamodb.rollup import Rollup, RollupTable, apply_updates, equality_terms, rollup_for_group
+
+
+class RecordingTable:
+    """Table stand-in recording counter updates
+    """
+
+    def __init__(self):
+        self.counters = {}
+
+    def update_item(self, **kwargs):
+        """Apply an ADD update expression
+
+        :param dict kwargs: UpdateItem arguments
+        """
+
+        assert kwargs['UpdateExpression'].startswith('ADD ')
+        counters = self.counters.setdefault((kwargs['Key']['rollup'], kwargs['Key']['group']), {})
+
+        for clause in kwargs['UpdateExpression'][4:].split(', '):
+            name, value = clause.split(' ')
+            counter = kwargs['ExpressionAttributeNames'][name]
+            counters[counter] = counters.get(counter, 0) + kwargs['ExpressionAttributeValues'][value]
+
+
+def test_apply_counts_and_sums():
+    """Test to ensure counters are adjusted for added, changed and soft deleted documents
+
+    :raises: AssertionError
+    """
+
+    table = RecordingTable()
+    rollups = [Rollup('product', 'category', sum=['price'])]
+    rollup_table = RollupTable(table)
+
+    rollup_table.apply(rollups, added=[
+        {'_id': '1', 'category': 'a', 'price': 10},
+        {'_id': '2', 'category': 'a', 'price': 5},
+        {'_id': '3', 'category': 'b'}
+    ], deleted_field='_deleted')
+    rollup_table.apply(rollups, removed=[{'_id': '2', 'category': 'a', 'price': 5}],
+                       added=[{'_id': '2', 'category': 'b', 'price': 5}], deleted_field='_deleted')
+    rollup_table.apply(rollups, removed=[{'_id': '3', 'category': 'b'}],
+                       added=[{'_id': '3', 'category': 'b', '_deleted': True}], deleted_field='_deleted')
+
+    assert table.counters[('product#category', '"a"')] == {'count': 1, 'sum_price': 10, 'num_price': 1}
+    assert table.counters[('product#category', '"b"')] == {'count': 1, 'sum_price': 5, 'num_price': 1}
+
+
+def test_rollup_for_group():
+    """Test to ensure only $group stages covered by a rollup are answered from it
+
+    :raises: AssertionError
+    """
+
+    rollups = [Rollup('product', 'category', sum=['price'])]
+
+    assert rollup_for_group(rollups, {'_id': '$category', 'n': {'$sum': 1}, 'avg': {'$avg': '$price'}})
+    assert not rollup_for_group(rollups, {'_id': '$category', 'low': {'$min': '$price'}})
+    assert not rollup_for_group(rollups, {'_id': '$category', 'total': {'$sum': '$weight'}})
+    assert not rollup_for_group(rollups, {'_id': '$brand', 'n': {'$sum': 1}})
+
+
+@pytest.mark.parametrize(('query', 'expectation'), (
+        ({}, {}),
+        ({'a': 1}, {'a': 1}),
+        ({'$and': [{'a': 1}, {'b': {'$ne': True}}]}, {'a': 1, 'b': {'$ne': True}}),
+        ({'$or': [{'a': 1}, {'b': 2}]}, None),
+        ({'$and': [{'a': 1}, {'a': 1}]}, {'a': 1}),
+        ({'$and': [{'a': 1}, {'a': 2}]}, None)
+))
+def test_equality_terms(query: dict, expectation: dict):
+    """Test to ensure queries are flattened into their equality terms
+
+    :param dict query: Query to flatten
+    :param dict expectation: Expected terms
+    :raises: AssertionError
+    """
+
+    assert equality_terms(query) == expectation
+
+
+def test_apply_updates():
+    """Test to ensure partial updates are applied to a copy of the original
+
+    :raises: AssertionError
+    """
+
+    original = {'_id': '1', 'price': Decimal(1), 'address': {'city': 'foo'}}
+
+    assert apply_updates(original, {'price': 2, 'address.city': 'bar'}) == {
+        '_id': '1', 'price': 2, 'address': {'city': 'bar'}
+    }
+    assert original['address']['city'] == 'foo'
+
+
+@pytest.fixture()
+def rollup_server(memory_app) -> Eve:
+    """Returns an Eve server counting orders per tenant
+
+    :param memory_app: Eve server factory
+    :return: Eve server
+    :rtype: Eve
+    """
+
+    return memory_app({
+        'order': {
+            'schema': {'_id': {'type': 'string'}, 'tenant': {'type': 'string'}},
+            'rollups': [{'group_by': 'tenant'}]
+        }
+    })
+
+
+@pytest.mark.parametrize(('where', 'expected'), (
+        ('{"tenant": "acme"}', 3),
+        ('{"$and": [{"tenant": "acme"}, {"tenant": "acme"}]}', 3),
+        ('{"$and": [{"tenant": "acme"}, {"tenant": "other"}]}', 0)
+))
+def test_rollup_count(rollup_server: Eve, where: str, expected: int):
+    """Test to ensure counts answered from rollups match the items returned
+
+    :param Eve rollup_server: Eve server
+    :param str where: Filter
+    :param int expected: Expected count
+    :raises: AssertionError
+    """
+
+    with rollup_server.app_context():
+        data = rollup_server.data
+        data.insert('order', [{'_id': str(i), 'tenant': 'acme' if i < 3 else 'other'} for i in range(5)])
+
+        req = ParsedRequest()
+        req.where = where
+        items, count = data.find('order', req)
+
+        assert count == len(list(items)) == expected
+
+
+def test_rebuild_rollups(rollup_server: Eve):
+    """Test to ensure rebuilding rollups counts documents written before they were declared
+
+    :param Eve rollup_server: Eve server
+    :raises: AssertionError
+    """
+
+    with rollup_server.app_context():
+        data = rollup_server.data
+        data.driver.Table('order').put_item(Item={'_id': 'old', 'tenant': 'acme'})
+        data.insert('order', [{'_id': '1', 'tenant': 'acme'}, {'_id': '2', 'tenant': 'other'}])
+
+        req = ParsedRequest()
+        req.where = '{"tenant": "acme"}'
+
+        assert data.find('order', req)[1] == 1
+        assert data.rebuild_rollups('order') == 3
+        assert data.rebuild_rollups('order') == 3
+        assert data.find('order', req)[1] == 2
+        assert data.find('order', ParsedRequest())[1] == 3
+
+
+@pytest.mark.parametrize('write', ('update', 'replace'))
+def test_stale_original(rollup_server: Eve, write: str):
+    """Test to ensure writes based on an original changed since it was read fail, leaving the rollups untouched
+
+    :param Eve rollup_server: Eve server
+    :param str write: Data layer write
+    :raises: AssertionError
+    """
+
+    with rollup_server.app_context():
+        data = rollup_server.data
+        data.insert('order', [{'_id': '1', 'tenant': 'acme', '_etag': 'a'}])
+        original = data.find_one_raw('order', _id='1')
+        data.update('order', '1', {'tenant': 'other', '_etag': 'b'}, original)
+
+        with pytest.raises(DynamoDB.OriginalChangedError):
+            getattr(data, write)('order', '1', {'tenant': 'third', '_etag': 'c'}, original)
+
+        req = ParsedRequest()
+        req.where = '{"tenant": "other"}'
+
+        assert data.find_one_raw('order', _id='1')['tenant'] == 'other'
+        assert data.find('order', req)[1] == 1
+        assert data.rebuild_rollups('order') == 1
+        assert data.find('order', req)[1] == 1
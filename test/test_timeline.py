@@ -0,0 +1,143 @@
+"""test_timeline
+
+.. codeauthor:: John Lane <john.lane93@gmail.com>
+
+"""
+
+from datetime import datetime, timedelta
+from eve import Eve
+from eve.utils import ParsedRequest
+import pytest
+from eve_dynamodb.explain import explanations
+from eve_dynamodb.planner import Schema
+from eve_dynamodb.timeline import Timeline, to_utc, utcnow
+
+NOW = datetime(2024, 5, 1, 12, 30)
+SCHEMA = Schema(
+    [{'AttributeName': '_id', 'KeyType': 'HASH'}],
+    [{
+        'IndexName': 'updated',
+        'KeySchema': [
+            {'AttributeName': '_bucket', 'KeyType': 'HASH'}, {'AttributeName': '_updated_at', 'KeyType': 'RANGE'}
+        ],
+        'Projection': {'ProjectionType': 'ALL'}
+    }]
+)
+
+
+@pytest.mark.parametrize('value', [
+    datetime(2024, 5, 1, 12, 30), 'Wed, 01 May 2024 12:30:00 GMT', '2024-05-01T12:30:00Z', 1714566600
+])
+def test_to_utc(value):
+    """Test to ensure timestamps are converted to naive UTC datetimes
+
+    :param value: Timestamp
+    :raises: AssertionError
+    """
+
+    assert to_utc(value) == NOW
+
+
+def test_buckets():
+    """Test to ensure buckets cover the requested time up to one bucket past now
+
+    :raises: AssertionError
+    """
+
+    timeline = Timeline('actor', 'updated')
+
+    assert timeline.values(NOW) == {
+        '_bucket': 'actor#2024-05-01T12:00:00Z', '_updated_at': '2024-05-01T12:30:00.000000Z'
+    }
+    assert timeline.buckets(NOW - timedelta(hours=2), NOW) == [
+        'actor#2024-05-01T10:00:00Z', 'actor#2024-05-01T11:00:00Z', 'actor#2024-05-01T12:00:00Z',
+        'actor#2024-05-01T13:00:00Z'
+    ]
+
+
+@pytest.mark.parametrize('query,sort,expected', [
+    ({'_updated': {'$gt': NOW - timedelta(hours=1)}}, None, 'Query on index updated x 3'),
+    ({'_updated': {'$gte': NOW - timedelta(minutes=5)}, 'name': 'a'}, None, 'Query on index updated x 2'),
+    ({'_updated': {'$lt': NOW}}, None, None),
+    ({'_updated': {'$gt': NOW - timedelta(days=3)}}, None, None),
+    ({'_updated': {'$gt': NOW + timedelta(days=3)}}, None, None)
+])
+def test_timeline_plan(query: dict, sort: list, expected: str):
+    """Test to ensure update time filters fan out one range Query per bucket
+
+    :param dict query: Query
+    :param list sort: Requested sort
+    :param str expected: Expected access path, None when the index cannot answer the query
+    :raises: AssertionError
+    """
+
+    plan = Timeline('actor', 'updated').plan('actor', SCHEMA, query, sort=sort, now=NOW)
+
+    assert (plan.access_path if plan else None) == expected
+
+
+def test_timeline_descending():
+    """Test to ensure a descending sort on the update time reads the newest bucket first
+
+    :raises: AssertionError
+    """
+
+    plan = Timeline('actor', 'updated').plan(
+        'actor', SCHEMA, {'_updated': {'$gt': NOW - timedelta(hours=1)}}, sort=[('_updated', -1)], now=NOW
+    )
+
+    assert plan.sorted and not plan.forward
+    assert plan.keys[0]['_bucket'] == 'actor#2024-05-01T13:00:00Z'
+
+
+@pytest.fixture()
+def timeline_server(memory_app) -> Eve:
+    """Returns an Eve server indexing actors by update time
+
+    :param memory_app: Eve server factory
+    :return: Eve server
+    :rtype: Eve
+    """
+
+    return memory_app({
+        'actor': {
+            'updated_index': {'name': 'updated'},
+            'schema': {'_id': {'type': 'string'}, 'name': {'type': 'string'}}
+        }
+    }, {'actor': (['_id'], {'updated': ['_bucket', '_updated_at']})}, DYNAMODB_EXPLAIN=True)
+
+
+def test_timeline_index(timeline_server: Eve):
+    """Test to ensure reads of recently updated items query the time bucketed index
+
+    :param Eve timeline_server: Eve server
+    :raises: AssertionError
+    """
+
+    now = utcnow().replace(microsecond=0)
+
+    with timeline_server.app_context():
+        data = timeline_server.data
+        data.insert('actor', [
+            {'_id': str(i), 'name': f"actor{i}", '_updated': f"{now - timedelta(hours=i):%Y-%m-%dT%H:%M:%SZ}"}
+            for i in range(10)
+        ])
+        data.update('actor', '9', {'_updated': f"{now:%Y-%m-%dT%H:%M:%SZ}"}, {'_id': '9'})
+
+        req = ParsedRequest()
+        req.where = f'{{"_updated": {{"$gte": "{now - timedelta(hours=2, minutes=30):%Y-%m-%dT%H:%M:%SZ}"}}}}'
+        items, count = data.find('actor', req)
+        explanation = explanations()[-1]
+
+        assert sorted(item['_id'] for item in items) == ['0', '1', '2', '9']
+        assert count == 4
+        assert all('_bucket' not in item and '_updated_at' not in item for item in items)
+        assert explanation['access_path'].startswith('Query on index updated x ')
+        assert explanation['scanned'] == 8
+        assert set(data.find_one_raw('actor', _id='9')) == {'_id', 'name', '_updated'}
+
+        req.where = '{"_updated": {"$gt": "Wed, 21 Oct 2099 00:00:00 GMT"}}'
+
+        items, count = data.find('actor', req)
+
+        assert list(items) == [] and count == 0